@@ -4,20 +4,25 @@ pyccsl - Python Claude Code Status Line
 Generates a customizable status line for Claude Code showing performance metrics,
 git status, session information, and cost calculations.
 
+`pyccsl.py report [--by day|model|project|session]` prints usage and cost
+rollups over all sessions from an incrementally synced SQLite store.
+
 Exit Codes:
     0 - Success
     1 - Configuration/argument error  
     2 - Input/JSON error
-    3 - File access error (reserved)
+    3 - File access error (no snapshot for --read-snapshot)
     4 - Runtime/processing error (reserved)
 """
 
 import sys
 import json
 import os
-import subprocess
-from datetime import datetime, timedelta
-import argparse
+
+# Everything else (argparse, subprocess, datetime, hashlib, tempfile, ...) is
+# imported inside the functions that need it. The status line is relaunched on
+# every refresh, so fields that never touch git, timestamps or the transcript
+# should not pay for those imports.
 
 __version__ = "0.9.36"
 
@@ -164,9 +169,178 @@ RESET = "\033[0m"
 BOLD = "\033[1m"
 GRAY_50 = "\033[38;5;244m"  # 50% gray for badge
 
+# Context window size (tokens) for current Claude models; model IDs with a
+# "[1m]" suffix use the 1M-token context window
+DEFAULT_CONTEXT_WINDOW = 200_000
+EXTENDED_CONTEXT_WINDOW = 1_000_000
+
 # Powerline separator
 POWERLINE_RIGHT = "\ue0b0"  # Powerline right arrow (requires powerline font)
 
+# Cache directory for transcript checkpoints and other persisted state
+CACHE_DIR = os.path.expanduser(os.environ.get("PYCCSL_CACHE_DIR", "~/.cache/pyccsl"))
+
+# Bump when the checkpoint layout changes so stale checkpoints are rebuilt
+CHECKPOINT_VERSION = 11
+
+# Number of recent UUIDs (and user timestamps) remembered for parent model
+# lookups and response-time pairing. Tool results and replies point at an
+# entry shortly before them, so the window doesn't change the totals. At
+# about 100 bytes of JSON per UUID it is still most of the checkpoint, which
+# is rewritten each time new lines are consumed, so keep it small.
+CHECKPOINT_UUID_WINDOW = 128
+
+# Bytes before the checkpoint offset used to detect a rewritten transcript
+CHECKPOINT_TAIL_BYTES = 64
+
+# Relative accuracy of the response-time percentile sketch: every response
+# time falls in a logarithmic bucket whose estimate is within 1% of it
+SKETCH_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+
+# Exponents of the lowest and highest sketch bucket boundaries (about 1ms
+# and 5.5 minutes); values outside fall into the outermost buckets
+SKETCH_MIN_EXPONENT = -350
+SKETCH_MAX_EXPONENT = 290
+
+# Sketch bucket boundaries SKETCH_GAMMA**i, built on first use by get_sketch_bounds
+SKETCH_BOUNDS = None
+
+# Percentiles with a perf-response-pNN field, and the metric holding each
+RESPONSE_PERCENTILES = {"p50": 0.50, "p90": 0.90, "p99": 0.99}
+
+# One-minute buckets in the ring buffer behind windowed fields such as
+# perf-cache-rate@5m, and so the longest window they can cover
+RECENT_MINUTES = 60
+
+# Fields that can be shown over a recent window ("field@5m", "field@1h")
+WINDOW_FIELDS = ["perf-cache-rate", "perf-response-time", "perf-message-count"]
+
+# Byte pattern for the transcript line prefilter. Every line with a "usage"
+# key contains it (Claude Code writes keys unescaped), so a line without it
+# can be skipped undecoded. It is a superset filter, not an exact one: a
+# string value that is exactly "usage" matches too, so matching lines are
+# still decoded and checked.
+USAGE_MARKER = b'"usage"'
+
+# Per-session status snapshots (--snapshot) read by --read-snapshot. They
+# are rewritten on every refresh, so they live in the per-user runtime
+# directory (tmpfs) when there is one rather than on disk.
+SNAPSHOT_DIR = os.path.expanduser(os.environ.get("PYCCSL_SNAPSHOT_DIR") or (
+    os.path.join(os.environ["XDG_RUNTIME_DIR"], "pyccsl") if os.environ.get("XDG_RUNTIME_DIR")
+    else os.path.join(CACHE_DIR, "snapshots")))
+
+# Snapshot file layout: a fixed-size file starting with magic, generation
+# counter (odd while being written), Unix time of the update and the byte
+# lengths of the rendered line and JSON document that follow the header
+SNAPSHOT_MAGIC = b"PYCCSLS1"
+SNAPSHOT_HEADER = "<8sQdII"
+SNAPSHOT_SIZE = 65536
+
+# Lock-free attempts to read a snapshot while a writer is updating it, and
+# seconds to wait between them, before waiting on the writer's lock
+SNAPSHOT_READ_RETRIES = 20
+SNAPSHOT_RETRY_SECONDS = 0.0002
+
+# Metrics left out of --format json documents (pre-rendered ANSI text)
+SNAPSHOT_EXCLUDED_METRICS = ["badge", "cost_formatted"]
+
+# Watch mode: seconds between stat polls without inotify, seconds to let a
+# burst of transcript writes settle, and seconds between re-renders of
+# time-dependent fields when nothing changed
+WATCH_POLL_SECONDS = 0.05
+WATCH_POLL_MAX_SECONDS = 1.0
+WATCH_DEBOUNCE_SECONDS = 0.02
+WATCH_REFRESH_SECONDS = 60
+
+# inotify event masks (linux/inotify.h)
+INOTIFY_MODIFY = 0x002
+INOTIFY_CLOSE_WRITE = 0x008
+INOTIFY_MOVED_TO = 0x080
+INOTIFY_CREATE = 0x100
+INOTIFY_DELETE = 0x200
+
+# Warm transcript checkpoints kept in memory by long-lived processes (daemon
+# mode), most recently used last
+TRANSCRIPT_STATES = {}
+TRANSCRIPT_STATES_MAX = 32
+
+# Seconds a cached `git status` result is reused while .git/index, HEAD and
+# the current ref are unchanged. Edits that don't touch the index (unstaged
+# or untracked files) show up after at most this long.
+GIT_STATUS_TTL = 5.0
+
+# Git status results kept in memory by long-lived processes, keyed by git dir
+GIT_STATUS_CACHE = {}
+
+# Unix socket used by --daemon and pyccsl_client.py
+DAEMON_SOCKET = os.path.expanduser(os.environ.get("PYCCSL_SOCKET", os.path.join(CACHE_DIR, "pyccsl.sock")))
+
+# Environment variables the cache, projects, snapshot and usage paths above are
+# read from at import; the daemon hands requests whose client sees different
+# values back to the client (keep in sync with pyccsl_client.py)
+DAEMON_PATH_VARIABLES = ["HOME", "CLAUDE_CONFIG_DIR", "XDG_RUNTIME_DIR", "PYCCSL_CACHE_DIR",
+                         "PYCCSL_PROJECTS_DIR", "PYCCSL_SNAPSHOT_DIR", "PYCCSL_USAGE_DB"]
+
+# Deadline the daemon applies to requests without --deadline-ms. It serves one
+# request at a time, so a slow transcript load must not hold up every other
+# session's client; stay well below CLIENT_TIMEOUT in pyccsl_client.py
+DAEMON_DEADLINE_MS = 2000
+
+# Claude Code projects directory with one JSONL transcript per session
+CLAUDE_PROJECTS_DIR = os.path.expanduser(os.environ.get(
+    "PYCCSL_PROJECTS_DIR", os.path.join(os.environ.get("CLAUDE_CONFIG_DIR", "~/.claude"), "projects")))
+
+# Length of a Claude usage billing block
+BILLING_BLOCK_SECONDS = 5 * 3600
+
+# Changed transcripts needed before the usage scan starts a process pool
+# (fewer are parsed in-process; worker startup would dominate)
+USAGE_SCAN_POOL_MIN = 4
+
+# SQLite usage store behind `pyccsl.py report`
+USAGE_DB_PATH = os.path.expanduser(os.environ.get("PYCCSL_USAGE_DB", os.path.join(CACHE_DIR, "usage.sqlite3")))
+
+# Bump when the usage store schema changes; the store is rebuilt
+USAGE_STORE_VERSION = 2
+
+# Column state persisted per transcript so the store can resume parsing
+USAGE_RESOLVER_KEYS = ["entry_count", "session_id", "agent_id", "cwd", "model_ids", "last_model",
+                       "uuid_models", "uuid_turns", "user_timestamps"]
+
+# Report groupings: --by choice -> SQL expression for the group key
+REPORT_GROUPS = {
+    "day": "date(timestamp, 'unixepoch', 'localtime')",
+    "model": "model",
+    "project": "project",
+    "session": "session"
+}
+
+# Render plans compiled by get_render_plan, keyed by display configuration,
+# least recently used first; long-lived processes keep at most RENDER_PLANS_MAX
+RENDER_PLANS = {}
+RENDER_PLANS_MAX = 32
+
+# Stage records collected while --profile is active (None when not profiling)
+PROFILE_STAGES = None
+
+# Prefix of fields rendered from a cached result after their stage missed
+# the deadline
+STALE_MARKER = "~"
+
+# Stage threads started by run_stages_with_deadline, keyed by (session, stage),
+# and the lock serializing updates of the per-session stage cache
+STAGE_THREADS = {}
+STAGE_CACHE_LOCK = None
+
+# Locks serializing load_transcript_state per transcript path, created on
+# first use by get_transcript_lock
+TRANSCRIPT_LOCKS = {}
+TRANSCRIPT_LOCK_STRIPES = 16
+
+# Per-thread stderr installed by serve_daemon (None outside the daemon)
+DAEMON_STDERR = None
+
 def apply_color(text, fg_color=None, bg_color=None, bold=False):
     """Apply ANSI color codes to text.
     
@@ -214,18 +388,53 @@ def get_field_color(field, theme_colors):
         return theme_colors.get("folder")
     elif field in ["git"]:
         return theme_colors.get("git")
-    elif field in ["model", "perf-cache-rate", "perf-response-time", 
+    elif field in ["model", "perf-cache-rate", "perf-response-time",
+                   "perf-response-p50", "perf-response-p90", "perf-response-p99",
                    "perf-session-time", "perf-message-count",
                    "perf-all-metrics"]:
         return theme_colors.get("model")
     elif field in ["input"]:
         return theme_colors.get("input")
-    elif field in ["output", "tokens"]:
+    elif field in ["output", "tokens", "context"]:
         return theme_colors.get("output")
-    elif field in ["cost"]:
+    elif field in ["cost", "daily-budget", "block-remaining"]:
         return theme_colors.get("cost")
     return None
 
+def split_window_field(field):
+    """Split a windowed field name such as "perf-cache-rate@5m".
+    
+    Windows are given in seconds, minutes or hours ("90s", "5m", "1h") and
+    must lie between one minute and RECENT_MINUTES.
+    
+    Returns:
+        (base field, window in seconds), with a window of None for plain
+        fields, or (None, None) for an invalid windowed field
+    """
+    base, has_window, window = field.partition("@")
+    if not has_window:
+        return field, None
+    units = {"s": 1, "m": 60, "h": 3600}
+    if base not in WINDOW_FIELDS or window[-1:] not in units or not window[:-1].isdigit():
+        return None, None
+    seconds = int(window[:-1]) * units[window[-1]]
+    if not 60 <= seconds <= RECENT_MINUTES * 60:
+        return None, None
+    return base, seconds
+
+def get_display_fields(fields):
+    """Order the selected fields for display.
+    
+    Fields follow FIELD_ORDER; windowed fields come right after their base
+    field position, shortest window first. Unknown fields are dropped.
+    """
+    selected = {}
+    for field in fields:
+        base, window = split_window_field(field)
+        if base in FIELD_ORDER and field not in selected:
+            selected[field] = (FIELD_ORDER.index(base), window or 0)
+    return sorted(selected, key=selected.get)
+
 # Default field list
 DEFAULT_FIELDS = ["badge", "folder", "git", "model", "tokens", "cost"]
 
@@ -237,15 +446,40 @@ FIELD_ORDER = [
     "model",
     "perf-cache-rate",
     "perf-response-time",
+    "perf-response-p50",
+    "perf-response-p90",
+    "perf-response-p99",
     "perf-session-time",
     "perf-message-count",
     "perf-all-metrics",
     "input",
     "output",
     "tokens",
-    "cost"
+    "context",
+    "cost",
+    "daily-budget",
+    "block-remaining"
 ]
 
+# Fields computed from the session transcript, and the parts of it they need:
+# "usage" (token counts and cost) and/or "timeline" (timestamps and turns)
+TRANSCRIPT_FIELDS = {
+    "badge": ["usage", "timeline"],
+    "perf-cache-rate": ["usage"],
+    "perf-response-time": ["timeline"],
+    "perf-response-p50": ["timeline"],
+    "perf-response-p90": ["timeline"],
+    "perf-response-p99": ["timeline"],
+    "perf-session-time": ["timeline"],
+    "perf-message-count": ["timeline"],
+    "perf-all-metrics": ["usage", "timeline"],
+    "input": ["usage"],
+    "output": ["usage"],
+    "tokens": ["usage"],
+    "cost": ["usage"]
+}
+ALL_FACETS = ["usage", "timeline"]
+
 def parse_env_file(filepath):
     """Parse environment file and return a dictionary of variables.
     
@@ -292,11 +526,68 @@ def parse_env_file(filepath):
     
     return env_vars
 
-def parse_arguments():
-    """Parse command-line arguments."""
-    # Debug: print raw sys.argv
-    if "--debug" in sys.argv:
-        sys.stderr.write(f"DEBUG: sys.argv = {sys.argv}\n")
+# Choices for enumerated command-line options
+THEME_CHOICES = list(THEMES)
+NUMBER_CHOICES = ["compact", "full", "raw"]
+STYLE_CHOICES = ["powerline", "simple", "arrows", "pipes", "dots"]
+RESPONSE_STAT_CHOICES = ["mean"] + list(RESPONSE_PERCENTILES)
+FORMAT_CHOICES = ["text", "json"]
+
+# Options understood by parse_argv_fast (option -> choices, or None for any value)
+FAST_VALUE_OPTIONS = {
+    "--theme": THEME_CHOICES,
+    "--numbers": NUMBER_CHOICES,
+    "--style": STYLE_CHOICES,
+    "--env": None,
+    "--perf-cache": None,
+    "--perf-response": None,
+    "--git-ttl": None,
+    "--profile-log": None,
+    "--watch": None,
+    "--cwd": None,
+    "--output": None,
+    "--format": FORMAT_CHOICES,
+    "--read-snapshot": None,
+    "--monthly-budget": None,
+    "--deadline-ms": None,
+    "--perf-response-stat": RESPONSE_STAT_CHOICES
+}
+FAST_FLAG_OPTIONS = ["--no-emoji", "--debug", "--no-cache", "--no-subagents", "--daemon", "--profile",
+                     "--snapshot", "--batch"]
+
+def get_argument_defaults(environ):
+    """Get default option values, taking PYCCSL_* environment variables into account."""
+    return {
+        "theme": environ.get("PYCCSL_THEME", "default"),
+        "numbers": environ.get("PYCCSL_NUMBERS", "compact"),
+        "style": environ.get("PYCCSL_STYLE", "simple"),
+        "no_emoji": environ.get("PYCCSL_NO_EMOJI", "false").lower() == "true",
+        "debug": False,
+        "no_cache": environ.get("PYCCSL_NO_CACHE", "false").lower() == "true",
+        "no_subagents": environ.get("PYCCSL_NO_SUBAGENTS", "false").lower() == "true",
+        "daemon": False,
+        "batch": False,
+        "watch": None,
+        "cwd": None,
+        "output": None,
+        "format": environ.get("PYCCSL_FORMAT", "text"),
+        "snapshot": environ.get("PYCCSL_SNAPSHOT", "false").lower() == "true",
+        "read_snapshot": None,
+        "profile": False,
+        "profile_log": environ.get("PYCCSL_PROFILE_LOG", None),
+        "env": None,
+        "perf_cache": environ.get("PYCCSL_PERF_CACHE", "95,90,75"),
+        "perf_response": environ.get("PYCCSL_PERF_RESPONSE", "10,30,60"),
+        "perf_response_stat": environ.get("PYCCSL_PERF_RESPONSE_STAT", "mean"),
+        "git_ttl": environ.get("PYCCSL_GIT_TTL", str(GIT_STATUS_TTL)),
+        "monthly_budget": environ.get("PYCCSL_MONTHLY_BUDGET", None),
+        "deadline_ms": environ.get("PYCCSL_DEADLINE_MS", "0"),
+        "fields": environ.get("PYCCSL_FIELDS", None)
+    }
+
+def build_argument_parser(defaults):
+    """Build the argparse parser for the full command-line interface."""
+    import argparse
     
     parser = argparse.ArgumentParser(
         description="Claude Code status line generator",
@@ -306,25 +597,24 @@ def parse_arguments():
     # Theme option
     parser.add_argument(
         "--theme",
-        choices=["default", "solarized", "nord", "dracula", "gruvbox", 
-                 "tokyo", "catppuccin", "minimal", "none"],
-        default=os.environ.get("PYCCSL_THEME", "default"),
+        choices=THEME_CHOICES,
+        default=defaults["theme"],
         help="Color theme (default: default)"
     )
     
     # Number formatting option
     parser.add_argument(
         "--numbers",
-        choices=["compact", "full", "raw"],
-        default=os.environ.get("PYCCSL_NUMBERS", "compact"),
+        choices=NUMBER_CHOICES,
+        default=defaults["numbers"],
         help="Number formatting (default: compact)"
     )
     
     # Style option
     parser.add_argument(
         "--style",
-        choices=["powerline", "simple", "arrows", "pipes", "dots"],
-        default=os.environ.get("PYCCSL_STYLE", "simple"),
+        choices=STYLE_CHOICES,
+        default=defaults["style"],
         help="Separator style (default: simple)"
     )
     
@@ -332,7 +622,7 @@ def parse_arguments():
     parser.add_argument(
         "--no-emoji",
         action="store_true",
-        default=os.environ.get("PYCCSL_NO_EMOJI", "false").lower() == "true",
+        default=defaults["no_emoji"],
         help="Disable emoji in output"
     )
     
@@ -343,6 +633,83 @@ def parse_arguments():
         help="Output debug information to stderr"
     )
     
+    # Cache option
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=defaults["no_cache"],
+        help="Re-read the whole transcript instead of resuming from a checkpoint"
+    )
+    
+    # Sub-agent option
+    parser.add_argument(
+        "--no-subagents",
+        action="store_true",
+        default=defaults["no_subagents"],
+        help="Leave the usage of Task sub-agent transcripts out of token and cost totals"
+    )
+    
+    # Daemon option
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run as a resident server on a Unix socket for pyccsl_client.py"
+    )
+    
+    # Batch option
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Read newline-delimited JSON documents from stdin and print one status line per document"
+    )
+    
+    # Watch mode options
+    parser.add_argument(
+        "--watch",
+        metavar="TRANSCRIPT",
+        help="Stay resident and print a new status line whenever this transcript, .git/index or HEAD changes"
+    )
+    parser.add_argument(
+        "--cwd",
+        help="Working directory of the watched session, for git and folder (default: current directory)"
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="With --watch, atomically rewrite this file instead of printing to stdout"
+    )
+    
+    # Output format and shared snapshot options
+    parser.add_argument(
+        "--format",
+        choices=FORMAT_CHOICES,
+        default=defaults["format"],
+        help="Print the rendered line (text) or a JSON document with the raw metric values (default: text)"
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        default=defaults["snapshot"],
+        help="Also publish the line and metrics to a memory-mapped per-session snapshot for --read-snapshot"
+    )
+    parser.add_argument(
+        "--read-snapshot",
+        metavar="SESSION",
+        help="Print the last published snapshot of a session (ID or transcript path) without computing anything"
+    )
+    
+    # Profile options
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Report wall time, CPU time and allocations per stage to stderr"
+    )
+    parser.add_argument(
+        "--profile-log",
+        default=defaults["profile_log"],
+        help="Append the --profile report as a JSON line to this file instead (implies --profile)"
+    )
+    
     # Environment file option
     parser.add_argument(
         "--env",
@@ -352,68 +719,177 @@ def parse_arguments():
     # Performance thresholds - cache
     parser.add_argument(
         "--perf-cache",
-        default=os.environ.get("PYCCSL_PERF_CACHE", "95,90,75"),
+        default=defaults["perf_cache"],
         help="Cache hit rate thresholds (green,yellow,orange) (default: 95,90,75)"
     )
     
     # Performance thresholds - response
     parser.add_argument(
         "--perf-response",
-        default=os.environ.get("PYCCSL_PERF_RESPONSE", "10,30,60"),
+        default=defaults["perf_response"],
         help="Response time thresholds (green,yellow,orange) (default: 10,30,60)"
     )
     
+    # Response time statistic behind the badge
+    parser.add_argument(
+        "--perf-response-stat",
+        choices=RESPONSE_STAT_CHOICES,
+        default=defaults["perf_response_stat"],
+        help="Response time the badge compares with the thresholds: the mean or a percentile (default: mean)"
+    )
+    
+    # Git status cache lifetime
+    parser.add_argument(
+        "--git-ttl",
+        default=defaults["git_ttl"],
+        help=f"Seconds to reuse git status while the index and HEAD are unchanged (default: {GIT_STATUS_TTL:g})"
+    )
+    
+    # Monthly budget for the daily-budget field
+    parser.add_argument(
+        "--monthly-budget",
+        default=defaults["monthly_budget"],
+        help="Monthly budget in USD; daily-budget shows today's cost as a share of budget/days in month"
+    )
+    
+    # Latency budget for gathering git, transcript and usage data
+    parser.add_argument(
+        "--deadline-ms",
+        default=defaults["deadline_ms"],
+        help="Run data stages concurrently and render cached values for those slower than this many "
+             "milliseconds, marked with ~, while they refresh in the background (default: 0, no deadline)"
+    )
+    
     # Fields to display (positional argument)
     parser.add_argument(
         "fields",
         nargs="?",
-        default=os.environ.get("PYCCSL_FIELDS", None),
+        default=defaults["fields"],
         help="Comma-separated list of fields to display"
     )
     
-    args = parser.parse_args()
+    return parser
+
+def parse_argv_fast(argv, defaults):
+    """Parse the common command lines without importing argparse.
+    
+    Importing argparse (and gettext/locale behind it) is a noticeable share
+    of startup time, and the status line is relaunched on every refresh.
+    Only exact option names with valid values are handled here; anything
+    else (--help, abbreviations, errors) returns None so that argparse can
+    produce its usual help text and error messages.
+    
+    Returns:
+        Dict of option values, or None to fall back to argparse
+    """
+    options = dict(defaults)
+    positional_seen = False
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        i += 1
+        if arg in FAST_FLAG_OPTIONS:
+            options[arg[2:].replace("-", "_")] = True
+            continue
+        
+        name, has_value, value = arg.partition("=")
+        if name in FAST_VALUE_OPTIONS:
+            if not has_value:
+                if i >= len(argv) or argv[i].startswith("-"):
+                    return None
+                value = argv[i]
+                i += 1
+            choices = FAST_VALUE_OPTIONS[name]
+            if choices is not None and value not in choices:
+                return None
+            options[name[2:].replace("-", "_")] = value
+        elif arg.startswith("-") or positional_seen:
+            return None
+        else:
+            options["fields"] = arg
+            positional_seen = True
+    return options
+
+def parse_arguments(argv=None, environ=None):
+    """Parse command-line arguments.
+    
+    Args:
+        argv: Argument list (defaults to sys.argv[1:])
+        environ: Environment mapping for PYCCSL_* defaults (defaults to os.environ)
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if environ is None:
+        environ = os.environ
+    
+    # Debug: print raw argv
+    if "--debug" in argv:
+        sys.stderr.write(f"DEBUG: argv = {argv}\n")
+    
+    defaults = get_argument_defaults(environ)
+    options = parse_argv_fast(argv, defaults)
+    if options is None:
+        options = vars(build_argument_parser(defaults).parse_args(argv))
     
     # Load environment file if specified
     env_vars = {}
-    if args.env:
-        env_vars = parse_env_file(args.env)
-        if args.debug and env_vars:
-            sys.stderr.write(f"DEBUG: Loaded env vars from {args.env}: {list(env_vars.keys())}\n")
+    if options["env"]:
+        env_vars = parse_env_file(options["env"])
+        if options["debug"] and env_vars:
+            sys.stderr.write(f"DEBUG: Loaded env vars from {options['env']}: {list(env_vars.keys())}\n")
     
     # Apply env file overrides (higher priority than command line)
     # This allows dynamic configuration changes by modifying the env file
     if 'PYCCSL_THEME' in env_vars:
-        args.theme = env_vars['PYCCSL_THEME']
+        options["theme"] = env_vars['PYCCSL_THEME']
     if 'PYCCSL_NUMBERS' in env_vars:
-        args.numbers = env_vars['PYCCSL_NUMBERS']
+        options["numbers"] = env_vars['PYCCSL_NUMBERS']
     if 'PYCCSL_STYLE' in env_vars:
-        args.style = env_vars['PYCCSL_STYLE']
+        options["style"] = env_vars['PYCCSL_STYLE']
     if 'PYCCSL_NO_EMOJI' in env_vars:
-        args.no_emoji = env_vars['PYCCSL_NO_EMOJI'].lower() == 'true'
+        options["no_emoji"] = env_vars['PYCCSL_NO_EMOJI'].lower() == 'true'
     if 'PYCCSL_PERF_CACHE' in env_vars:
-        args.perf_cache = env_vars['PYCCSL_PERF_CACHE']
+        options["perf_cache"] = env_vars['PYCCSL_PERF_CACHE']
     if 'PYCCSL_PERF_RESPONSE' in env_vars:
-        args.perf_response = env_vars['PYCCSL_PERF_RESPONSE']
+        options["perf_response"] = env_vars['PYCCSL_PERF_RESPONSE']
+    if 'PYCCSL_PERF_RESPONSE_STAT' in env_vars:
+        options["perf_response_stat"] = env_vars['PYCCSL_PERF_RESPONSE_STAT']
     if 'PYCCSL_FIELDS' in env_vars:
-        args.fields = env_vars['PYCCSL_FIELDS']
+        options["fields"] = env_vars['PYCCSL_FIELDS']
+    if 'PYCCSL_NO_CACHE' in env_vars:
+        options["no_cache"] = env_vars['PYCCSL_NO_CACHE'].lower() == 'true'
+    if 'PYCCSL_NO_SUBAGENTS' in env_vars:
+        options["no_subagents"] = env_vars['PYCCSL_NO_SUBAGENTS'].lower() == 'true'
+    if 'PYCCSL_GIT_TTL' in env_vars:
+        options["git_ttl"] = env_vars['PYCCSL_GIT_TTL']
+    if 'PYCCSL_PROFILE_LOG' in env_vars:
+        options["profile_log"] = env_vars['PYCCSL_PROFILE_LOG']
+    if 'PYCCSL_MONTHLY_BUDGET' in env_vars:
+        options["monthly_budget"] = env_vars['PYCCSL_MONTHLY_BUDGET']
+    if 'PYCCSL_DEADLINE_MS' in env_vars:
+        options["deadline_ms"] = env_vars['PYCCSL_DEADLINE_MS']
+    if 'PYCCSL_FORMAT' in env_vars:
+        options["format"] = env_vars['PYCCSL_FORMAT']
+    if 'PYCCSL_SNAPSHOT' in env_vars:
+        options["snapshot"] = env_vars['PYCCSL_SNAPSHOT'].lower() == 'true'
     
     # Parse fields
-    if args.fields:
+    if options["fields"]:
         # Split comma-separated fields and strip whitespace
-        fields = [f.strip() for f in args.fields.split(",") if f.strip()]
+        fields = [f.strip() for f in options["fields"].split(",") if f.strip()]
         # If all fields were empty/whitespace, use defaults
         if not fields:
-            if "--debug" in sys.argv:
+            if "--debug" in argv:
                 sys.stderr.write(f"DEBUG: Empty fields specified, using defaults\n")
             fields = DEFAULT_FIELDS.copy()
     else:
-        if "--debug" in sys.argv:
+        if "--debug" in argv:
             sys.stderr.write(f"DEBUG: No fields specified, using defaults\n")
         fields = DEFAULT_FIELDS.copy()
     
     # Parse threshold values
     try:
-        cache_thresholds = [float(x) for x in args.perf_cache.split(",")]
+        cache_thresholds = [float(x) for x in options["perf_cache"].split(",")]
         if len(cache_thresholds) != 3:
             raise ValueError("Need exactly 3 cache thresholds")
     except (ValueError, AttributeError):
@@ -421,21 +897,69 @@ def parse_arguments():
         sys.exit(1)
     
     try:
-        response_thresholds = [float(x) for x in args.perf_response.split(",")]
+        response_thresholds = [float(x) for x in options["perf_response"].split(",")]
         if len(response_thresholds) != 3:
             raise ValueError("Need exactly 3 response thresholds")
     except (ValueError, AttributeError):
         print("Error: Invalid response thresholds format. Expected: three comma-separated numbers (e.g., 3,5,8)", file=sys.stderr)
         sys.exit(1)
     
+    if options["perf_response_stat"] not in RESPONSE_STAT_CHOICES:
+        print(f"Error: Invalid response statistic. Expected one of: {', '.join(RESPONSE_STAT_CHOICES)}", file=sys.stderr)
+        sys.exit(1)
+    
+    if options["format"] not in FORMAT_CHOICES:
+        print(f"Error: Invalid output format. Expected one of: {', '.join(FORMAT_CHOICES)}", file=sys.stderr)
+        sys.exit(1)
+    
+    try:
+        git_ttl = float(options["git_ttl"])
+    except (ValueError, TypeError):
+        print("Error: Invalid git TTL. Expected a number of seconds (e.g., 5)", file=sys.stderr)
+        sys.exit(1)
+    
+    monthly_budget = None
+    if options["monthly_budget"]:
+        try:
+            monthly_budget = float(options["monthly_budget"])
+            if monthly_budget <= 0:
+                raise ValueError("Budget must be positive")
+        except ValueError:
+            print("Error: Invalid monthly budget. Expected a positive amount in USD (e.g., 100)", file=sys.stderr)
+            sys.exit(1)
+    
+    try:
+        deadline_ms = float(options["deadline_ms"] or 0)
+        if deadline_ms < 0:
+            raise ValueError("Deadline must not be negative")
+    except ValueError:
+        print("Error: Invalid deadline. Expected a number of milliseconds (e.g., 150), or 0 for none", file=sys.stderr)
+        sys.exit(1)
+    
     return {
-        "theme": args.theme,
-        "numbers": args.numbers,
-        "style": args.style,
-        "no_emoji": args.no_emoji,
-        "debug": args.debug,
+        "theme": options["theme"],
+        "numbers": options["numbers"],
+        "style": options["style"],
+        "no_emoji": options["no_emoji"],
+        "debug": options["debug"],
+        "cache": not options["no_cache"],
+        "subagents": not options["no_subagents"],
+        "git_ttl": git_ttl,
+        "monthly_budget": monthly_budget,
+        "deadline_ms": deadline_ms,
+        "daemon": options["daemon"],
+        "batch": options["batch"],
+        "watch": options["watch"],
+        "cwd": options["cwd"],
+        "output": options["output"],
+        "format": options["format"],
+        "snapshot": options["snapshot"],
+        "read_snapshot": options["read_snapshot"],
+        "profile": options["profile"] or bool(options["profile_log"]),
+        "profile_log": options["profile_log"] or None,
         "cache_thresholds": cache_thresholds,
         "response_thresholds": response_thresholds,
+        "response_stat": options["perf_response_stat"],
         "fields": fields
     }
 
@@ -449,23 +973,30 @@ def read_input():
         
         # Read from stdin
         input_data = sys.stdin.read()
-        
-        if not input_data.strip():
-            print("Error: Empty input received.", file=sys.stderr)
-            sys.exit(2)
-        
-        # Parse JSON
-        try:
-            data = json.loads(input_data)
-        except json.JSONDecodeError as e:
-            print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
-            sys.exit(2)
-        
-        return data
-        
     except Exception as e:
         print(f"Error reading input: {e}", file=sys.stderr)
         sys.exit(2)
+    
+    return parse_input(input_data)
+
+def parse_input(input_data):
+    """Parse the JSON document Claude Code sends on stdin."""
+    if not input_data.strip():
+        print("Error: Empty input received.", file=sys.stderr)
+        sys.exit(2)
+    
+    # Parse JSON
+    try:
+        data = json.loads(input_data)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
+        sys.exit(2)
+    
+    if not isinstance(data, dict):
+        print("Error: Invalid JSON input: expected an object", file=sys.stderr)
+        sys.exit(2)
+    
+    return data
 
 def extract_model_info(data):
     """Extract model information from input data."""
@@ -481,526 +1012,2503 @@ def extract_model_info(data):
     except Exception:
         return {"display_name": "Unknown", "id": None}
 
-def extract_git_status(input_data):
-    """Extract git status information from the current directory.
+def run_git(args, cwd):
+    """Run a git command and return its stdout, or None if it fails.
     
-    Returns a dict with:
-    - branch: Current branch name or None
-    - modified_count: Number of modified/staged files or 0
+    Args:
+        args: git arguments (without the leading "git")
+        cwd: Directory to run git in
     """
+    import subprocess
+    
     try:
-        # Get working directory from input or use current
-        cwd = input_data.get("cwd", os.getcwd())
-        
-        # Get current branch name
-        branch_result = subprocess.run(
-            ["git", "rev-parse", "--abbrev-ref", "HEAD"],
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
-        
-        if branch_result.returncode != 0:
-            # Not a git repository
-            return {"branch": None, "modified_count": 0}
-        
-        branch = branch_result.stdout.strip()
-        
-        # Get modified file count using porcelain format
-        status_result = subprocess.run(
-            ["git", "status", "--porcelain"],
+        result = subprocess.run(
+            ["git"] + args,
             cwd=cwd,
             capture_output=True,
             text=True,
             timeout=2
         )
-        
-        # Count non-empty lines (each represents a modified file)
-        modified_count = 0
-        if status_result.returncode == 0:
-            modified_count = len([line for line in status_result.stdout.splitlines() if line.strip()])
-        
-        return {"branch": branch, "modified_count": modified_count}
-        
-    except (subprocess.TimeoutExpired, FileNotFoundError):
+    except (subprocess.TimeoutExpired, OSError):
         # Git not available or timeout
-        return {"branch": None, "modified_count": 0}
-    except Exception:
-        # Any other error - fail silently
-        return {"branch": None, "modified_count": 0}
-
-def get_model_pricing(model_id):
-    """Get pricing information for a model ID.
-    
-    Returns a dict with pricing info or None if model not found.
-    """
-    if model_id and model_id in PRICING_DATA:
-        return PRICING_DATA[model_id]
-    return None
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
 
-def load_transcript(transcript_path, debug=False):
-    """Load and parse a Claude Code transcript JSONL file.
+def find_git_repository(cwd):
+    """Locate the git repository containing cwd without running git.
     
-    Args:
-        transcript_path: Path to the transcript file
-        debug: Whether to output debug information
+    Walks up from cwd looking for a .git directory, or a .git file pointing
+    at the real git directory (worktrees and submodules).
     
     Returns:
-        List of parsed JSON entries, or empty list on error
+        Dict with git_dir, common_dir (shared refs, differs for worktrees)
+        and worktree, or None if cwd is not inside a repository
+    
+    Raises:
+        ValueError: For layouts this resolver does not handle (GIT_DIR set,
+            bare repositories, unreadable .git files); callers fall back to git
     """
-    if not transcript_path:
-        if debug:
-            sys.stderr.write(f"DEBUG: No transcript path provided\n")
-        return []
+    if "GIT_DIR" in os.environ or "GIT_WORK_TREE" in os.environ:
+        raise ValueError("GIT_DIR/GIT_WORK_TREE override")
     
-    if not os.path.exists(transcript_path):
-        if debug:
-            sys.stderr.write(f"DEBUG: Transcript file does not exist: {transcript_path}\n")
-        return []
+    directory = os.path.abspath(cwd)
+    if not os.path.isdir(directory):
+        return None
+    
+    while True:
+        dot_git = os.path.join(directory, ".git")
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+            break
+        if os.path.isfile(dot_git):
+            # Worktree or submodule: "gitdir: <path>", relative to the .git file
+            with open(dot_git, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+            if not content.startswith("gitdir:"):
+                raise ValueError(f"Unrecognized .git file: {dot_git}")
+            git_dir = os.path.join(directory, content[len("gitdir:"):].strip())
+            break
+        if os.path.basename(directory) == ".git" or os.path.isfile(os.path.join(directory, "HEAD")) \
+                and os.path.isdir(os.path.join(directory, "objects")):
+            raise ValueError("Inside a git directory or bare repository")
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+    
+    git_dir = os.path.normpath(git_dir)
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file, 'r', encoding='utf-8') as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
     
+    if not os.path.isfile(os.path.join(git_dir, "HEAD")):
+        raise ValueError(f"No HEAD in {git_dir}")
+    
+    return {"git_dir": git_dir, "common_dir": common_dir, "worktree": directory}
+
+def read_packed_refs(common_dir):
+    """Read the ref names listed in packed-refs (empty set if there is none)."""
+    refs = set()
     try:
-        entries = []
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue  # Skip empty lines
-                try:
-                    entry = json.loads(line)
-                    entries.append(entry)
-                except json.JSONDecodeError as e:
-                    # Log error but continue processing other lines
-                    print(f"Warning: Invalid JSON at line {line_num} in transcript: {e}", file=sys.stderr)
-                    continue
-        if debug:
-            sys.stderr.write(f"DEBUG: Successfully loaded {len(entries)} transcript entries\n")
-        return entries
+        with open(os.path.join(common_dir, "packed-refs"), 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith(("#", "^")):
+                    continue  # Header or peeled tag line
+                parts = line.split()
+                if len(parts) == 2:
+                    refs.add(parts[1])
     except FileNotFoundError:
-        # Transcript file not found - this is expected for new sessions
-        if debug:
-            sys.stderr.write(f"DEBUG: Transcript file not found: {transcript_path}\n")
-        return []
-    except (PermissionError, IOError) as e:
-        # File access errors
-        if debug:
-            sys.stderr.write(f"DEBUG: Cannot access transcript file: {e}\n")
-        return []
-    except Exception as e:
-        # Other unexpected errors
-        if debug:
-            sys.stderr.write(f"DEBUG: Unexpected error reading transcript: {e}\n")
-        return []
+        pass
+    return refs
 
-def calculate_token_usage(transcript_entries):
-    """Calculate total token usage from transcript entries.
+def read_git_branch(repo):
+    """Resolve the current branch name the way `git rev-parse --abbrev-ref HEAD` does.
+    
+    Reads HEAD, follows symbolic refs through loose ref files and
+    packed-refs, and reports "HEAD" for a detached HEAD.
     
     Args:
-        transcript_entries: List of parsed transcript entries
+        repo: Repository dict from find_git_repository()
     
     Returns:
-        Dict with token totals: input_tokens, output_tokens, 
-        cache_creation_tokens, cache_read_tokens
+        Branch name, "HEAD" if detached, or None if the branch has no commits yet
+    
+    Raises:
+        ValueError: For refs this resolver does not handle; callers fall back to git
     """
-    totals = {
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "cache_creation_tokens": 0,
-        "cache_read_tokens": 0
-    }
+    git_dir = repo["git_dir"]
+    common_dir = repo["common_dir"]
+    packed_refs = None
     
-    for entry in transcript_entries:
-        usage = None
-        
-        # Check for usage in assistant messages
-        if entry.get("type") == "assistant" and "message" in entry:
-            usage = entry["message"].get("usage", {})
+    ref = "HEAD"
+    for _ in range(5):  # Limit symbolic ref chains
+        content = None
+        for base in (git_dir, common_dir):
+            try:
+                with open(os.path.join(base, ref), 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                break
+            except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+                continue
         
-        # Check for usage in tool use results (only if it's a dict)
-        elif "toolUseResult" in entry and isinstance(entry["toolUseResult"], dict):
-            usage = entry["toolUseResult"].get("usage", {})
+        if content is None:
+            if packed_refs is None:
+                packed_refs = read_packed_refs(common_dir)
+            if ref not in packed_refs:
+                return None  # Unborn branch - git rev-parse fails here too
+            break
         
-        if usage:
-            # Add tokens to totals
-            totals["input_tokens"] += usage.get("input_tokens", 0)
-            totals["output_tokens"] += usage.get("output_tokens", 0)
-            totals["cache_creation_tokens"] += usage.get("cache_creation_input_tokens", 0)
-            totals["cache_read_tokens"] += usage.get("cache_read_input_tokens", 0)
-    
-    return totals
-
-def get_model_from_transcript(transcript_entries):
-    """Extract the model ID from transcript entries.
+        if content.startswith("ref:"):
+            ref = content[len("ref:"):].strip()
+            continue
+        if ref == "HEAD":
+            return "HEAD"  # Detached HEAD
+        break
+    else:
+        raise ValueError("Symbolic ref chain too long")
     
-    Looks for the first assistant message with a model ID.
+    if not ref.startswith("refs/heads/") or ref.endswith("/.invalid"):
+        raise ValueError(f"Unsupported ref: {ref}")  # e.g. reftable repositories
+    branch = ref[len("refs/heads/"):]
     
-    Args:
-        transcript_entries: List of parsed transcript entries
+    # git disambiguates short names that also match a tag or remote ("heads/x")
+    if packed_refs is None:
+        packed_refs = read_packed_refs(common_dir)
+    for other in (f"refs/{branch}", f"refs/tags/{branch}", f"refs/remotes/{branch}",
+                  f"refs/remotes/{branch}/HEAD"):
+        if other in packed_refs or os.path.isfile(os.path.join(common_dir, other)):
+            raise ValueError(f"Ambiguous branch name: {branch}")
     
-    Returns:
-        Model ID string or None if not found
-    """
-    for entry in transcript_entries:
-        if entry.get("type") == "assistant" and "message" in entry:
-            model_id = entry["message"].get("model")
-            if model_id:
-                return model_id
-    return None
+    return branch
 
-def calculate_cost_per_entry(usage, model_id):
-    """Calculate cost for a single entry based on its token usage and model.
+def get_git_fingerprint(repo, branch):
+    """Stat the files whose changes invalidate a cached git status.
     
-    Args:
-        usage: Dict with token usage for this entry
-        model_id: Model ID string for pricing lookup
+    Covers the index (staging, and git's own stat refreshes), HEAD
+    (checkouts), the current branch ref and packed-refs (commits).
     
     Returns:
-        Cost in dollars (float) or 0.0 if model not found
+        List of [mtime_ns, size] (or None for missing files), JSON friendly
     """
-    pricing = get_model_pricing(model_id)
-    if not pricing:
-        return 0.0
+    paths = [
+        os.path.join(repo["git_dir"], "index"),
+        os.path.join(repo["git_dir"], "HEAD"),
+        os.path.join(repo["common_dir"], "packed-refs")
+    ]
+    if branch and branch != "HEAD":
+        paths.append(os.path.join(repo["common_dir"], "refs", "heads", branch))
     
-    # Calculate cost using the formula (all rates are per million tokens)
-    # Using 5-minute cache write rate (Claude Code default)
-    cost = (
-        usage.get("input_tokens", 0) * pricing.get("input", 0) +
-        usage.get("cache_creation_input_tokens", 0) * pricing.get("cache_write_5m", 0) +
-        usage.get("cache_read_input_tokens", 0) * pricing.get("cache_read", 0) +
-        usage.get("output_tokens", 0) * pricing.get("output", 0)
-    ) / 1_000_000
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append([stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            fingerprint.append(None)
+    return fingerprint
+
+def count_modified_files(cwd):
+    """Count modified/staged/untracked files using `git status --porcelain`."""
+    status_output = run_git(["status", "--porcelain"], cwd)
     
-    return cost
+    # Count non-empty lines (each represents a modified file)
+    if status_output is None:
+        return 0
+    return len([line for line in status_output.splitlines() if line.strip()])
 
-def calculate_total_cost(transcript_entries, debug=False):
-    """Calculate total session cost by summing per-entry costs using each entry's model.
+def extract_git_status(input_data, ttl=GIT_STATUS_TTL, use_cache=True):
+    """Extract git status information from the current directory.
+    
+    The branch is read directly from the .git directory; git itself is only
+    run for the modified file count and for repository layouts the
+    pure-Python resolver does not handle. The result is cached per
+    repository and reused for up to `ttl` seconds while the index, HEAD and
+    current ref are unchanged, so a quiet repository costs a few stat calls.
     
     Args:
-        transcript_entries: List of parsed transcript entries
-        debug: Whether to output debug information
+        input_data: Input JSON data (uses "cwd")
+        ttl: Seconds a cached result may be reused
+        use_cache: Whether to read and write the git status cache
     
-    Returns:
-        Total cost in dollars (float)
+    Returns a dict with:
+    - branch: Current branch name or None
+    - modified_count: Number of modified/staged files or 0
     """
-    total_cost = 0.0
-    model_costs = {}  # Track costs per model for debugging
-    
-    # Build UUID lookup for finding parent models
-    uuid_lookup = {}
-    for entry in transcript_entries:
-        uuid = entry.get("uuid")
-        if uuid:
-            uuid_lookup[uuid] = entry
+    import time
     
-    # Track the last seen model for tool results that don't specify one
-    last_model_id = None
-    
-    for entry in transcript_entries:
-        usage = None
-        model_id = None
+    try:
+        # Get working directory from input or use current
+        cwd = input_data.get("cwd", os.getcwd())
         
-        # Check for usage and model in assistant messages
-        if entry.get("type") == "assistant" and "message" in entry:
-            message = entry["message"]
-            usage = message.get("usage", {})
-            model_info = message.get("model")
-            
-            # Handle both string and dict formats for model
-            if isinstance(model_info, dict):
-                model_id = model_info.get("id")
-            else:
-                model_id = model_info
-                
-            if model_id:
-                last_model_id = model_id  # Remember this model
+        try:
+            repo = find_git_repository(cwd)
+        except (ValueError, OSError, UnicodeDecodeError):
+            # Unusual layout - let git do everything, uncached
+            branch_output = run_git(["rev-parse", "--abbrev-ref", "HEAD"], cwd)
+            if not branch_output or not branch_output.strip():
+                return {"branch": None, "modified_count": 0}
+            return {"branch": branch_output.strip(), "modified_count": count_modified_files(cwd)}
         
-        # Check for usage in tool use results
-        elif "toolUseResult" in entry and isinstance(entry["toolUseResult"], dict):
-            usage = entry["toolUseResult"].get("usage", {})
-            
-            # Try to find model from parent assistant message
-            parent_uuid = entry.get("parentUuid")
-            if parent_uuid and parent_uuid in uuid_lookup:
-                parent = uuid_lookup[parent_uuid]
-                if parent.get("type") == "assistant" and "message" in parent:
-                    parent_model = parent["message"].get("model")
-                    # Extract model ID from dict if needed
-                    if isinstance(parent_model, dict):
-                        model_id = parent_model.get("id")
-                    else:
-                        model_id = parent_model
-            
-            # Fallback to last seen model if parent lookup fails
-            if not model_id:
-                model_id = last_model_id
+        if repo is None:
+            # Not a git repository
+            return {"branch": None, "modified_count": 0}
         
-        if usage and model_id:
-            entry_cost = calculate_cost_per_entry(usage, model_id)
-            total_cost += entry_cost
-            
-            # Track per-model costs for debugging
-            if model_id not in model_costs:
-                model_costs[model_id] = 0.0
-            model_costs[model_id] += entry_cost
-        elif usage and not model_id and debug:
-            # Log entries with usage but no model
-            sys.stderr.write(f"DEBUG: Entry with usage but no model: {entry.get('uuid', 'unknown')[:8]}\n")
+        # Reuse the cached result if nothing relevant changed
+        cache_path = get_cache_path("git", repo["git_dir"]) if use_cache else None
+        cached = GIT_STATUS_CACHE.get(repo["git_dir"]) if use_cache else None
+        if cached is None and cache_path:
+            cached = read_cache_file(cache_path)
+        if cached and 0 <= time.time() - cached.get("checked_at", 0) < ttl and \
+                cached.get("fingerprint") == get_git_fingerprint(repo, cached.get("branch")):
+            GIT_STATUS_CACHE[repo["git_dir"]] = cached
+            return {"branch": cached["branch"], "modified_count": cached["modified_count"]}
+        
+        # Get current branch name
+        try:
+            branch = read_git_branch(repo)
+        except (ValueError, OSError, UnicodeDecodeError):
+            branch_output = run_git(["rev-parse", "--abbrev-ref", "HEAD"], cwd)
+            branch = branch_output.strip() if branch_output is not None else None
+        
+        if not branch:
+            # Unborn branch
+            return {"branch": None, "modified_count": 0}
+        
+        checked_at = time.time()
+        modified_count = count_modified_files(cwd)
+        
+        if use_cache:
+            # Fingerprint after git status, which may have refreshed the index
+            cached = {
+                "branch": branch,
+                "modified_count": modified_count,
+                "checked_at": checked_at,
+                "fingerprint": get_git_fingerprint(repo, branch)
+            }
+            GIT_STATUS_CACHE[repo["git_dir"]] = cached
+            write_cache_file(cache_path, cached)
+        
+        return {"branch": branch, "modified_count": modified_count}
+        
+    except Exception:
+        # Any other error - fail silently
+        return {"branch": None, "modified_count": 0}
+
+# Model families in PRICING_DATA (family -> sorted [(version, date, key)]),
+# built on first use by resolve_pricing_key
+PRICING_FAMILIES = None
+
+# Model ID -> PRICING_DATA key (or None) for IDs not in PRICING_DATA
+PRICING_KEYS = {}
+
+def parse_model_id(model_id):
+    """Split a Claude model ID into family, version and release date.
     
-    if debug and model_costs:
-        sys.stderr.write(f"DEBUG: Cost breakdown by model:\n")
-        for model_id, cost in model_costs.items():
-            sys.stderr.write(f"DEBUG:   {model_id}: ${cost:.4f}\n")
-        sys.stderr.write(f"DEBUG:   Total: ${total_cost:.4f}\n")
+    Handles both naming schemes ("claude-3-5-sonnet-20241022",
+    "claude-sonnet-4-20250514") as well as provider forms such as
+    "us.anthropic.claude-sonnet-4-20250514-v1:0" and "claude-sonnet-4@20250514".
     
-    return total_cost
+    Returns:
+        (family, version tuple, date string or "") or None if the ID does
+        not name a Claude model family
+    """
+    model_id = model_id.lower()
+    start = model_id.find("claude-")
+    if start < 0:
+        return None
+    family = None
+    version = []
+    date = ""
+    for token in model_id[start + 7:].replace("@", "-").split("-"):
+        if token in ("opus", "sonnet", "haiku"):
+            family = token
+        elif token.isdigit() and len(token) == 8:
+            date = token
+            break
+        elif token.isdigit() and len(token) <= 2:
+            version.append(int(token))
+    if family is None or not version:
+        return None
+    return family, tuple(version), date
 
-def format_cost(cost):
-    """Format cost as dollars or cents.
+def resolve_pricing_key(model_id):
+    """Find the PRICING_DATA entry to price a model ID with.
     
-    Args:
-        cost: Cost in dollars (float)
+    Known IDs map to themselves. Unknown ones (new dated releases, provider
+    prefixes and suffixes) are priced as the newest known model of the same
+    family and the same or an older version, or the oldest of the family if
+    the ID predates them all. Results are cached per ID.
     
     Returns:
-        Formatted string (e.g., "$1.25" or "48¢")
+        PRICING_DATA key, or None if the ID can't be matched to a family
     """
-    if cost >= 1.0:
-        return f"${cost:.2f}"
-    else:
-        cents = int(round(cost * 100))
-        return f"{cents}¢"
+    global PRICING_FAMILIES
+    if model_id in PRICING_DATA:
+        return model_id
+    if model_id in PRICING_KEYS:
+        return PRICING_KEYS[model_id]
+    
+    if PRICING_FAMILIES is None:
+        PRICING_FAMILIES = {}
+        for key in PRICING_DATA:
+            family, version, date = parse_model_id(key)
+            PRICING_FAMILIES.setdefault(family, []).append((version, date, key))
+        for candidates in PRICING_FAMILIES.values():
+            candidates.sort()
+    
+    key = None
+    parsed = parse_model_id(model_id)
+    if parsed and parsed[0] in PRICING_FAMILIES:
+        family, version, _ = parsed
+        candidates = PRICING_FAMILIES[family]
+        older = [candidate for candidate in candidates if candidate[0] <= version]
+        key = (older[-1] if older else candidates[0])[2]
+    PRICING_KEYS[model_id] = key
+    return key
 
-def format_number(value, style="compact"):
-    """Format a number based on style preference.
+def get_model_pricing(model_id):
+    """Get pricing information for a model ID.
     
-    Args:
-        value: Number to format
-        style: "compact" (1.2K), "full" (1,234), or "raw" (1234)
+    Unknown IDs are priced by family (see resolve_pricing_key).
     
-    Returns:
-        Formatted string
+    Returns a dict with pricing info or None if model not found.
     """
-    if style == "compact":
-        if value >= 1_000_000:
-            return f"{value/1_000_000:.1f}M"
-        elif value >= 1_000:
-            return f"{value/1_000:.1f}K"
-        else:
-            return str(value)
-    elif style == "full":
-        return f"{value:,}"
-    else:  # raw
-        return str(value)
+    if model_id:
+        key = resolve_pricing_key(model_id)
+        if key is not None:
+            return PRICING_DATA[key]
+    return None
 
-def calculate_performance_badge(cache_hit_rate, avg_response_time, cache_thresholds, response_thresholds, colored=False, powerline=False, no_emoji=False):
-    """Calculate performance badge based on metrics and thresholds.
+def calculate_model_cost(model_id, token_sums):
+    """Calculate the cost of token counts summed over entries of one model.
     
     Args:
-        cache_hit_rate: Cache hit rate (0.0 to 1.0)
-        avg_response_time: Average response time in seconds
-        cache_thresholds: List of [green, yellow, orange] thresholds for cache hit rate
-        response_thresholds: List of [green, yellow, orange] thresholds for response time
-        colored: Whether to apply colors to the badge
-        powerline: Whether this is for powerline style (different coloring)
+        model_id: Model ID string for pricing lookup
+        token_sums: Token counts in TOKEN_COLUMNS order
     
     Returns:
-        Badge string (e.g., "●○○○", "○●○○", "○○●○", "○○○●")
+        Cost in dollars (float) or 0.0 if model not found
     """
-    # Calculate performance level for cache hit rate (higher is better)
-    cache_percent = cache_hit_rate * 100
-    if cache_percent >= cache_thresholds[0]:
-        cache_level = 0  # Green
-    elif cache_percent >= cache_thresholds[1]:
-        cache_level = 1  # Yellow
-    elif cache_percent >= cache_thresholds[2]:
-        cache_level = 2  # Orange
-    else:
-        cache_level = 3  # Red
+    pricing = get_model_pricing(model_id)
+    if not pricing:
+        return 0.0
+    input_tokens, output_tokens, cache_creation, cache_read = token_sums
+    # All rates are per million tokens; using 5-minute cache write rate
+    # (Claude Code default)
+    return (
+        input_tokens * pricing.get("input", 0) +
+        cache_creation * pricing.get("cache_write_5m", 0) +
+        cache_read * pricing.get("cache_read", 0) +
+        output_tokens * pricing.get("output", 0)
+    ) / 1_000_000
+
+# Entry type codes stored in the "type" column of transcript columns
+# (anything else is 0)
+ENTRY_TYPE_CODES = {"user": 1, "assistant": 2}
+
+# Rows from which the columnar summaries use NumPy when it is installed;
+# below this, importing it costs more than vectorizing saves
+NUMPY_MIN_ROWS = 20_000
+
+# Token columns and the usage keys they are read from
+TOKEN_COLUMNS = [
+    ("input_tokens", "input_tokens"),
+    ("output_tokens", "output_tokens"),
+    ("cache_creation_tokens", "cache_creation_input_tokens"),
+    ("cache_read_tokens", "cache_read_input_tokens")
+]
+
+def new_transcript_columns():
+    """Create empty transcript columns.
     
-    # Calculate performance level for response time (lower is better)
-    if avg_response_time <= response_thresholds[0]:
-        response_level = 0  # Green
-    elif avg_response_time <= response_thresholds[1]:
-        response_level = 1  # Yellow
-    elif avg_response_time <= response_thresholds[2]:
-        response_level = 2  # Orange
-    else:
-        response_level = 3  # Red
+    The compact form of a parsed transcript: one row per user/assistant entry
+    or entry carrying usage, with token counts and epoch timestamps in typed
+    arrays and entry types and models as small int codes into "model_ids".
+    Message content and tool output are never kept, so a transcript of
+    hundreds of MB takes a few MB. Missing timestamps are NaN; "turn" holds
+    the timestamp of the user turn a reply answers (NaN if unknown); "model"
+    is -1 when unknown. The "uuid_*" tables and "user_timestamps" are the
+    bounded windows used to resolve models and turns while rows are added;
+    "session_id" and "cwd" come from the first entry that carries them, and
+    "agent_id" from the first sidechain entry. "tasks" maps the row index of
+    each Task tool result to the agentId of its sub-agent.
+    """
+    from array import array
     
-    # Combine metrics (take the worse of the two)
-    overall_level = max(cache_level, response_level)
+    columns = {
+        "entry_count": 0,
+        "session_id": None,
+        "agent_id": None,
+        "cwd": None,
+        "type": array('b'),
+        "model": array('h'),
+        "timestamp": array('d'),
+        "turn": array('d'),
+        "model_ids": [],
+        "model_codes": {},
+        "last_model": -1,
+        "uuid_models": {},
+        "uuid_turns": {},
+        "user_timestamps": [],
+        "tasks": {}
+    }
+    for column, _ in TOKEN_COLUMNS:
+        columns[column] = array('q')
+    return columns
+
+def append_transcript_columns(columns, entry, debug=False):
+    """Add a parsed transcript entry to transcript columns.
     
-    # Choose characters based on emoji preference and color availability
-    active_char = "*" if no_emoji else "●"
-    # When no colors, use open circles for inactive so they're distinguishable
-    # When colors are used, use filled circles for both (distinguished by color)
-    inactive_char = "o" if no_emoji else ("○" if not colored else "●")
+    Models and user turns are resolved exactly as update_transcript_state
+    does, so summaries of the columns match the fused analyzer.
+    """
+    columns["entry_count"] += 1
+    usage = None
+    model = -1
+    task_agent_id = None
+    entry_type = entry.get("type")
+    if columns["cwd"] is None and "cwd" in entry:
+        columns["session_id"] = entry.get("sessionId")
+        columns["cwd"] = entry["cwd"]
+    if columns["agent_id"] is None and entry.get("isSidechain"):
+        columns["agent_id"] = entry.get("agentId")
     
-    # Generate badge string with colors if requested
-    if colored:
-        # Define colors for each level: green, darker yellow, orange, red
-        colors = [82, 220, 208, 196]  # ANSI 256-color codes (220 is darker yellow)
-        
-        if powerline:
-            # Powerline style: white background throughout, black dots except for the active one
-            # Build the entire string with continuous white background
-            result = "\033[48;5;244m"  # Start with 50% gray background
-            for i in range(4):
-                if i == overall_level:
-                    # Active dot - just change foreground color, keep white background
-                    result += f"\033[38;5;{colors[i]}m{active_char}"
-                else:
-                    # Inactive dot - black foreground, keep white background
-                    result += f"\033[38;5;0m{inactive_char}"
-            # Don't add RESET here - let the powerline handler manage that
-            return result
-        else:
-            # Regular style: colored active dot, gray inactive dots
-            gray = 244  # Gray for inactive dots
-            dots = []
-            for i in range(4):
-                if i == overall_level:
-                    # Active dot with its color
-                    dots.append(apply_color(active_char, fg_color=colors[i]))
-                else:
-                    # Inactive dot - gray outline
-                    dots.append(apply_color(inactive_char, fg_color=gray))
-            return "".join(dots)
+    if entry_type == "assistant" and "message" in entry:
+        message = entry["message"]
+        usage = message.get("usage", {})
+        model_id = extract_model_id(message.get("model"))
+        if model_id:
+            model = columns["model_codes"].get(model_id)
+            if model is None:
+                model = len(columns["model_ids"])
+                columns["model_ids"].append(model_id)
+                columns["model_codes"][model_id] = model
+            columns["last_model"] = model
+            uuid = entry.get("uuid")
+            if uuid:
+                uuid_models = columns["uuid_models"]
+                uuid_models[uuid] = model
+                if len(uuid_models) > CHECKPOINT_UUID_WINDOW:
+                    del uuid_models[next(iter(uuid_models))]
+    elif "toolUseResult" in entry and isinstance(entry["toolUseResult"], dict):
+        usage = entry["toolUseResult"].get("usage", {})
+        model = columns["uuid_models"].get(entry.get("parentUuid"), columns["last_model"])
+        task_agent_id = entry["toolUseResult"].get("agentId")
+    
+    if usage and model < 0 and debug:
+        sys.stderr.write(f"DEBUG: Entry with usage but no model: {entry.get('uuid', 'unknown')[:8]}\n")
+    
+    timestamp = None
+    timestamp_str = entry.get("timestamp")
+    if timestamp_str and entry_type in ("user", "assistant"):
+        timestamp = parse_timestamp(timestamp_str)
+    
+    # Follow parentUuid back to the triggering user turn
+    parent_uuid = entry.get("parentUuid")
+    uuid_turns = columns["uuid_turns"]
+    if entry_type == "user" and timestamp is not None:
+        turn_timestamp = timestamp
     else:
-        # Plain badge without colors
-        badges = [
-            f"{active_char}{inactive_char}{inactive_char}{inactive_char}",
-            f"{inactive_char}{active_char}{inactive_char}{inactive_char}",
-            f"{inactive_char}{inactive_char}{active_char}{inactive_char}",
-            f"{inactive_char}{inactive_char}{inactive_char}{active_char}"
-        ]
-        return badges[overall_level]
+        turn_timestamp = uuid_turns.get(parent_uuid) if parent_uuid else None
+    uuid = entry.get("uuid")
+    if uuid and turn_timestamp is not None:
+        uuid_turns[uuid] = turn_timestamp
+        if len(uuid_turns) > CHECKPOINT_UUID_WINDOW:
+            del uuid_turns[next(iter(uuid_turns))]
+    
+    reply_turn = None
+    if timestamp is not None:
+        user_timestamps = columns["user_timestamps"]
+        if entry_type == "user":
+            if not user_timestamps or timestamp >= user_timestamps[-1]:
+                user_timestamps.append(timestamp)
+            else:
+                import bisect
+                bisect.insort(user_timestamps, timestamp)
+            if len(user_timestamps) > CHECKPOINT_UUID_WINDOW:
+                del user_timestamps[0]
+        else:
+            reply_turn = uuid_turns.get(parent_uuid) if parent_uuid else None
+            if reply_turn is None:
+                reply_turn = find_previous_timestamp(user_timestamps, timestamp)
+    
+    if not usage and entry_type not in ENTRY_TYPE_CODES:
+        return
+    if usage and task_agent_id:
+        columns["tasks"][len(columns["type"])] = task_agent_id
+    columns["type"].append(ENTRY_TYPE_CODES.get(entry_type, 0))
+    columns["model"].append(model if usage else -1)
+    columns["timestamp"].append(timestamp if timestamp is not None else float("nan"))
+    columns["turn"].append(reply_turn if reply_turn is not None else float("nan"))
+    for column, key in TOKEN_COLUMNS:
+        columns[column].append(usage.get(key, 0) if usage else 0)
 
-def calculate_performance_metrics(transcript_entries, token_totals, debug=False):
-    """Calculate performance metrics from transcript.
+def load_transcript_columns(transcript_path, debug=False):
+    """Load a Claude Code transcript JSONL file into transcript columns.
+    
+    Entries are decoded one line at a time and reduced to column rows, so
+    peak memory is a few MB regardless of how much content the transcript
+    carries.
     
     Args:
-        transcript_entries: List of parsed transcript entries
-        token_totals: Dict with token usage totals
+        transcript_path: Path to the transcript file
         debug: Whether to output debug information
     
     Returns:
-        Dict with performance metrics
+        Transcript columns (see new_transcript_columns); empty on error
     """
-    metrics = {}
-    
-    # Calculate cache hit rate
-    total_input = (token_totals.get("input_tokens", 0) + 
-                   token_totals.get("cache_creation_tokens", 0) + 
-                   token_totals.get("cache_read_tokens", 0))
-    if total_input > 0:
-        cache_hit_rate = token_totals.get("cache_read_tokens", 0) / total_input
-        metrics["cache_hit_rate"] = cache_hit_rate
-    else:
-        metrics["cache_hit_rate"] = 0.0
+    columns = new_transcript_columns()
+    if not transcript_path:
+        if debug:
+            sys.stderr.write(f"DEBUG: No transcript path provided\n")
+        return columns
     
-    # Build UUID lookup map for parent-child relationships
-    uuid_lookup = {}
-    for entry in transcript_entries:
-        uuid = entry.get("uuid")
-        if uuid:
-            uuid_lookup[uuid] = entry
+    loads = get_json_loads()
+    try:
+        with open(transcript_path, 'rb') as f:
+            for line_num, raw_line in enumerate(f, 1):
+                if raw_line.isspace():
+                    continue  # Skip empty lines
+                try:
+                    entry = loads(raw_line)
+                except ValueError as e:
+                    # Log error but continue processing other lines
+                    print(f"Warning: Invalid JSON at line {line_num} in transcript: {e}", file=sys.stderr)
+                    continue
+                if isinstance(entry, dict):
+                    append_transcript_columns(columns, entry, debug=debug)
+    except OSError as e:
+        # Missing transcript (new session) or access error
+        if debug:
+            sys.stderr.write(f"DEBUG: Cannot read transcript file: {e}\n")
+        return new_transcript_columns()
     
     if debug:
-        sys.stderr.write(f"DEBUG: Built UUID lookup with {len(uuid_lookup)} entries\n")
+        sys.stderr.write(f"DEBUG: Loaded {columns['entry_count']} transcript entries into {len(columns['type'])} rows\n")
+    return columns
+
+def get_transcript_columns(transcript, debug=False):
+    """Get transcript columns for a list of parsed entries (or pass columns through)."""
+    if isinstance(transcript, dict):
+        return transcript
+    columns = new_transcript_columns()
+    for entry in transcript:
+        append_transcript_columns(columns, entry, debug=debug)
+    return columns
+
+def calculate_column_costs(columns):
+    """Calculate the cost of every row of transcript columns.
     
-    # Calculate response times and count messages
-    user_timestamps = []
-    assistant_timestamps = []
-    response_times = []
+    Uses the same formula as calculate_model_cost. Summaries don't need
+    this (they price per model), but stores of individual rows do.
     
-    # Process entries to collect basic metrics
-    for entry in transcript_entries:
-        timestamp_str = entry.get("timestamp")
-        if not timestamp_str:
-            continue
-            
-        try:
-            # Parse ISO format timestamp
-            timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        except:
+    Returns:
+        array('d') of per-row costs in dollars (0.0 for rows without a model)
+    """
+    from array import array
+    
+    pricing = [get_model_pricing(model_id) or {} for model_id in columns["model_ids"]]
+    np = get_numpy() if len(columns["model"]) >= NUMPY_MIN_ROWS else None
+    if np is not None:
+        # Same operations in the same order, element-wise
+        rates = np.array([[model_rates.get("input", 0), model_rates.get("cache_write_5m", 0),
+                           model_rates.get("cache_read", 0), model_rates.get("output", 0)]
+                          for model_rates in pricing] or
+                         [[0, 0, 0, 0]], dtype=np.float64)
+        model = np.frombuffer(columns["model"], dtype=np.int16)
+        row_rates = rates[np.maximum(model, 0)]
+        row_costs = (
+            np.frombuffer(columns["input_tokens"], dtype=np.int64) * row_rates[:, 0] +
+            np.frombuffer(columns["cache_creation_tokens"], dtype=np.int64) * row_rates[:, 1] +
+            np.frombuffer(columns["cache_read_tokens"], dtype=np.int64) * row_rates[:, 2] +
+            np.frombuffer(columns["output_tokens"], dtype=np.int64) * row_rates[:, 3]
+        ) / 1_000_000
+        row_costs[model < 0] = 0.0
+        costs = array('d')
+        costs.frombytes(row_costs.tobytes())
+        return costs
+    
+    costs = array('d')
+    for model, input_tokens, output_tokens, cache_creation, cache_read in zip(
+            columns["model"], columns["input_tokens"], columns["output_tokens"],
+            columns["cache_creation_tokens"], columns["cache_read_tokens"]):
+        if model < 0:
+            costs.append(0.0)
             continue
-            
-        entry_type = entry.get("type")
-        
-        # Track user timestamps
-        if entry_type == "user":
-            user_timestamps.append(timestamp)
-        
-        # Track assistant timestamps
-        elif entry_type == "assistant":
-            assistant_timestamps.append(timestamp)
-    
-    
-    # Average response time (simplified - just based on consecutive user/assistant pairs)
-    if user_timestamps and assistant_timestamps:
-        # Match user and assistant messages in order
-        paired_responses = []
-        for i, assistant_ts in enumerate(assistant_timestamps):
-            # Find the most recent user timestamp before this assistant
-            prior_users = [u for u in user_timestamps if u < assistant_ts]
-            if prior_users:
-                user_ts = max(prior_users)
-                response_time = (assistant_ts - user_ts).total_seconds()
-                if 0 < response_time < 300:  # Sanity check: between 0 and 5 minutes
-                    paired_responses.append(response_time)
-        
-        if paired_responses:
-            metrics["avg_response_time"] = sum(paired_responses) / len(paired_responses)
-        else:
-            metrics["avg_response_time"] = 0.0
-    else:
-        metrics["avg_response_time"] = 0.0
+        rates = pricing[model]
+        costs.append((
+            input_tokens * rates.get("input", 0) +
+            cache_creation * rates.get("cache_write_5m", 0) +
+            cache_read * rates.get("cache_read", 0) +
+            output_tokens * rates.get("output", 0)
+        ) / 1_000_000)
+    return costs
+
+def summarize_transcript_columns(columns):
+    """Compute the transcript aggregates over transcript columns.
     
-    # Message count
-    metrics["message_count"] = len(user_timestamps)
+    Large transcripts are summarized with NumPy when it is installed (see
+    summarize_columns_numpy), others with plain loops; both give identical
+    results.
     
-    # Session duration
-    all_timestamps = user_timestamps + assistant_timestamps
-    if len(all_timestamps) >= 2:
-        all_timestamps.sort()
-        session_duration = (all_timestamps[-1] - all_timestamps[0]).total_seconds()
-        metrics["session_duration"] = session_duration
-    else:
-        metrics["session_duration"] = 0.0
+    Returns:
+        Transcript state dict (see new_transcript_state) with token totals,
+        per-model cost and timeline aggregates filled in
+    """
+    state = new_transcript_state(None, None)
+    state["entry_count"] = columns["entry_count"]
+    model_ids = columns["model_ids"]
+    if model_ids:
+        state["model_id"] = model_ids[0]
+        state["last_model_id"] = model_ids[columns["last_model"]]
     
-    return metrics
-
-def format_duration(seconds):
-    """Format duration in seconds to human-readable format."""
-    if seconds < 60:
-        return f"{seconds:.1f}s"
-    elif seconds < 3600:
-        minutes = seconds / 60
-        return f"{minutes:.0f}m"
+    np = get_numpy() if len(columns["type"]) >= NUMPY_MIN_ROWS else None
+    if np is not None:
+        summarize_columns_numpy(columns, state, np)
     else:
-        hours = seconds / 3600
-        if hours < 24:
-            return f"{hours:.1f}h"
-        else:
-            days = hours / 24
-            return f"{days:.0f}d"
+        summarize_columns_python(columns, state)
+    price_transcript_state(state)
+    return state
 
-def format_output(config, model_info, input_data, metrics=None):
-    """Format the output based on selected fields and configuration.
+def summarize_columns_python(columns, state):
+    """Fill token totals, per-model token sums and timeline aggregates with plain loops."""
+    model_ids = columns["model_ids"]
+    tokens = state["tokens"]
+    for column, _ in TOKEN_COLUMNS:
+        tokens[column] = sum(columns[column])
     
-    Args:
-        config: Configuration dict from parse_arguments()
-        model_info: Model information dict with display_name and id
-        input_data: Full input JSON data
-        metrics: Dict with calculated metrics (cost, tokens, etc.)
+    # Token sums per model, priced once per model
+    model_tokens = [None] * len(model_ids)
+    for model, input_tokens, output_tokens, cache_creation, cache_read in zip(
+            columns["model"], columns["input_tokens"], columns["output_tokens"],
+            columns["cache_creation_tokens"], columns["cache_read_tokens"]):
+        if model < 0:
+            continue
+        sums = model_tokens[model]
+        if sums is None:
+            model_tokens[model] = [input_tokens, output_tokens, cache_creation, cache_read]
+        else:
+            sums[0] += input_tokens
+            sums[1] += output_tokens
+            sums[2] += cache_creation
+            sums[3] += cache_read
+    state["model_tokens"] = {model_ids[model]: sums for model, sums in enumerate(model_tokens) if sums is not None}
     
-    Returns:
-        Formatted string for output
+    # Timeline aggregates (NaN compares false, so rows without a timestamp drop out)
+    first = last = None
+    response_total = 0.0
+    response_count = 0
+    response_sketch = state["response_sketch"]
+    for entry_type, timestamp, turn in zip(columns["type"], columns["timestamp"], columns["turn"]):
+        if timestamp != timestamp:
+            continue
+        state["timestamp_count"] += 1
+        if first is None or timestamp < first:
+            first = timestamp
+        if last is None or timestamp > last:
+            last = timestamp
+        if entry_type == 1:
+            state["user_count"] += 1
+        else:
+            state["assistant_count"] += 1
+            response_time = timestamp - turn
+            if 0 < response_time < 300:  # Sanity check: between 0 and 5 minutes (NaN fails)
+                response_total += response_time
+                response_count += 1
+                add_to_sketch(response_sketch, response_time)
+    state["first_timestamp"] = first
+    state["last_timestamp"] = last
+    state["response_time_total"] = response_total
+    state["response_count"] = response_count
+
+def summarize_columns_numpy(columns, state, np):
+    """Fill token totals, per-model token sums and timeline aggregates with NumPy.
+    
+    The columns are viewed as NumPy arrays without copying. Token sums are
+    exact integer sums, the response time total is accumulated in row
+    order (cumsum) and sketch buckets use the same boundary comparisons,
+    so the results match summarize_columns_python exactly.
     """
-    if metrics is None:
-        metrics = {}
+    model_ids = columns["model_ids"]
+    model = np.frombuffer(columns["model"], dtype=np.int16)
+    token_values = [np.frombuffer(columns[column], dtype=np.int64) for column, _ in TOKEN_COLUMNS]
     
-    debug = config.get("debug", False)
+    tokens = state["tokens"]
+    for (column, _), values in zip(TOKEN_COLUMNS, token_values):
+        tokens[column] = int(values.sum())
+    
+    # Token sums per model, priced once per model
+    priced = model >= 0
+    codes = model[priced].astype(np.intp)
+    present = np.bincount(codes, minlength=len(model_ids)) > 0
+    sums = np.zeros((len(model_ids), len(TOKEN_COLUMNS)), dtype=np.int64)
+    for i, values in enumerate(token_values):
+        np.add.at(sums[:, i], codes, values[priced])
+    state["model_tokens"] = {model_ids[code]: [int(value) for value in sums[code]]
+                             for code in range(len(model_ids)) if present[code]}
+    
+    # Timeline aggregates over rows with a timestamp
+    timestamps = np.frombuffer(columns["timestamp"], dtype=np.float64)
+    timed = ~np.isnan(timestamps)
+    timestamp_count = int(timed.sum())
+    user_count = int((timed & (np.frombuffer(columns["type"], dtype=np.int8) == 1)).sum())
+    state["timestamp_count"] = timestamp_count
+    state["user_count"] = user_count
+    state["assistant_count"] = timestamp_count - user_count
+    if timestamp_count:
+        state["first_timestamp"] = float(timestamps[timed].min())
+        state["last_timestamp"] = float(timestamps[timed].max())
+    
+    replies = timed & (np.frombuffer(columns["type"], dtype=np.int8) != 1)
+    response_times = timestamps[replies] - np.frombuffer(columns["turn"], dtype=np.float64)[replies]
+    # Sanity check: between 0 and 5 minutes (NaN fails)
+    response_times = response_times[(response_times > 0) & (response_times < 300)]
+    state["response_time_total"] = float(np.cumsum(response_times)[-1]) if len(response_times) else 0.0
+    state["response_count"] = len(response_times)
+    
+    # Bucketed against the same boundaries as add_to_sketch
+    keys, counts = np.unique(np.searchsorted(np.array(get_sketch_bounds()), response_times),
+                             return_counts=True)
+    state["response_sketch"] = {str(int(key) + SKETCH_MIN_EXPONENT): int(count)
+                                for key, count in zip(keys, counts)}
+
+def analyze_transcript_entries(transcript_entries, debug=False):
+    """Compute the transcript aggregates for parsed entries or transcript columns.
+    
+    Args:
+        transcript_entries: List of parsed transcript entries, or transcript
+            columns from load_transcript_columns
+        debug: Whether to output debug information
+    
+    Returns:
+        Transcript state dict (see new_transcript_state)
+    """
+    return summarize_transcript_columns(get_transcript_columns(transcript_entries, debug=debug))
+
+def calculate_token_usage(transcript_entries):
+    """Calculate total token usage from transcript entries.
+    
+    Args:
+        transcript_entries: List of parsed transcript entries or transcript columns
+    
+    Returns:
+        Dict with token totals: input_tokens, output_tokens, 
+        cache_creation_tokens, cache_read_tokens
+    """
+    return dict(analyze_transcript_entries(transcript_entries)["tokens"])
+
+def get_model_from_transcript(transcript_entries):
+    """Extract the model ID from transcript entries.
+    
+    Looks for the first assistant message with a model ID.
+    
+    Args:
+        transcript_entries: List of parsed transcript entries or transcript columns
+    
+    Returns:
+        Model ID string or None if not found
+    """
+    if isinstance(transcript_entries, dict):
+        model_ids = transcript_entries["model_ids"]
+        return model_ids[0] if model_ids else None
+    
+    for entry in transcript_entries:
+        if entry.get("type") == "assistant" and "message" in entry:
+            model_id = extract_model_id(entry["message"].get("model"))
+            if model_id:
+                return model_id
+    return None
+
+def calculate_cost_per_entry(usage, model_id):
+    """Calculate cost for a single entry based on its token usage and model.
+    
+    Args:
+        usage: Dict with token usage for this entry
+        model_id: Model ID string for pricing lookup
+    
+    Returns:
+        Cost in dollars (float) or 0.0 if model not found
+    """
+    return calculate_model_cost(model_id, [usage.get(key, 0) for _, key in TOKEN_COLUMNS])
+
+def calculate_total_cost(transcript_entries, debug=False):
+    """Calculate total session cost by summing per-entry costs using each entry's model.
+    
+    Args:
+        transcript_entries: List of parsed transcript entries or transcript columns
+        debug: Whether to output debug information
+    
+    Returns:
+        Total cost in dollars (float)
+    """
+    state = analyze_transcript_entries(transcript_entries, debug=debug)
+    if debug:
+        write_cost_breakdown(state)
+    return state["total_cost"]
+
+def write_cost_breakdown(state):
+    """Write the per-model cost breakdown of a transcript state to stderr."""
+    if not state["model_costs"]:
+        return
+    sys.stderr.write(f"DEBUG: Cost breakdown by model:\n")
+    for model_id, cost in state["model_costs"].items():
+        key = resolve_pricing_key(model_id)
+        if key is None:
+            sys.stderr.write(f"DEBUG:   {model_id}: no pricing, counted as $0\n")
+        elif key != model_id:
+            sys.stderr.write(f"DEBUG:   {model_id}: ${cost:.4f} (priced as {key})\n")
+        else:
+            sys.stderr.write(f"DEBUG:   {model_id}: ${cost:.4f}\n")
+    sys.stderr.write(f"DEBUG:   Total: ${state['total_cost']:.4f}\n")
+
+def get_cache_path(kind, key):
+    """Get the cache file path for a given kind of cached data and key.
+    
+    Args:
+        kind: Short prefix describing the cached data (e.g., "transcript")
+        key: String the cache entry is keyed on (e.g., the transcript path)
+    
+    Returns:
+        Absolute path inside CACHE_DIR
+    """
+    import hashlib
+    
+    digest = hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{kind}-{digest}.json")
+
+def read_cache_file(cache_path):
+    """Read a JSON cache file, returning None if it is missing or unreadable."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_cache_file(cache_path, data):
+    """Atomically write a JSON cache file.
+    
+    The data is written to a temporary file in the same directory and then
+    renamed over the target, so concurrent readers never see a partial file.
+    Errors are ignored - a missing cache only costs a slower next refresh.
+    """
+    import tempfile
+    
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except Exception:
+        pass
+
+def extract_model_id(model_info):
+    """Extract a model ID from a transcript model field (string or dict)."""
+    if isinstance(model_info, dict):
+        return model_info.get("id")
+    return model_info
+
+def new_transcript_state(transcript_path, inode):
+    """Create an empty transcript state for the fused analyzer.
+    
+    The state holds the byte offset consumed so far together with every
+    running aggregate the status line needs: token totals, per-model token
+    sums, message counts, timestamps and the recent uuid->model map used to
+    resolve the model of tool results. "hourly_tokens" maps the epoch hour
+    (as a string, for JSON) to [first timestamp, last timestamp, per-model
+    token sums] of the entries with usage in that hour. Costs are derived
+    from the token sums by price_transcript_state. "response_sketch" holds
+    the response time distribution (see add_to_sketch) and "recent" the
+    per-minute ring buffer behind windowed fields (see get_recent_bucket).
+    "task_tokens" maps the agentId of each Task tool result to [timestamp,
+    model, token sums] of the usage it repeats from the sub-agent's own
+    transcript, and "agent_id" is set for sub-agent transcripts (see
+    merge_subagent_usage). It doubles as the on-disk checkpoint.
+    """
+    return {
+        "version": CHECKPOINT_VERSION,
+        "facets": list(ALL_FACETS),
+        "path": transcript_path,
+        "inode": inode,
+        "offset": 0,
+        "tail": "",
+        "line_count": 0,
+        "entry_count": 0,
+        "tokens": {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_creation_tokens": 0,
+            "cache_read_tokens": 0
+        },
+        "session_id": None,
+        "agent_id": None,
+        "model_tokens": {},
+        "task_tokens": {},
+        "total_cost": 0.0,
+        "model_costs": {},
+        "pricing": None,
+        "model_id": None,
+        "last_model_id": None,
+        "recent_models": {},
+        "first_timestamp": None,
+        "last_timestamp": None,
+        "timestamp_count": 0,
+        "user_count": 0,
+        "assistant_count": 0,
+        "recent_turns": {},
+        "recent_user_timestamps": [],
+        "response_time_total": 0.0,
+        "response_count": 0,
+        "response_sketch": {},
+        "recent": [[-1, 0, 0, 0, 0.0, 0, 0] for _ in range(RECENT_MINUTES)],
+        "hourly_tokens": {}
+    }
+
+# datetime.fromisoformat, bound on first use by parse_timestamp
+fromisoformat = None
+
+# Whether fromisoformat accepts the "Z" suffix itself (Python 3.11+)
+FROMISOFORMAT_ACCEPTS_Z = False
+
+def load_timestamp_decoder():
+    """Bind datetime.fromisoformat and probe whether it understands "Z"."""
+    global fromisoformat, FROMISOFORMAT_ACCEPTS_Z
+    from datetime import datetime
+    
+    try:
+        datetime.fromisoformat("2025-01-01T00:00:00.000Z")
+        FROMISOFORMAT_ACCEPTS_Z = True
+    except ValueError:
+        FROMISOFORMAT_ACCEPTS_Z = False
+    fromisoformat = datetime.fromisoformat
+
+def parse_timestamp(timestamp_str):
+    """Parse an ISO 8601 transcript timestamp into epoch seconds.
+    
+    The C decoder behind fromisoformat is faster than any pure-Python parse
+    of the fixed Claude Code format, so the only work saved here is the
+    "Z" -> "+00:00" rewrite on interpreters that accept "Z" natively.
+    
+    Returns:
+        Epoch seconds (float) or None if the timestamp cannot be parsed
+    """
+    if fromisoformat is None:
+        load_timestamp_decoder()
+    
+    try:
+        if FROMISOFORMAT_ACCEPTS_Z:
+            return fromisoformat(timestamp_str).timestamp()
+        return fromisoformat(timestamp_str.replace('Z', '+00:00')).timestamp()
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+def update_transcript_state(state, entry, debug=False):
+    """Fold a single transcript entry into the running aggregates (fused analyzer).
+    
+    This is the one pass behind calculate_token_usage, calculate_total_cost,
+    calculate_performance_metrics and the status line itself: every metric
+    is updated from the entry while it is in hand, so no entry list or
+    full uuid lookup is ever built.
+    """
+    state["entry_count"] += 1
+    usage = None
+    model_id = None
+    counts = None
+    usage_counts = None
+    task_agent_id = None
+    entry_type = entry.get("type")
+    if state["session_id"] is None:
+        state["session_id"] = entry.get("sessionId")
+    if state["agent_id"] is None and entry.get("isSidechain"):
+        state["agent_id"] = entry.get("agentId")
+    
+    if entry_type == "assistant" and "message" in entry:
+        message = entry["message"]
+        usage = message.get("usage", {})
+        model_id = extract_model_id(message.get("model"))
+        if model_id:
+            if state["model_id"] is None:
+                state["model_id"] = model_id  # First model (get_model_from_transcript)
+            state["last_model_id"] = model_id
+            uuid = entry.get("uuid")
+            if uuid:
+                recent_models = state["recent_models"]
+                recent_models[uuid] = model_id
+                if len(recent_models) > CHECKPOINT_UUID_WINDOW:
+                    del recent_models[next(iter(recent_models))]
+    elif "toolUseResult" in entry and isinstance(entry["toolUseResult"], dict):
+        usage = entry["toolUseResult"].get("usage", {})
+        model_id = state["recent_models"].get(entry.get("parentUuid")) or state["last_model_id"]
+        task_agent_id = entry["toolUseResult"].get("agentId")
+    
+    if usage:
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cache_creation = usage.get("cache_creation_input_tokens", 0)
+        cache_read = usage.get("cache_read_input_tokens", 0)
+        tokens = state["tokens"]
+        tokens["input_tokens"] += input_tokens
+        tokens["output_tokens"] += output_tokens
+        tokens["cache_creation_tokens"] += cache_creation
+        tokens["cache_read_tokens"] += cache_read
+        usage_counts = (input_tokens, cache_creation, cache_read)
+        
+        if model_id:
+            # Priced per model once the new lines are in (price_transcript_state)
+            counts = (input_tokens, output_tokens, cache_creation, cache_read)
+            add_token_counts(state["model_tokens"], model_id, counts)
+        elif debug:
+            sys.stderr.write(f"DEBUG: Entry with usage but no model: {entry.get('uuid', 'unknown')[:8]}\n")
+    
+    # Timestamp state behind calculate_performance_metrics
+    timestamp = None
+    timestamp_str = entry.get("timestamp")
+    if timestamp_str and entry_type in ("user", "assistant"):
+        timestamp = parse_timestamp(timestamp_str)
+    
+    # Remember which user turn each entry descends from, so that a reply can
+    # be paired with the turn that triggered it by following parentUuid
+    parent_uuid = entry.get("parentUuid")
+    recent_turns = state["recent_turns"]
+    if entry_type == "user" and timestamp is not None:
+        turn_timestamp = timestamp
+    else:
+        turn_timestamp = recent_turns.get(parent_uuid) if parent_uuid else None
+    uuid = entry.get("uuid")
+    if uuid and turn_timestamp is not None:
+        recent_turns[uuid] = turn_timestamp
+        if len(recent_turns) > CHECKPOINT_UUID_WINDOW:
+            del recent_turns[next(iter(recent_turns))]
+    
+    if timestamp is None:
+        return
+    
+    if counts is not None:
+        if task_agent_id:
+            # Usage a Task result repeats from its sub-agent's transcript
+            task = state["task_tokens"].get(task_agent_id)
+            if task is None:
+                state["task_tokens"][task_agent_id] = [timestamp, model_id, list(counts)]
+            else:
+                task[2] = [total + count for total, count in zip(task[2], counts)]
+        
+        # Hourly token buckets behind the daily budget and billing block fields
+        hour = str(int(timestamp // 3600))
+        bucket = state["hourly_tokens"].get(hour)
+        if bucket is None:
+            bucket = state["hourly_tokens"][hour] = [timestamp, timestamp, {}]
+        else:
+            if timestamp < bucket[0]:
+                bucket[0] = timestamp
+            if timestamp > bucket[1]:
+                bucket[1] = timestamp
+        add_token_counts(bucket[2], model_id, counts)
+    
+    # Per-minute samples behind the windowed fields
+    recent = get_recent_bucket(state["recent"], timestamp)
+    if recent is not None and usage_counts is not None:
+        recent[1] += usage_counts[0]
+        recent[2] += usage_counts[1]
+        recent[3] += usage_counts[2]
+    
+    if state["first_timestamp"] is None or timestamp < state["first_timestamp"]:
+        state["first_timestamp"] = timestamp
+    if state["last_timestamp"] is None or timestamp > state["last_timestamp"]:
+        state["last_timestamp"] = timestamp
+    state["timestamp_count"] += 1
+    
+    user_timestamps = state["recent_user_timestamps"]
+    if entry_type == "user":
+        state["user_count"] += 1
+        if recent is not None:
+            recent[6] += 1
+        # Keep a sorted window of user timestamps for replies without a chain
+        if not user_timestamps or timestamp >= user_timestamps[-1]:
+            user_timestamps.append(timestamp)
+        else:
+            import bisect
+            bisect.insort(user_timestamps, timestamp)
+        if len(user_timestamps) > CHECKPOINT_UUID_WINDOW:
+            del user_timestamps[0]
+    else:
+        state["assistant_count"] += 1
+        user_ts = recent_turns.get(parent_uuid) if parent_uuid else None
+        if user_ts is None:
+            # No parentUuid chain - fall back to the latest user message before this reply
+            user_ts = find_previous_timestamp(user_timestamps, timestamp)
+        if user_ts is not None:
+            response_time = timestamp - user_ts
+            if 0 < response_time < 300:  # Sanity check: between 0 and 5 minutes
+                state["response_time_total"] += response_time
+                state["response_count"] += 1
+                add_to_sketch(state["response_sketch"], response_time)
+                if recent is not None:
+                    recent[4] += response_time
+                    recent[5] += 1
+
+def get_recent_bucket(ring, timestamp):
+    """Get the ring buffer bucket for the minute a timestamp falls in.
+    
+    The ring has RECENT_MINUTES slots; slot minute % RECENT_MINUTES holds
+    [minute, input tokens, cache creation tokens, cache read tokens,
+    response time total, response count, user messages]. A slot still
+    holding an older minute is reset, so the ring only ever covers the
+    latest RECENT_MINUTES minutes seen.
+    
+    Returns:
+        The bucket (updated in place by the caller), or None if the minute
+        is older than the ring still covers
+    """
+    minute = int(timestamp // 60)
+    bucket = ring[minute % RECENT_MINUTES]
+    if bucket[0] != minute:
+        if bucket[0] > minute:
+            return None
+        bucket[:] = [minute, 0, 0, 0, 0.0, 0, 0]
+    return bucket
+
+def calculate_window_metrics(state, window, now):
+    """Calculate performance metrics over the last `window` seconds.
+    
+    Sums the ring buffer buckets of the minutes in the window (the current,
+    partial minute included), so the cost does not depend on how long the
+    session is.
+    
+    Returns:
+        Dict with message_count, and cache_hit_rate / avg_response_time
+        when the window has token usage / replies
+    """
+    minutes = -(-int(window) // 60)
+    current = int(now // 60)
+    input_tokens = cache_creation = cache_read = response_count = user_count = 0
+    response_total = 0.0
+    for bucket in state["recent"]:
+        if current - minutes < bucket[0] <= current:
+            input_tokens += bucket[1]
+            cache_creation += bucket[2]
+            cache_read += bucket[3]
+            response_total += bucket[4]
+            response_count += bucket[5]
+            user_count += bucket[6]
+    
+    metrics = {"message_count": user_count}
+    total_input = input_tokens + cache_creation + cache_read
+    if total_input > 0:
+        metrics["cache_hit_rate"] = cache_read / total_input
+    if response_count:
+        metrics["avg_response_time"] = response_total / response_count
+    return metrics
+
+def get_sketch_bounds():
+    """Get the bucket boundaries of response time sketches, ascending."""
+    global SKETCH_BOUNDS
+    if SKETCH_BOUNDS is None:
+        SKETCH_BOUNDS = [SKETCH_GAMMA ** i for i in range(SKETCH_MIN_EXPONENT, SKETCH_MAX_EXPONENT + 1)]
+    return SKETCH_BOUNDS
+
+def add_to_sketch(sketch, value):
+    """Add a positive value to a response time sketch.
+    
+    The sketch maps the index of a logarithmic bucket (as a string, for
+    JSON) to a count, like DDSketch: bucket i holds values in
+    (SKETCH_GAMMA**(i-1), SKETCH_GAMMA**i]. Response times between 0 and
+    300 seconds span at most a few hundred buckets, so the sketch stays
+    small however many turns a session has, and sketches merge by adding
+    counts. Buckets are found by bisecting the precomputed boundaries, the
+    same comparisons NumPy's searchsorted makes.
+    """
+    import bisect
+    
+    key = str(bisect.bisect_left(get_sketch_bounds(), value) + SKETCH_MIN_EXPONENT)
+    sketch[key] = sketch.get(key, 0) + 1
+
+def merge_sketches(sketch, other):
+    """Add the counts of one response time sketch into another."""
+    for key, count in other.items():
+        sketch[key] = sketch.get(key, 0) + count
+
+def sketch_quantile(sketch, quantile):
+    """Estimate a quantile (0-1) of the values in a response time sketch.
+    
+    Returns:
+        Estimate within SKETCH_ACCURACY of the true value, or None if the
+        sketch is empty
+    """
+    total = sum(sketch.values())
+    if not total:
+        return None
+    rank = quantile * (total - 1)
+    seen = 0
+    for key in sorted(sketch, key=int):
+        seen += sketch[key]
+        if seen > rank:
+            return 2 * SKETCH_GAMMA ** int(key) / (SKETCH_GAMMA + 1)
+    return None
+
+def add_token_counts(model_tokens, model_id, counts):
+    """Add one entry's token counts to per-model token sums (TOKEN_COLUMNS order)."""
+    sums = model_tokens.get(model_id)
+    if sums is None:
+        model_tokens[model_id] = list(counts)
+    else:
+        sums[0] += counts[0]
+        sums[1] += counts[1]
+        sums[2] += counts[2]
+        sums[3] += counts[3]
+
+def get_pricing_fingerprint():
+    """Get a digest of PRICING_DATA, stored with the costs derived from it."""
+    import hashlib
+    
+    return hashlib.sha1(json.dumps(PRICING_DATA, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def price_transcript_state(state):
+    """Set the total and per-model cost of a transcript state from its token sums.
+    
+    Pricing is applied once per model rather than once per entry, so this
+    stays cheap however long the transcript is. The pricing used is
+    recorded in "pricing" (see get_pricing_fingerprint).
+    """
+    model_costs = {model_id: calculate_model_cost(model_id, sums)
+                   for model_id, sums in state["model_tokens"].items()}
+    state["model_costs"] = model_costs
+    state["total_cost"] = sum(model_costs.values(), 0.0)
+    state["pricing"] = get_pricing_fingerprint()
+
+def calculate_hourly_costs(state):
+    """Price the hourly token buckets of a transcript state.
+    
+    Returns:
+        Dict of epoch hour -> [cost, first timestamp, last timestamp]
+    """
+    return {hour: [sum(calculate_model_cost(model_id, sums) for model_id, sums in model_tokens.items()),
+                   first, last]
+            for hour, (first, last, model_tokens) in state["hourly_tokens"].items()}
+
+def find_previous_timestamp(sorted_timestamps, timestamp):
+    """Find the latest timestamp strictly before the given one.
+    
+    Args:
+        sorted_timestamps: Ascending list of epoch timestamps
+        timestamp: Epoch timestamp to search before
+    
+    Returns:
+        The latest earlier timestamp, or None if there is none
+    """
+    if not sorted_timestamps:
+        return None
+    if sorted_timestamps[-1] < timestamp:
+        return sorted_timestamps[-1]  # Common case: transcripts are in time order
+    import bisect
+    index = bisect.bisect_left(sorted_timestamps, timestamp)
+    return sorted_timestamps[index - 1] if index else None
+
+def get_transcript_lock(transcript_path):
+    """Get the lock serializing checkpoint updates of a transcript.
+    
+    Locks are striped over TRANSCRIPT_LOCK_STRIPES by path, so the daemon
+    holds a fixed number of them however many sessions it serves.
+    
+    Returns:
+        A lock, or None while no thread has been started (nothing can run
+        concurrently then, and the CLI path doesn't import threading)
+    """
+    if "threading" not in sys.modules:
+        return None
+    import threading
+    stripe = hash(transcript_path) % TRANSCRIPT_LOCK_STRIPES
+    return TRANSCRIPT_LOCKS.get(stripe) or TRANSCRIPT_LOCKS.setdefault(stripe, threading.Lock())
+
+def load_transcript_state(transcript_path, use_cache=True, facets=None, debug=False):
+    """Load transcript aggregates, parsing only bytes appended since the last run.
+    
+    Stage threads (and, in the daemon, threads still refreshing for earlier
+    requests) may load the same transcript at once; they take turns, so the
+    in-memory checkpoint is never advanced twice over the same bytes.
+    See load_transcript_state_unlocked for the arguments.
+    """
+    lock = get_transcript_lock(transcript_path)
+    if lock is None:
+        return load_transcript_state_unlocked(transcript_path, use_cache, facets, debug)
+    with lock:
+        return load_transcript_state_unlocked(transcript_path, use_cache, facets, debug)
+
+def load_transcript_state_unlocked(transcript_path, use_cache=True, facets=None, debug=False):
+    """Load transcript aggregates, parsing only bytes appended since the last run.
+    
+    The checkpoint is keyed by transcript path and validated against the
+    file's inode, size and the bytes just before the stored offset. If any of
+    these no longer match (new session, truncation, rewrite) the transcript
+    is re-read from the start. The checkpoint file is only rewritten when
+    complete new lines were consumed or the costs were re-derived for
+    changed pricing.
+    
+    Args:
+        transcript_path: Path to the transcript file
+        use_cache: Whether to read and write the on-disk checkpoint
+        facets: Transcript facets the caller needs ("usage", "timeline");
+            lines that can't affect them are skipped. Defaults to all.
+        debug: Whether to output debug information
+    
+    Returns:
+        Checkpoint dict (see new_transcript_state), or None if unavailable
+    """
+    if not transcript_path:
+        if debug:
+            sys.stderr.write(f"DEBUG: No transcript path provided\n")
+        return None
+    
+    try:
+        stat = os.stat(transcript_path)
+    except FileNotFoundError:
+        # Transcript file not found - this is expected for new sessions
+        if debug:
+            sys.stderr.write(f"DEBUG: Transcript file does not exist: {transcript_path}\n")
+        return None
+    except OSError as e:
+        if debug:
+            sys.stderr.write(f"DEBUG: Cannot access transcript file: {e}\n")
+        return None
+    
+    cache_path = get_cache_path("transcript", transcript_path) if use_cache else None
+    state = TRANSCRIPT_STATES.pop(transcript_path, None) if use_cache else None
+    if state is None and cache_path:
+        state = read_cache_file(cache_path)
+    
+    if state is not None and (state.get("version") != CHECKPOINT_VERSION or
+                              state.get("path") != transcript_path or
+                              state.get("inode") != stat.st_ino or
+                              state.get("offset", 0) > stat.st_size):
+        if debug:
+            sys.stderr.write(f"DEBUG: Transcript checkpoint is stale, rebuilding\n")
+        state = None
+    
+    if facets is None:
+        facets = ALL_FACETS
+    if state is not None and not set(facets) <= set(state["facets"]):
+        # Checkpoint was built for other fields - rebuild covering both
+        facets = [facet for facet in ALL_FACETS if facet in facets or facet in state["facets"]]
+        if debug:
+            sys.stderr.write(f"DEBUG: Transcript checkpoint lacks facets {facets}, rebuilding\n")
+        state = None
+    
+    try:
+        with open(transcript_path, 'rb') as f:
+            if state is not None and state["offset"] > 0:
+                # Make sure the bytes we already consumed are still there
+                tail_start = max(0, state["offset"] - CHECKPOINT_TAIL_BYTES)
+                f.seek(tail_start)
+                if f.read(state["offset"] - tail_start).hex() != state["tail"]:
+                    if debug:
+                        sys.stderr.write(f"DEBUG: Transcript was rewritten, rebuilding\n")
+                    state = None
+            
+            if state is None:
+                state = new_transcript_state(transcript_path, stat.st_ino)
+                state["facets"] = list(facets)
+            elif debug:
+                sys.stderr.write(f"DEBUG: Resuming transcript at byte {state['offset']} of {stat.st_size}\n")
+            
+            if state["offset"] == stat.st_size:
+                # Nothing appended since the last run, but the checkpoint may
+                # have been priced by another version of this script
+                if state.get("pricing") != get_pricing_fingerprint():
+                    price_transcript_state(state)
+                    if cache_path:
+                        write_cache_file(cache_path, state)
+                remember_transcript_state(state, use_cache)
+                return state
+            
+            f.seek(state["offset"])
+            new_entries = consume_transcript_lines(state, f, debug=debug)
+            price_transcript_state(state)
+    except (PermissionError, IOError) as e:
+        if debug:
+            sys.stderr.write(f"DEBUG: Cannot access transcript file: {e}\n")
+        return None
+    
+    if new_entries is not None and cache_path:
+        write_cache_file(cache_path, state)
+    
+    if debug:
+        sys.stderr.write(f"DEBUG: Parsed {new_entries or 0} new transcript entries ({state['entry_count']} total)\n")
+    
+    remember_transcript_state(state, use_cache)
+    return state
+
+# JSON decoder for transcript lines, chosen on first use by get_json_loads
+json_loads = None
+
+# NumPy module for the columnar engine (False if not installed), imported on
+# first use by get_numpy
+numpy_module = None
+
+def get_json_loads():
+    """Get the fastest available JSON decoder for transcript lines.
+    
+    Uses orjson when it is installed and falls back to the standard library.
+    Both accept bytes and raise ValueError subclasses on invalid input.
+    """
+    global json_loads
+    if json_loads is None:
+        try:
+            import orjson
+            json_loads = orjson.loads
+        except ImportError:
+            json_loads = json.loads
+    return json_loads
+
+def get_numpy():
+    """Get NumPy for the vectorized columnar engine, or None if it isn't installed.
+    
+    Only the columnar summaries behind calculate_token_usage,
+    calculate_total_cost, calculate_performance_metrics and the usage store
+    use it; the status line itself never imports it.
+    """
+    global numpy_module
+    if numpy_module is None:
+        try:
+            import numpy
+            numpy_module = numpy
+        except ImportError:
+            numpy_module = False
+    return numpy_module or None
+
+def get_transcript_facets(fields):
+    """Get the transcript facets ("usage", "timeline") needed by a field list."""
+    facets = []
+    for field in fields:
+        for facet in TRANSCRIPT_FIELDS.get(split_window_field(field)[0], []):
+            if facet not in facets:
+                facets.append(facet)
+    return [facet for facet in ALL_FACETS if facet in facets]
+
+def consume_transcript_lines(state, f, debug=False):
+    """Stream complete JSONL lines from a binary file into a transcript state.
+    
+    Lines are decoded and folded one at a time, so memory use does not grow
+    with the transcript. When only the "usage" facet is needed, lines
+    without a "usage" key (user prompts, tool results carrying file
+    contents) are skipped without being decoded. The timeline facet needs
+    every user/assistant line, so no prefilter is applied for it. A trailing
+    line without a newline is still being written by Claude Code and is
+    left for the next refresh.
+    
+    Returns:
+        Number of entries consumed, or None if no complete line was available
+    """
+    loads = get_json_loads()
+    usage_only = "timeline" not in state["facets"]
+    tail = bytes.fromhex(state["tail"])
+    new_entries = 0
+    consumed_any = False
+    for raw_line in f:
+        if not raw_line.endswith(b"\n"):
+            break
+        consumed_any = True
+        state["offset"] += len(raw_line)
+        state["line_count"] += 1
+        tail = raw_line[-CHECKPOINT_TAIL_BYTES:] if len(raw_line) >= CHECKPOINT_TAIL_BYTES \
+            else (tail + raw_line)[-CHECKPOINT_TAIL_BYTES:]
+        
+        if raw_line.isspace():
+            continue  # Skip empty lines
+        if usage_only and USAGE_MARKER not in raw_line:
+            state["entry_count"] += 1  # Counted, but can't affect usage totals
+            continue
+        try:
+            entry = loads(raw_line)
+        except ValueError as e:
+            # Log error but continue processing other lines
+            print(f"Warning: Invalid JSON at line {state['line_count']} in transcript: {e}", file=sys.stderr)
+            continue
+        if isinstance(entry, dict):
+            update_transcript_state(state, entry, debug=debug)
+            new_entries += 1
+    
+    if not consumed_any:
+        return None
+    state["tail"] = tail.hex()
+    return new_entries
+
+def remember_transcript_state(state, use_cache=True):
+    """Keep a checkpoint warm in memory for the next refresh in this process."""
+    if not use_cache:
+        return
+    TRANSCRIPT_STATES[state["path"]] = state
+    while len(TRANSCRIPT_STATES) > TRANSCRIPT_STATES_MAX:
+        del TRANSCRIPT_STATES[next(iter(TRANSCRIPT_STATES))]
+
+def calculate_state_performance_metrics(state, token_totals):
+    """Calculate performance metrics from a transcript checkpoint.
+    
+    Produces the same dict as calculate_performance_metrics, using the
+    running timestamp state instead of re-walking the transcript.
+    """
+    metrics = {}
+    
+    total_input = (token_totals.get("input_tokens", 0) +
+                   token_totals.get("cache_creation_tokens", 0) +
+                   token_totals.get("cache_read_tokens", 0))
+    if total_input > 0:
+        metrics["cache_hit_rate"] = token_totals.get("cache_read_tokens", 0) / total_input
+    else:
+        metrics["cache_hit_rate"] = 0.0
+    
+    for name, quantile in RESPONSE_PERCENTILES.items():
+        value = sketch_quantile(state["response_sketch"], quantile)
+        if value is not None:
+            metrics[f"response_{name}"] = value
+    
+    if state["response_count"]:
+        metrics["avg_response_time"] = state["response_time_total"] / state["response_count"]
+    else:
+        metrics["avg_response_time"] = 0.0
+    
+    metrics["message_count"] = state["user_count"]
+    
+    if state["timestamp_count"] >= 2:
+        metrics["session_duration"] = state["last_timestamp"] - state["first_timestamp"]
+    else:
+        metrics["session_duration"] = 0.0
+    
+    return metrics
+
+def get_context_window(model_id):
+    """Get the context window size in tokens for a model ID."""
+    if model_id and model_id.endswith("[1m]"):
+        return EXTENDED_CONTEXT_WINDOW
+    return DEFAULT_CONTEXT_WINDOW
+
+def read_context_usage(transcript_path, debug=False):
+    """Find how full the context window is from the end of the transcript.
+    
+    Memory-maps the transcript and walks lines backwards from EOF to the most
+    recent main-conversation assistant message with usage. Its prompt size
+    (input + cache creation + cache read tokens) is the current context
+    occupancy. Only the tail of the file is touched, however long the
+    session is.
+    
+    Args:
+        transcript_path: Path to the transcript file
+        debug: Whether to output debug information
+    
+    Returns:
+        Dict with context_tokens and model_id, or None if not found
+    """
+    import mmap
+    
+    if not transcript_path:
+        return None
+    
+    try:
+        with open(transcript_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                loads = get_json_loads()
+                end = len(mm)
+                scanned = 0
+                while end > 0:
+                    start = mm.rfind(b"\n", 0, end - 1) + 1
+                    line = mm[start:end]
+                    end = start
+                    scanned += 1
+                    if USAGE_MARKER not in line or b'"assistant"' not in line:
+                        continue
+                    try:
+                        entry = loads(line)
+                    except ValueError:
+                        continue  # Partially written last line or invalid JSON
+                    if not isinstance(entry, dict) or entry.get("type") != "assistant" \
+                            or entry.get("isSidechain"):
+                        continue  # Sub-agent context is separate from the session's
+                    message = entry.get("message")
+                    usage = message.get("usage") if isinstance(message, dict) else None
+                    if not usage:
+                        continue
+                    context_tokens = (usage.get("input_tokens", 0) +
+                                      usage.get("cache_creation_input_tokens", 0) +
+                                      usage.get("cache_read_input_tokens", 0))
+                    model_id = extract_model_id(message.get("model"))
+                    if not context_tokens or model_id == "<synthetic>":
+                        continue  # Synthetic error messages carry no real usage
+                    if debug:
+                        sys.stderr.write(f"DEBUG: Context usage {context_tokens} found {scanned} lines from EOF\n")
+                    return {"context_tokens": context_tokens, "model_id": model_id}
+    except (OSError, ValueError) as e:
+        # Missing, unreadable or empty transcript (empty files can't be mapped)
+        if debug:
+            sys.stderr.write(f"DEBUG: Cannot scan transcript for context usage: {e}\n")
+    return None
+
+def find_transcript_files(projects_dir):
+    """List the JSONL transcripts of every session under the projects directory."""
+    paths = []
+    for root, _, files in os.walk(projects_dir):
+        for name in files:
+            if name.endswith(".jsonl"):
+                paths.append(os.path.join(root, name))
+    return paths
+
+def map_transcripts(worker, paths, use_cache=True, debug=False):
+    """Run a per-transcript worker over paths, in parallel when it pays off.
+    
+    A process pool is used when there are at least USAGE_SCAN_POOL_MIN
+    paths (first run, many active sessions) and more than one CPU; parsing
+    is CPU-bound, so threads would not help. Otherwise, or if the pool
+    can't be used, the paths are processed in-process. Forking is only
+    safe while this is the only thread (another thread may hold a lock the
+    child would inherit), so with stage threads running (--deadline-ms)
+    the workers are spawned instead.
+    
+    Args:
+        worker: Module-level function taking (path, use_cache)
+        paths: Transcript paths
+    
+    Returns:
+        List of worker results, in path order
+    """
+    if len(paths) >= USAGE_SCAN_POOL_MIN and (os.cpu_count() or 1) > 1:
+        try:
+            import concurrent.futures
+            import multiprocessing
+            import threading
+            
+            context = multiprocessing.get_context("spawn") if threading.active_count() > 1 else None
+            workers = min(len(paths), os.cpu_count() or 1)
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                return list(pool.map(worker, paths, [use_cache] * len(paths),
+                                     chunksize=max(1, len(paths) // (workers * 4))))
+        except Exception as e:
+            # No multiprocessing support (or a worker died) - run in-process
+            if debug:
+                sys.stderr.write(f"DEBUG: Transcript pool failed, parsing in-process: {e}\n")
+    return [worker(path, use_cache) for path in paths]
+
+def find_subagent_transcripts(transcript_path):
+    """List the sub-agent transcripts that may belong to a session.
+    
+    Task sub-agents write sidechain transcripts either to
+    <session id>/subagents/ next to the session transcript, or as agent-*.jsonl
+    files in the project directory (whose sessionId then has to be checked).
+    """
+    directory = os.path.dirname(transcript_path)
+    session_id = os.path.splitext(os.path.basename(transcript_path))[0]
+    paths = []
+    for folder, prefix in ((os.path.join(directory, session_id, "subagents"), ""), (directory, "agent-")):
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith(prefix) and entry.name.endswith(".jsonl") and entry.is_file():
+                        paths.append(entry.path)
+        except OSError:
+            continue
+    return paths
+
+def get_transcript_agent_id(transcript_path, state):
+    """Get the sub-agent ID of a transcript, or None for a main session.
+    
+    Sidechain entries carry the agentId that the Task tool result in the
+    session transcript names; sub-agent files are also named agent-<id>.jsonl.
+    """
+    if state and state.get("agent_id"):
+        return state["agent_id"]
+    name = os.path.splitext(os.path.basename(transcript_path))[0]
+    return name[len("agent-"):] if name.startswith("agent-") else None
+
+def scan_subagent_file(transcript_path, use_cache=True):
+    """Get the token usage of one sub-agent transcript (process pool worker).
+    
+    Goes through load_transcript_state, so a sub-agent transcript that is
+    still growing is resumed from its checkpoint.
+    
+    Returns:
+        Dict with session_id, agent_id, tokens and model_tokens, or None if
+        unreadable
+    """
+    state = load_transcript_state(transcript_path, use_cache=use_cache, facets=["usage"])
+    if not state:
+        return None
+    return {"session_id": state["session_id"], "agent_id": get_transcript_agent_id(transcript_path, state),
+            "tokens": state["tokens"], "model_tokens": state["model_tokens"]}
+
+def load_subagent_usage(transcript_path, use_cache=True, debug=False):
+    """Sum the token usage of a session's sub-agent transcripts.
+    
+    Each file's usage is kept in a per-session index and reused while its
+    mtime and size are unchanged; changed files are parsed with
+    map_transcripts.
+    
+    Returns:
+        Dict with files (count), agent_ids, tokens and model_tokens, or None
+        if the session has no sub-agent transcripts
+    """
+    if not transcript_path:
+        return None
+    paths = find_subagent_transcripts(transcript_path)
+    if not paths:
+        return None
+    
+    index_path = get_cache_path("subagents", transcript_path) if use_cache else None
+    index = read_cache_file(index_path) if index_path else None
+    if not index or index.get("version") != CHECKPOINT_VERSION:
+        index = {"version": CHECKPOINT_VERSION, "files": {}}
+    cached_files = index["files"]
+    
+    files = {}
+    changed = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        cached = cached_files.get(path)
+        if cached and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+            files[path] = cached
+        else:
+            files[path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "usage": None}
+            changed.append(path)
+    
+    for path, usage in zip(changed, map_transcripts(scan_subagent_file, changed, use_cache=use_cache, debug=debug)):
+        files[path]["usage"] = usage
+    
+    if index_path and (changed or len(files) != len(cached_files)):
+        index["files"] = files
+        write_cache_file(index_path, index)
+    
+    # agent-*.jsonl files in the project directory may belong to any session
+    directory = os.path.dirname(transcript_path)
+    session_id = os.path.splitext(os.path.basename(transcript_path))[0]
+    merged = {"files": 0, "agent_ids": [], "tokens": {column: 0 for column, _ in TOKEN_COLUMNS}, "model_tokens": {}}
+    for path, entry in files.items():
+        usage = entry["usage"]
+        if not usage or (os.path.dirname(path) == directory and usage["session_id"] != session_id):
+            continue
+        merged["files"] += 1
+        if usage["agent_id"]:
+            merged["agent_ids"].append(usage["agent_id"])
+        for column in merged["tokens"]:
+            merged["tokens"][column] += usage["tokens"].get(column, 0)
+        for model_id, sums in usage["model_tokens"].items():
+            add_token_counts(merged["model_tokens"], model_id, sums)
+    
+    if debug:
+        sys.stderr.write(f"DEBUG: Sub-agent transcripts: {merged['files']} of {len(files)} belong to this session, "
+                         f"{len(changed)} re-read\n")
+    return merged if merged["files"] else None
+
+def merge_subagent_usage(state, subagent_usage):
+    """Add sub-agent token usage to a session's transcript state.
+    
+    A Task tool result in the session transcript repeats the usage of the
+    sub-agent's last request, which the sub-agent transcript already
+    counts, so the usage of each Task whose agent transcript was found is
+    taken out again; Tasks without one keep their tool result usage. The
+    timeline (response times, message count) stays that of the main
+    conversation.
+    
+    Returns:
+        Shallow copy of the state with merged tokens, per-model token sums
+        and costs; the checkpoint itself is left untouched
+    """
+    merged = dict(state)
+    tokens = dict(state["tokens"])
+    model_tokens = {model_id: list(sums) for model_id, sums in state["model_tokens"].items()}
+    for agent_id in subagent_usage["agent_ids"]:
+        if agent_id not in state["task_tokens"]:
+            continue
+        _, model_id, sums = state["task_tokens"][agent_id]
+        add_token_counts(model_tokens, model_id, [-count for count in sums])
+        for (column, _), count in zip(TOKEN_COLUMNS, sums):
+            tokens[column] -= count
+    for model_id, sums in subagent_usage["model_tokens"].items():
+        add_token_counts(model_tokens, model_id, sums)
+    for column in tokens:
+        tokens[column] += subagent_usage["tokens"][column]
+    merged["tokens"] = tokens
+    merged["model_tokens"] = model_tokens
+    price_transcript_state(merged)
+    return merged
+
+def scan_usage_file(transcript_path, use_cache=True):
+    """Get the hourly cost buckets of one transcript (process pool worker).
+    
+    Goes through load_transcript_state, so a transcript that only grew is
+    resumed from its checkpoint rather than re-read.
+    
+    Returns:
+        Dict with hourly_costs (epoch hour -> [cost, first timestamp, last
+        timestamp]), agent_id (sub-agent transcripts) and task_costs (Task
+        agentId -> [epoch hour, cost repeated from the sub-agent])
+    """
+    state = load_transcript_state(transcript_path, use_cache=use_cache, facets=["usage"])
+    if not state:
+        return {"hourly_costs": {}, "agent_id": None, "task_costs": {}}
+    return {
+        "hourly_costs": calculate_hourly_costs(state),
+        "agent_id": get_transcript_agent_id(transcript_path, state),
+        "task_costs": {agent_id: [str(int(timestamp // 3600)), calculate_model_cost(model_id, sums)]
+                       for agent_id, (timestamp, model_id, sums) in state["task_tokens"].items()}
+    }
+
+def scan_usage(projects_dir=None, use_cache=True, debug=False):
+    """Collect hourly cost buckets across all sessions under the projects directory.
+    
+    Per-transcript results are kept in an index keyed by path and reused
+    while the file's mtime and size are unchanged. Changed transcripts are
+    parsed with map_transcripts. Sub-agent transcripts are scanned like
+    sessions, so the usage Task results repeat from a scanned sub-agent
+    is taken out again (see merge_subagent_usage).
+    
+    Args:
+        projects_dir: Directory to scan (defaults to CLAUDE_PROJECTS_DIR)
+        use_cache: Whether to reuse results and checkpoints of unchanged files
+        debug: Whether to output debug information
+    
+    Returns:
+        Dict of epoch hour (int) -> [cost, first timestamp, last timestamp],
+        merged over all sessions
+    """
+    if projects_dir is None:
+        projects_dir = CLAUDE_PROJECTS_DIR
+    index_path = get_cache_path("usage-index", projects_dir)
+    index = read_cache_file(index_path) if use_cache else None
+    if not index or index.get("version") != CHECKPOINT_VERSION:
+        index = {"version": CHECKPOINT_VERSION, "files": {}}
+    cached_files = index["files"]
+    
+    files = {}
+    changed = []
+    for path in find_transcript_files(projects_dir):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        cached = cached_files.get(path)
+        if cached and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+            files[path] = cached
+        else:
+            files[path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "usage": None}
+            changed.append(path)
+    
+    if debug:
+        sys.stderr.write(f"DEBUG: Usage scan: {len(files)} transcripts, {len(changed)} changed\n")
+    
+    results = map_transcripts(scan_usage_file, changed, use_cache=use_cache, debug=debug)
+    for path, usage in zip(changed, results):
+        files[path]["usage"] = usage
+    
+    if use_cache and (changed or len(files) != len(cached_files)):
+        index["files"] = files
+        write_cache_file(index_path, index)
+    
+    merged = {}
+    for entry in files.values():
+        for hour, (cost, first, last) in entry["usage"]["hourly_costs"].items():
+            hour = int(hour)
+            bucket = merged.get(hour)
+            if bucket is None:
+                merged[hour] = [cost, first, last]
+            else:
+                bucket[0] += cost
+                bucket[1] = min(bucket[1], first)
+                bucket[2] = max(bucket[2], last)
+    
+    # Tasks whose sub-agent transcript was scanned are already counted there
+    agent_ids = {entry["usage"]["agent_id"] for entry in files.values() if entry["usage"]["agent_id"]}
+    for entry in files.values():
+        for agent_id, (hour, cost) in entry["usage"]["task_costs"].items():
+            if agent_id in agent_ids and int(hour) in merged:
+                merged[int(hour)][0] -= cost
+    return merged
+
+def calculate_daily_costs(hourly_costs):
+    """Sum hourly cost buckets into local calendar days.
+    
+    Returns:
+        Dict of "YYYY-MM-DD" (local time) -> cost
+    """
+    import time
+    
+    daily = {}
+    for hour, bucket in hourly_costs.items():
+        day = time.strftime("%Y-%m-%d", time.localtime(hour * 3600))
+        daily[day] = daily.get(day, 0.0) + bucket[0]
+    return daily
+
+def calculate_billing_blocks(hourly_costs):
+    """Split usage into 5-hour billing blocks.
+    
+    A block starts at the hour of the first entry after the previous block
+    ended, or after a gap of 5 hours without usage, and lasts 5 hours.
+    Blocks start on the hour, so an hourly bucket never straddles two.
+    
+    Returns:
+        List of dicts with start, end, cost, first and last (epoch seconds)
+    """
+    blocks = []
+    block = None
+    for hour in sorted(hourly_costs):
+        cost, first, last = hourly_costs[hour]
+        if block is None or first >= block["end"] or first - block["last"] >= BILLING_BLOCK_SECONDS:
+            start = hour * 3600
+            block = {"start": start, "end": start + BILLING_BLOCK_SECONDS, "cost": 0.0, "first": first, "last": last}
+            blocks.append(block)
+        block["cost"] += cost
+        block["last"] = max(block["last"], last)
+    return blocks
+
+def get_days_in_month(year, month):
+    """Get the number of days in a month."""
+    if month == 2:
+        return 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+def calculate_usage_metrics(config, now=None):
+    """Calculate the daily budget and active billing block metrics.
+    
+    Args:
+        config: Configuration dict from parse_arguments()
+        now: Epoch seconds to evaluate at (defaults to the current time)
+    
+    Returns:
+        Dict with today_cost, daily_budget and daily_budget_percent (when a
+        monthly budget is set) and block_cost, block_end and block_remaining
+        (when a billing block is active)
+    """
+    import time
+    
+    if now is None:
+        now = time.time()
+    hourly_costs = scan_usage(use_cache=config["cache"], debug=config.get("debug", False))
+    metrics = {}
+    
+    today = time.localtime(now)
+    metrics["today_cost"] = calculate_daily_costs(hourly_costs).get(time.strftime("%Y-%m-%d", today), 0.0)
+    if config.get("monthly_budget"):
+        daily_budget = config["monthly_budget"] / get_days_in_month(today.tm_year, today.tm_mon)
+        metrics["daily_budget"] = daily_budget
+        metrics["daily_budget_percent"] = metrics["today_cost"] * 100 / daily_budget
+    
+    blocks = calculate_billing_blocks(hourly_costs)
+    if blocks:
+        block = blocks[-1]
+        if now < block["end"] and now - block["last"] < BILLING_BLOCK_SECONDS:
+            metrics["block_cost"] = block["cost"]
+            metrics["block_end"] = block["end"]
+            metrics["block_remaining"] = block["end"] - now
+    return metrics
+
+def open_usage_store(db_path=None):
+    """Open the SQLite usage store, creating or rebuilding its schema.
+    
+    The store keeps one row per message with usage (session, project cwd,
+    model, timestamp, token counts, cost, and the agentId of Task results)
+    plus, per transcript, the sub-agent ID and the byte offset and column
+    state needed to resume parsing where the last sync stopped.
+    
+    Returns:
+        sqlite3 connection
+    """
+    import sqlite3
+    
+    if db_path is None:
+        db_path = USAGE_DB_PATH
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    db = sqlite3.connect(db_path)
+    if db.execute("PRAGMA user_version").fetchone()[0] != USAGE_STORE_VERSION:
+        with db:
+            db.execute("DROP TABLE IF EXISTS files")
+            db.execute("DROP TABLE IF EXISTS usage")
+            db.execute("""CREATE TABLE files (
+                path TEXT PRIMARY KEY, inode INTEGER, mtime_ns INTEGER, size INTEGER,
+                offset INTEGER, tail TEXT, resolver TEXT, agent TEXT)""")
+            db.execute("""CREATE TABLE usage (
+                path TEXT NOT NULL, session TEXT, project TEXT, model TEXT, timestamp REAL,
+                input_tokens INTEGER, output_tokens INTEGER, cache_creation_tokens INTEGER,
+                cache_read_tokens INTEGER, cost REAL, task TEXT)""")
+            db.execute("CREATE INDEX usage_timestamp ON usage (timestamp)")
+            db.execute("CREATE INDEX usage_path ON usage (path)")
+            db.execute("CREATE INDEX usage_model ON usage (model, timestamp)")
+            db.execute("CREATE INDEX usage_project ON usage (project, timestamp)")
+            db.execute("CREATE INDEX usage_session ON usage (session, timestamp)")
+            db.execute("CREATE INDEX files_agent ON files (agent)")
+            db.execute(f"PRAGMA user_version = {USAGE_STORE_VERSION}")
+    return db
+
+def sync_transcript_usage(db, transcript_path, stat, debug=False):
+    """Add the usage rows appended to one transcript since the last sync.
+    
+    Lines go through append_transcript_columns and calculate_column_costs,
+    the parsing path behind calculate_total_cost, so stored costs match the
+    status line. A transcript that was replaced or rewritten is re-read and
+    its rows replaced.
+    
+    Returns:
+        Number of usage rows added
+    """
+    columns = new_transcript_columns()
+    offset = 0
+    tail = b""
+    previous = db.execute("SELECT inode, offset, tail, resolver FROM files WHERE path = ?",
+                          (transcript_path,)).fetchone()
+    
+    with open(transcript_path, 'rb') as f:
+        if previous and previous[0] == stat.st_ino and previous[1] <= stat.st_size:
+            tail_start = max(0, previous[1] - CHECKPOINT_TAIL_BYTES)
+            f.seek(tail_start)
+            if f.read(previous[1] - tail_start).hex() == previous[2]:
+                offset = previous[1]
+                tail = bytes.fromhex(previous[2])
+                columns.update(json.loads(previous[3]))
+                columns["model_codes"] = {model_id: code for code, model_id in enumerate(columns["model_ids"])}
+        if offset == 0:
+            if previous and debug:
+                sys.stderr.write(f"DEBUG: Usage store: {transcript_path} was rewritten, re-reading\n")
+            db.execute("DELETE FROM usage WHERE path = ?", (transcript_path,))
+        
+        loads = get_json_loads()
+        f.seek(offset)
+        for raw_line in f:
+            if not raw_line.endswith(b"\n"):
+                break  # Still being written
+            offset += len(raw_line)
+            tail = (tail + raw_line)[-CHECKPOINT_TAIL_BYTES:]
+            if raw_line.isspace():
+                continue
+            try:
+                entry = loads(raw_line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict):
+                append_transcript_columns(columns, entry)
+    
+    session = columns["session_id"] or os.path.splitext(os.path.basename(transcript_path))[0]
+    project = columns["cwd"] or os.path.basename(os.path.dirname(transcript_path))
+    model_ids = columns["model_ids"]
+    tasks = columns["tasks"]
+    rows = []
+    for row, (model, timestamp, input_tokens, output_tokens, cache_creation, cache_read, cost) in enumerate(zip(
+            columns["model"], columns["timestamp"], columns["input_tokens"], columns["output_tokens"],
+            columns["cache_creation_tokens"], columns["cache_read_tokens"], calculate_column_costs(columns))):
+        if model < 0 and not (input_tokens or output_tokens or cache_creation or cache_read):
+            continue  # No usage on this row
+        rows.append((transcript_path, session, project, model_ids[model] if model >= 0 else None,
+                     timestamp if timestamp == timestamp else None,
+                     input_tokens, output_tokens, cache_creation, cache_read, cost, tasks.get(row)))
+    db.executemany("INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    
+    resolver = {key: columns[key] for key in USAGE_RESOLVER_KEYS}
+    agent_id = columns["agent_id"] or get_transcript_agent_id(transcript_path, None)
+    db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+               (transcript_path, stat.st_ino, stat.st_mtime_ns, stat.st_size, offset, tail.hex(),
+                json.dumps(resolver, separators=(",", ":")), agent_id))
+    return len(rows)
+
+def sync_usage_store(db, projects_dir=None, debug=False):
+    """Bring the usage store up to date with every transcript under the projects directory.
+    
+    Transcripts whose mtime and size match the store are skipped without
+    being opened. Rows of transcripts that were since deleted are kept, so
+    the store outlives Claude Code's transcript cleanup.
+    
+    Returns:
+        Number of usage rows added
+    """
+    if projects_dir is None:
+        projects_dir = CLAUDE_PROJECTS_DIR
+    known = {path: (mtime_ns, size) for path, mtime_ns, size in
+             db.execute("SELECT path, mtime_ns, size FROM files")}
+    added = 0
+    synced = 0
+    with db:
+        for path in find_transcript_files(projects_dir):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if known.get(path) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            try:
+                added += sync_transcript_usage(db, path, stat, debug=debug)
+                synced += 1
+            except OSError as e:
+                if debug:
+                    sys.stderr.write(f"DEBUG: Usage store: cannot read {path}: {e}\n")
+    if debug:
+        sys.stderr.write(f"DEBUG: Usage store: synced {synced} transcripts, {added} new rows\n")
+    return added
+
+def parse_report_date(date_str, end=False):
+    """Convert a local YYYY-MM-DD date to epoch seconds (end=True: start of the next day)."""
+    import time
+    
+    day = time.strptime(date_str, "%Y-%m-%d")
+    return time.mktime((day.tm_year, day.tm_mon, day.tm_mday + (1 if end else 0), 0, 0, 0, 0, 0, -1))
+
+def query_usage_report(db, by="day", since=None, until=None):
+    """Roll up stored usage per day, model, project or session.
+    
+    Args:
+        db: Usage store connection
+        by: Grouping, a key of REPORT_GROUPS
+        since: First local date to include (YYYY-MM-DD), or None
+        until: Last local date to include (YYYY-MM-DD), or None
+    
+    Returns:
+        List of dicts with key, messages, token sums and cost
+    """
+    # Task results repeat usage their sub-agent's transcript already stored
+    conditions = ["(task IS NULL OR task NOT IN (SELECT agent FROM files WHERE agent IS NOT NULL))"]
+    params = []
+    if since:
+        conditions.append("timestamp >= ?")
+        params.append(parse_report_date(since))
+    if until:
+        conditions.append("timestamp < ?")
+        params.append(parse_report_date(until, end=True))
+    where = f"WHERE {' AND '.join(conditions)}"
+    order = "key" if by == "day" else "cost DESC"
+    rows = db.execute(f"""
+        SELECT {REPORT_GROUPS[by]} AS key, COUNT(*), SUM(input_tokens), SUM(output_tokens),
+               SUM(cache_creation_tokens), SUM(cache_read_tokens), SUM(cost) AS cost
+        FROM usage {where} GROUP BY key ORDER BY {order}""", params)
+    return [{
+        "key": row[0],
+        "messages": row[1],
+        "input_tokens": row[2],
+        "output_tokens": row[3],
+        "cache_creation_tokens": row[4],
+        "cache_read_tokens": row[5],
+        "cost": row[6]
+    } for row in rows]
+
+def run_report(argv):
+    """Handle `pyccsl.py report`: sync the usage store and print a rollup.
+    
+    Returns:
+        Exit code
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="pyccsl.py report",
+        description="Usage and cost rollups over all Claude Code sessions"
+    )
+    parser.add_argument("--by", choices=list(REPORT_GROUPS), default="day",
+                        help="Group rows per day, model, project or session (default: day)")
+    parser.add_argument("--since", help="First local date to include (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Last local date to include (YYYY-MM-DD)")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    parser.add_argument("--no-sync", action="store_true",
+                        help="Query the store without reading new transcript lines first")
+    parser.add_argument("--projects-dir", default=CLAUDE_PROJECTS_DIR,
+                        help=f"Claude Code projects directory (default: {CLAUDE_PROJECTS_DIR})")
+    parser.add_argument("--db", default=USAGE_DB_PATH, help=f"Usage store path (default: {USAGE_DB_PATH})")
+    parser.add_argument("--debug", action="store_true", help="Output debug information to stderr")
+    args = parser.parse_args(argv)
+    
+    try:
+        for date_str in (args.since, args.until):
+            if date_str:
+                parse_report_date(date_str)
+    except ValueError:
+        print("Error: Invalid date. Expected YYYY-MM-DD", file=sys.stderr)
+        return 1
+    
+    db = open_usage_store(args.db)
+    try:
+        if not args.no_sync:
+            sync_usage_store(db, args.projects_dir, debug=args.debug)
+        rows = query_usage_report(db, args.by, args.since, args.until)
+    finally:
+        db.close()
+    
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    
+    headers = [args.by, "messages", "input", "output", "cache write", "cache read", "cost"]
+    table = [[str(row["key"] if row["key"] is not None else "-"),
+              format_number(row["messages"], "full"),
+              format_number(row["input_tokens"], "full"),
+              format_number(row["output_tokens"], "full"),
+              format_number(row["cache_creation_tokens"], "full"),
+              format_number(row["cache_read_tokens"], "full"),
+              f"${row['cost']:,.2f}"] for row in rows]
+    totals = [sum(row[key] for row in rows) for key in
+              ("messages", "input_tokens", "output_tokens", "cache_creation_tokens", "cache_read_tokens")]
+    table.append(["total"] + [format_number(total, "full") for total in totals] +
+                 [f"${sum(row['cost'] for row in rows):,.2f}"])
+    widths = [max(len(line[i]) for line in table + [headers]) for i in range(len(headers))]
+    print("  ".join(header.ljust(widths[0]) if i == 0 else header.rjust(widths[i])
+                    for i, header in enumerate(headers)))
+    for line in table:
+        print("  ".join(cell.ljust(widths[0]) if i == 0 else cell.rjust(widths[i])
+                        for i, cell in enumerate(line)))
+    return 0
+
+def format_cost(cost):
+    """Format cost as dollars or cents.
+    
+    Args:
+        cost: Cost in dollars (float)
+    
+    Returns:
+        Formatted string (e.g., "$1.25" or "48¢")
+    """
+    if cost >= 1.0:
+        return f"${cost:.2f}"
+    else:
+        cents = int(round(cost * 100))
+        return f"{cents}¢"
+
+def format_number(value, style="compact"):
+    """Format a number based on style preference.
+    
+    Args:
+        value: Number to format
+        style: "compact" (1.2K), "full" (1,234), or "raw" (1234)
+    
+    Returns:
+        Formatted string
+    """
+    if style == "compact":
+        if value >= 1_000_000:
+            return f"{value/1_000_000:.1f}M"
+        elif value >= 1_000:
+            return f"{value/1_000:.1f}K"
+        else:
+            return str(value)
+    elif style == "full":
+        return f"{value:,}"
+    else:  # raw
+        return str(value)
+
+def calculate_performance_badge(cache_hit_rate, avg_response_time, cache_thresholds, response_thresholds, colored=False, powerline=False, no_emoji=False):
+    """Calculate performance badge based on metrics and thresholds.
+    
+    Args:
+        cache_hit_rate: Cache hit rate (0.0 to 1.0)
+        avg_response_time: Average response time in seconds
+        cache_thresholds: List of [green, yellow, orange] thresholds for cache hit rate
+        response_thresholds: List of [green, yellow, orange] thresholds for response time
+        colored: Whether to apply colors to the badge
+        powerline: Whether this is for powerline style (different coloring)
+    
+    Returns:
+        Badge string (e.g., "●○○○", "○●○○", "○○●○", "○○○●")
+    """
+    # Calculate performance level for cache hit rate (higher is better)
+    cache_percent = cache_hit_rate * 100
+    if cache_percent >= cache_thresholds[0]:
+        cache_level = 0  # Green
+    elif cache_percent >= cache_thresholds[1]:
+        cache_level = 1  # Yellow
+    elif cache_percent >= cache_thresholds[2]:
+        cache_level = 2  # Orange
+    else:
+        cache_level = 3  # Red
+    
+    # Calculate performance level for response time (lower is better)
+    if avg_response_time <= response_thresholds[0]:
+        response_level = 0  # Green
+    elif avg_response_time <= response_thresholds[1]:
+        response_level = 1  # Yellow
+    elif avg_response_time <= response_thresholds[2]:
+        response_level = 2  # Orange
+    else:
+        response_level = 3  # Red
+    
+    # Combine metrics (take the worse of the two)
+    overall_level = max(cache_level, response_level)
+    
+    # Choose characters based on emoji preference and color availability
+    active_char = "*" if no_emoji else "●"
+    # When no colors, use open circles for inactive so they're distinguishable
+    # When colors are used, use filled circles for both (distinguished by color)
+    inactive_char = "o" if no_emoji else ("○" if not colored else "●")
+    
+    # Generate badge string with colors if requested
+    if colored:
+        # Define colors for each level: green, darker yellow, orange, red
+        colors = [82, 220, 208, 196]  # ANSI 256-color codes (220 is darker yellow)
+        
+        if powerline:
+            # Powerline style: white background throughout, black dots except for the active one
+            # Build the entire string with continuous white background
+            result = "\033[48;5;244m"  # Start with 50% gray background
+            for i in range(4):
+                if i == overall_level:
+                    # Active dot - just change foreground color, keep white background
+                    result += f"\033[38;5;{colors[i]}m{active_char}"
+                else:
+                    # Inactive dot - black foreground, keep white background
+                    result += f"\033[38;5;0m{inactive_char}"
+            # Don't add RESET here - let the powerline handler manage that
+            return result
+        else:
+            # Regular style: colored active dot, gray inactive dots
+            gray = 244  # Gray for inactive dots
+            dots = []
+            for i in range(4):
+                if i == overall_level:
+                    # Active dot with its color
+                    dots.append(apply_color(active_char, fg_color=colors[i]))
+                else:
+                    # Inactive dot - gray outline
+                    dots.append(apply_color(inactive_char, fg_color=gray))
+            return "".join(dots)
+    else:
+        # Plain badge without colors
+        badges = [
+            f"{active_char}{inactive_char}{inactive_char}{inactive_char}",
+            f"{inactive_char}{active_char}{inactive_char}{inactive_char}",
+            f"{inactive_char}{inactive_char}{active_char}{inactive_char}",
+            f"{inactive_char}{inactive_char}{inactive_char}{active_char}"
+        ]
+        return badges[overall_level]
+
+def calculate_performance_metrics(transcript_entries, token_totals, debug=False):
+    """Calculate performance metrics from transcript.
+    
+    Args:
+        transcript_entries: List of parsed transcript entries or transcript columns
+        token_totals: Dict with token usage totals
+        debug: Whether to output debug information
+    
+    Returns:
+        Dict with performance metrics
+    """
+    state = analyze_transcript_entries(transcript_entries, debug=debug)
+    return calculate_state_performance_metrics(state, token_totals)
+
+def format_duration(seconds):
+    """Format duration in seconds to human-readable format."""
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    elif seconds < 3600:
+        minutes = seconds / 60
+        return f"{minutes:.0f}m"
+    else:
+        hours = seconds / 3600
+        if hours < 24:
+            return f"{hours:.1f}h"
+        else:
+            days = hours / 24
+            return f"{days:.0f}d"
+
+def compile_render_plan(config):
+    """Compile the display configuration into a render plan.
+    
+    Everything format_output would otherwise re-derive per call is settled
+    here once: which fields are shown and in what order, the separator, and
+    the SGR escape prefixes of every field, powerline segment and powerline
+    transition. Rendering then only joins strings.
+    
+    Returns:
+        Plan dict
+    """
+    theme_colors = THEMES.get(config["theme"], {})
+    is_powerline = config["style"] == "powerline"
+    plan = {
+        "fields": get_display_fields(config["fields"]),
+        "numbers": config["numbers"],
+        "no_emoji": config["no_emoji"],
+        "prefixes": {},
+        "backgrounds": {},
+        "segments": {},
+        "transitions": {}
+    }
+    
+    if is_powerline and config["theme"] != "none":
+        plan["mode"] = "powerline"
+        plan["separator"] = ""
+        for field in plan["fields"]:
+            # Badge gets 50% gray background in powerline mode for better contrast
+            bg_color = 244 if field == "badge" else get_field_color(split_window_field(field)[0], theme_colors)
+            plan["backgrounds"][field] = bg_color
+        colors = sorted({bg for bg in plan["backgrounds"].values() if bg is not None})
+        for bg_color in colors:
+            # Segment text is black on the field color; separators carry the
+            # current color into the next segment (or the black end)
+            plan["segments"][bg_color] = f"\033[38;5;0;48;5;{bg_color}m"
+            for next_bg in colors + [0, None]:
+                plan["transitions"][(bg_color, next_bg)] = apply_color(
+                    POWERLINE_RIGHT, fg_color=bg_color, bg_color=next_bg)
+        return plan
+    
+    if is_powerline:
+        # Powerline with no colors - use simple separator
+        plan["mode"] = "powerline (no theme)"
+        plan["separator"] = " > "
+    else:
+        plan["mode"] = "regular"
+        plan["separator"] = {"pipes": " | ", "arrows": " → ", "dots": " · "}.get(config["style"], " > ")
+    for field in plan["fields"]:
+        color = get_field_color(split_window_field(field)[0], theme_colors) if field != "badge" else None
+        plan["prefixes"][field] = f"\033[38;5;{color}m" if color is not None else ""
+    return plan
+
+def get_render_plan(config):
+    """Get the render plan for a configuration, compiling it at most once per process.
+    
+    Plans are not cached on disk: compiling one takes well under a
+    millisecond, less than hashing the key and reading a cache file would.
+    The daemon may see many configurations, so only the RENDER_PLANS_MAX
+    most recently used plans are kept.
+    """
+    key = (tuple(config["fields"]), config["theme"], config["style"], config["numbers"], config["no_emoji"])
+    plan = RENDER_PLANS.pop(key, None)
+    if plan is None:
+        plan = compile_render_plan(config)
+    RENDER_PLANS[key] = plan
+    while len(RENDER_PLANS) > RENDER_PLANS_MAX:
+        del RENDER_PLANS[next(iter(RENDER_PLANS))]
+    return plan
+
+def render_with_plan(plan, contents):
+    """Join rendered field contents according to a render plan.
+    
+    Args:
+        plan: Plan from get_render_plan()
+        contents: List of (field, text) for the fields that have content
+    
+    Returns:
+        The formatted status line
+    """
+    if plan["mode"] != "powerline":
+        prefixes = plan["prefixes"]
+        return plan["separator"].join(
+            f"{prefixes[field]}{text}{RESET}" if prefixes[field] else text
+            for field, text in contents)
+    
+    # Group consecutive fields sharing a background color into one segment
+    groups = []
+    backgrounds = plan["backgrounds"]
+    for field, text in contents:
+        bg_color = backgrounds[field]
+        if groups and bg_color is not None and groups[-1][1] == bg_color:
+            groups[-1][0].append(text)
+        else:
+            groups.append(([text], bg_color))
+    
+    result = []
+    last = len(groups) - 1
+    for i, (texts, bg_color) in enumerate(groups):
+        if bg_color is None:
+            continue
+        result.append(f"{plan['segments'][bg_color]} {' '.join(texts)} {RESET}")
+        if i < last:
+            result.append(plan["transitions"][(bg_color, groups[i + 1][1])])
+        else:
+            # Final separator - foreground matches last segment bg, background is black
+            result.append(plan["transitions"][(bg_color, 0)])
+    return "".join(result)
+
+def format_output(config, model_info, input_data, metrics=None):
+    """Format the output based on selected fields and configuration.
+    
+    Args:
+        config: Configuration dict from parse_arguments()
+        model_info: Model information dict with display_name and id
+        input_data: Full input JSON data
+        metrics: Dict with calculated metrics (cost, tokens, etc.)
+    
+    Returns:
+        Formatted string for output
+    """
+    if metrics is None:
+        metrics = {}
+    
+    debug = config.get("debug", False)
     
     if debug:
         sys.stderr.write(f"DEBUG: === format_output ===\n")
@@ -1010,262 +3518,306 @@ def format_output(config, model_info, input_data, metrics=None):
             sys.stderr.write(f"DEBUG: WARNING: metrics dict is empty!\n")
         sys.stderr.write(f"DEBUG: Model info: {model_info}\n")
     
-    # Get theme colors
-    theme_colors = THEMES.get(config["theme"], {})
-    is_powerline = config["style"] == "powerline"
+    plan = get_render_plan(config)
+    stale = metrics.get("stale_stages")
     
-    # Initialize storage based on style
-    output_parts = []  # Used for non-powerline or powerline without theme
-    segments = []  # Used for powerline with theme
-    
-    # Get separator based on style (for non-powerline)
-    if config["style"] == "pipes":
-        separator = " | "
-    elif config["style"] == "arrows":
-        separator = " → "
-    elif config["style"] == "dots":
-        separator = " · "
-    else:  # simple or powerline fallback
-        separator = " > "
-    
-    # Process fields in FIELD_ORDER sequence
-    for field in FIELD_ORDER:
-        if field not in config["fields"]:
-            continue
-            
+    # Render the planned fields in order, skipping those without content
+    contents = []
+    for field in plan["fields"]:
         if debug:
             sys.stderr.write(f"DEBUG: Processing field: {field}\n")
-            
-        # Prepare field content
-        field_content = None
-        
-        # Handle different fields
-        if field == "badge":
-            if "badge" in metrics:
-                field_content = metrics["badge"]
-            elif debug:
-                sys.stderr.write(f"DEBUG: Badge not in metrics (need cache_hit_rate and avg_response_time)\n")
-        elif field == "model":
-            if "display_name" in model_info:
-                field_content = model_info["display_name"]
-            elif debug:
-                sys.stderr.write(f"DEBUG: No display_name in model_info: {model_info}\n")
-        elif field == "folder":
-            # Extract folder name from cwd
-            cwd = input_data.get("cwd", os.getcwd())
-            folder_name = os.path.basename(cwd)
-            # Handle root directory
-            if not folder_name:
-                folder_name = "/" if cwd == "/" else os.path.basename(os.path.dirname(cwd))
-            # Truncate if too long
-            if len(folder_name) > 20:
-                folder_name = folder_name[:17] + "..."
-            field_content = folder_name
-        elif field == "input" and any(k in metrics for k in ["input_tokens", "cache_creation_tokens", "cache_read_tokens"]):
-            # Display as tuple: (base, cache_write, cache_read)
-            base = format_number(metrics.get("input_tokens", 0), config["numbers"])
-            cache_write = format_number(metrics.get("cache_creation_tokens", 0), config["numbers"])
-            cache_read = format_number(metrics.get("cache_read_tokens", 0), config["numbers"])
-            prefix = "In:" if config["no_emoji"] else "↑"
-            field_content = f"{prefix} ({base}, {cache_write}, {cache_read})"
-        elif field == "output" and "output_tokens" in metrics:
-            prefix = "Out:" if config["no_emoji"] else "↓"
-            field_content = f"{prefix} {format_number(metrics['output_tokens'], config['numbers'])}"
-        elif field == "tokens" and "context_size" in metrics:
-            prefix = "Tok:" if config["no_emoji"] else "⧉"
-            field_content = f"{prefix} {format_number(metrics['context_size'], config['numbers'])}"
-        elif field == "cost":
-            if "cost_formatted" in metrics:
-                field_content = metrics["cost_formatted"]
-            elif debug:
-                sys.stderr.write(f"DEBUG: Cost not available - need model_id and token data\n")
-        elif field == "git" and "git_info" in metrics:
-            # Format git status: "branch ●" if modified, "branch" if clean
-            branch = metrics["git_info"]["branch"]
-            modified = metrics["git_info"]["modified_count"]
-            if modified > 0:
-                indicator = "*" if config["no_emoji"] else "●"
-                field_content = f"{branch} {indicator}"
-            else:
-                field_content = branch
-        elif field == "perf-cache-rate" and "cache_hit_rate" in metrics:
-            # Format cache hit rate as percentage
-            rate = metrics["cache_hit_rate"] * 100
-            if config["no_emoji"]:
-                field_content = f"Cache: {rate:.0f}%"
-            else:
-                field_content = f"⚡ {rate:.0f}%"
-        elif field == "perf-response-time" and "avg_response_time" in metrics:
-            # Format average response time
-            time_str = format_duration(metrics["avg_response_time"])
-            if config["no_emoji"]:
-                field_content = f"Response: {time_str}"
-            else:
-                field_content = f"⏱ {time_str}"
-        elif field == "perf-session-time" and "session_duration" in metrics:
-            # Format session duration
-            time_str = format_duration(metrics["session_duration"])
-            if config["no_emoji"]:
-                field_content = f"Session: {time_str}"
-            else:
-                field_content = f"🕐 {time_str}"
-        elif field == "perf-message-count" and "message_count" in metrics:
-            # Format message count
-            count = metrics["message_count"]
-            if config["no_emoji"]:
-                field_content = f"Messages: {count}"
-            else:
-                field_content = f"💬 {count}"
-        elif field == "perf-all-metrics":
-            # Show all performance metrics together
-            perf_parts = []
-            if "cache_hit_rate" in metrics:
-                rate = metrics["cache_hit_rate"] * 100
-                perf_parts.append(f"⚡ {rate:.0f}%" if not config["no_emoji"] else f"Cache: {rate:.0f}%")
-            if "avg_response_time" in metrics:
-                time_str = format_duration(metrics["avg_response_time"])
-                perf_parts.append(f"⏱ {time_str}" if not config["no_emoji"] else f"Response: {time_str}")
-            if "session_duration" in metrics:
-                time_str = format_duration(metrics["session_duration"])
-                perf_parts.append(f"🕐 {time_str}" if not config["no_emoji"] else f"Session: {time_str}")
-            if "message_count" in metrics:
-                count = metrics["message_count"]
-                perf_parts.append(f"💬 {count}" if not config["no_emoji"] else f"Messages: {count}")
-            if perf_parts:
-                field_content = " ".join(perf_parts)
         
-        # Add field to output
+        field_content = format_field(field, config, model_info, input_data, metrics)
+        if field_content and stale and get_field_stage(field) in stale:
+            field_content = STALE_MARKER + field_content
         if field_content:
             if debug:
                 sys.stderr.write(f"DEBUG: Adding field '{field}' with content: '{field_content[:50]}...'\n")
-            
-            if is_powerline and config["theme"] != "none":
-                # For powerline, store segment with its background color
-                bg_color = get_field_color(field, theme_colors)
-                if field == "badge":
-                    # Badge gets 50% gray background in powerline mode for better contrast
-                    bg_color = 244  # 50% gray
-                segments.append((field_content, bg_color))
-            else:
-                # Regular styling - apply foreground color
-                if field != "badge":
-                    color = get_field_color(field, theme_colors)
-                    if color is not None:
-                        field_content = apply_color(field_content, fg_color=color)
-                output_parts.append(field_content)
-        else:
-            if debug:
-                sys.stderr.write(f"DEBUG: Field '{field}' has no content, skipping\n")
+            contents.append((field, field_content))
+        elif debug:
+            sys.stderr.write(f"DEBUG: Field '{field}' has no content, skipping\n")
     
-    # Build final output
-    if is_powerline and config["theme"] != "none":
-        # Build powerline style output
-        # Group segments by background color
-        grouped_segments = []
-        current_group = []
-        current_bg = None
-        
-        for text, bg_color in segments:
-            if bg_color == current_bg and current_bg is not None:
-                # Same background, add to current group
-                current_group.append(text)
-            else:
-                # New background, save previous group and start new one
-                if current_group:
-                    grouped_segments.append((" ".join(current_group), current_bg))
-                current_group = [text]
-                current_bg = bg_color
-        
-        # Add final group
-        if current_group:
-            grouped_segments.append((" ".join(current_group), current_bg))
-        
-        # Build result with grouped segments
-        result = []
-        for i, (text, bg_color) in enumerate(grouped_segments):
-            if bg_color is None:
-                continue
-            
-            # Apply background color and black text to segment
-            # Badge is now treated the same as all other fields - simple and consistent
-            segment_text = apply_color(f" {text} ", fg_color=0, bg_color=bg_color)
-            result.append(segment_text)
-            
-            # Add separator if not last segment
-            if i < len(grouped_segments) - 1:
-                next_bg = grouped_segments[i + 1][1] if i + 1 < len(grouped_segments) else None
-                if next_bg is not None:
-                    # Separator with current bg as fg, next bg as bg
-                    sep = apply_color(POWERLINE_RIGHT, fg_color=bg_color, bg_color=next_bg)
-                else:
-                    # Final separator with just fg color
-                    sep = apply_color(POWERLINE_RIGHT, fg_color=bg_color)
-                result.append(sep)
-            else:
-                # Final separator - foreground matches last segment bg, background is default (0 = black)
-                sep = apply_color(POWERLINE_RIGHT, fg_color=bg_color, bg_color=0)
-                result.append(sep)
-        
-        result_str = "".join(result)
-        if debug:
-            sys.stderr.write(f"DEBUG: Returning powerline output with {len(segments)} segments\n")
-        return result_str
-    elif is_powerline:
-        # Powerline with no colors - use simple separator
-        result_str = " > ".join(output_parts)
-        if debug:
-            sys.stderr.write(f"DEBUG: Returning powerline (no theme) output with {len(output_parts)} parts\n")
-        return result_str
-    else:
-        # Join parts with separator for non-powerline styles
-        result_str = separator.join(output_parts)
-        if debug:
-            sys.stderr.write(f"DEBUG: Returning regular output with {len(output_parts)} parts\n")
-        return result_str
+    result_str = render_with_plan(plan, contents)
+    if debug:
+        sys.stderr.write(f"DEBUG: Returning {plan['mode']} output with {len(contents)} parts\n")
+    return result_str
 
-def main():
-    """Main entry point."""
-    # Parse arguments
-    config = parse_arguments()
+def format_field(field, config, model_info, input_data, metrics):
+    """Format the content of one field.
+    
+    Returns:
+        Field text (uncolored), or None if the field has nothing to show
+    """
     debug = config.get("debug", False)
+    field_content = None
+    
+    if "@" in field:
+        # Windowed field: the base field over the window's metrics, labelled
+        base, _, window = field.partition("@")
+        window_metrics = metrics.get("windows", {}).get(window)
+        if window_metrics:
+            field_content = format_field(base, config, model_info, input_data, window_metrics)
+        if field_content:
+            field_content = f"{field_content} ({window})"
+        elif debug:
+            sys.stderr.write(f"DEBUG: No data in the last {window} for {base}\n")
+        return field_content
+    
+    if field == "badge":
+        if "badge" in metrics:
+            field_content = metrics["badge"]
+        elif debug:
+            sys.stderr.write(f"DEBUG: Badge not in metrics (need cache_hit_rate and avg_response_time)\n")
+    elif field == "model":
+        if "display_name" in model_info:
+            field_content = model_info["display_name"]
+        elif debug:
+            sys.stderr.write(f"DEBUG: No display_name in model_info: {model_info}\n")
+    elif field == "folder":
+        # Extract folder name from cwd
+        cwd = input_data.get("cwd", os.getcwd())
+        folder_name = os.path.basename(cwd)
+        # Handle root directory
+        if not folder_name:
+            folder_name = "/" if cwd == "/" else os.path.basename(os.path.dirname(cwd))
+        # Truncate if too long
+        if len(folder_name) > 20:
+            folder_name = folder_name[:17] + "..."
+        field_content = folder_name
+    elif field == "input" and any(k in metrics for k in ["input_tokens", "cache_creation_tokens", "cache_read_tokens"]):
+        # Display as tuple: (base, cache_write, cache_read)
+        base = format_number(metrics.get("input_tokens", 0), config["numbers"])
+        cache_write = format_number(metrics.get("cache_creation_tokens", 0), config["numbers"])
+        cache_read = format_number(metrics.get("cache_read_tokens", 0), config["numbers"])
+        prefix = "In:" if config["no_emoji"] else "↑"
+        field_content = f"{prefix} ({base}, {cache_write}, {cache_read})"
+    elif field == "output" and "output_tokens" in metrics:
+        prefix = "Out:" if config["no_emoji"] else "↓"
+        field_content = f"{prefix} {format_number(metrics['output_tokens'], config['numbers'])}"
+    elif field == "tokens" and "context_size" in metrics:
+        prefix = "Tok:" if config["no_emoji"] else "⧉"
+        field_content = f"{prefix} {format_number(metrics['context_size'], config['numbers'])}"
+    elif field == "context" and "context_tokens" in metrics:
+        # Current context window occupancy: "◔ 45.2K (23%)"
+        prefix = "Ctx:" if config["no_emoji"] else "◔"
+        tokens_str = format_number(metrics["context_tokens"], config["numbers"])
+        field_content = f"{prefix} {tokens_str} ({metrics['context_percent']:.0f}%)"
+    elif field == "cost":
+        if "cost_formatted" in metrics:
+            field_content = metrics["cost_formatted"]
+        elif debug:
+            sys.stderr.write(f"DEBUG: Cost not available - need model_id and token data\n")
+    elif field == "daily-budget" and "today_cost" in metrics:
+        # Today's cost across all sessions: "📅 $4.20 (65%)"
+        prefix = "Day:" if config["no_emoji"] else "📅"
+        field_content = f"{prefix} {format_cost(metrics['today_cost'])}"
+        if "daily_budget_percent" in metrics:
+            field_content += f" ({metrics['daily_budget_percent']:.0f}%)"
+    elif field == "block-remaining" and "block_remaining" in metrics:
+        # Time left in the active 5-hour billing block: "⏳ 2h 13m"
+        prefix = "Block:" if config["no_emoji"] else "⏳"
+        minutes = int(metrics["block_remaining"] // 60)
+        remaining = f"{minutes // 60}h {minutes % 60}m" if minutes >= 60 else f"{minutes}m"
+        field_content = f"{prefix} {remaining}"
+    elif field == "git" and "git_info" in metrics:
+        # Format git status: "branch ●" if modified, "branch" if clean
+        branch = metrics["git_info"]["branch"]
+        modified = metrics["git_info"]["modified_count"]
+        if modified > 0:
+            indicator = "*" if config["no_emoji"] else "●"
+            field_content = f"{branch} {indicator}"
+        else:
+            field_content = branch
+    elif field == "perf-cache-rate" and "cache_hit_rate" in metrics:
+        # Format cache hit rate as percentage
+        rate = metrics["cache_hit_rate"] * 100
+        if config["no_emoji"]:
+            field_content = f"Cache: {rate:.0f}%"
+        else:
+            field_content = f"⚡ {rate:.0f}%"
+    elif field == "perf-response-time" and "avg_response_time" in metrics:
+        # Format average response time
+        time_str = format_duration(metrics["avg_response_time"])
+        if config["no_emoji"]:
+            field_content = f"Response: {time_str}"
+        else:
+            field_content = f"⏱ {time_str}"
+    elif field in ("perf-response-p50", "perf-response-p90", "perf-response-p99") and \
+            f"response_{field[14:]}" in metrics:
+        # Response time percentile from the session's sketch
+        percentile = field[14:]
+        time_str = format_duration(metrics[f"response_{percentile}"])
+        if config["no_emoji"]:
+            field_content = f"Response {percentile}: {time_str}"
+        else:
+            field_content = f"⏱ {percentile} {time_str}"
+    elif field == "perf-session-time" and "session_duration" in metrics:
+        # Format session duration
+        time_str = format_duration(metrics["session_duration"])
+        if config["no_emoji"]:
+            field_content = f"Session: {time_str}"
+        else:
+            field_content = f"🕐 {time_str}"
+    elif field == "perf-message-count" and "message_count" in metrics:
+        # Format message count
+        count = metrics["message_count"]
+        if config["no_emoji"]:
+            field_content = f"Messages: {count}"
+        else:
+            field_content = f"💬 {count}"
+    elif field == "perf-all-metrics":
+        # Show all performance metrics together
+        perf_parts = []
+        if "cache_hit_rate" in metrics:
+            rate = metrics["cache_hit_rate"] * 100
+            perf_parts.append(f"⚡ {rate:.0f}%" if not config["no_emoji"] else f"Cache: {rate:.0f}%")
+        if "avg_response_time" in metrics:
+            time_str = format_duration(metrics["avg_response_time"])
+            perf_parts.append(f"⏱ {time_str}" if not config["no_emoji"] else f"Response: {time_str}")
+        if "session_duration" in metrics:
+            time_str = format_duration(metrics["session_duration"])
+            perf_parts.append(f"🕐 {time_str}" if not config["no_emoji"] else f"Session: {time_str}")
+        if "message_count" in metrics:
+            count = metrics["message_count"]
+            perf_parts.append(f"💬 {count}" if not config["no_emoji"] else f"Messages: {count}")
+        if perf_parts:
+            field_content = " ".join(perf_parts)
+    
+    return field_content
+
+def start_profile():
+    """Start collecting per-stage timings and allocations for --profile.
+    
+    Allocations are traced with tracemalloc, which slows every stage down
+    somewhat; compare wall times between stages rather than with runs
+    without --profile. With a deadline set, data stages overlap, so their
+    CPU times and allocations include each other's.
+    """
+    global PROFILE_STAGES
+    import time
+    import tracemalloc
+    
+    PROFILE_STAGES = []
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    PROFILE_STAGES.append({"started": (time.perf_counter(), time.process_time())})
+
+def profile_stage(name, func, *args, **kwargs):
+    """Call func(*args, **kwargs), recording it as a stage when profiling.
     
-    if debug:
-        sys.stderr.write(f"DEBUG: Config: {config}\n")
+    Records wall time, CPU time, bytes still allocated when the stage
+    returns and the peak allocated during the stage.
     
-    # Read input
-    input_data = read_input()
+    Returns:
+        Whatever func returns
+    """
+    stages = PROFILE_STAGES
+    if stages is None:
+        return func(*args, **kwargs)
     
-    if debug:
-        sys.stderr.write(f"DEBUG: Input data keys: {list(input_data.keys())}\n")
-        sys.stderr.write(f"DEBUG: Model: {input_data.get('model', 'None')}\n")
-        sys.stderr.write(f"DEBUG: Transcript path: {input_data.get('transcript_path', 'None')}\n")
-        sys.stderr.write(f"DEBUG: CWD: {input_data.get('cwd', 'None')}\n")
+    import time
+    import tracemalloc
     
-    # Extract model info
-    model_info = extract_model_info(input_data)
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+        memory_after, memory_peak = tracemalloc.get_traced_memory()
+        stages.append({
+            "stage": name,
+            "wall_ms": round(wall * 1000, 3),
+            "cpu_ms": round(cpu * 1000, 3),
+            "alloc_bytes": memory_after - memory_before,
+            "peak_bytes": max(memory_peak - memory_before, 0)
+        })
+
+def stop_profile():
+    """Stop profiling without reporting."""
+    global PROFILE_STAGES
+    import tracemalloc
     
-    if debug:
-        sys.stderr.write(f"DEBUG: Model info: {model_info}\n")
+    PROFILE_STAGES = None
+    tracemalloc.stop()
+
+def finish_profile(config, input_data=None):
+    """Stop profiling and report the collected stages.
     
-    # Extract git status
-    git_info = extract_git_status(input_data)
+    The report goes to stderr as a table, or is appended as one JSON line
+    to config["profile_log"] when set.
+    """
+    import time
     
-    if debug:
-        sys.stderr.write(f"DEBUG: Git info: {git_info}\n")
+    if PROFILE_STAGES is None:
+        return
+    wall_start, cpu_start = PROFILE_STAGES[0]["started"]
+    stages = PROFILE_STAGES[1:]
+    total = {
+        "wall_ms": round((time.perf_counter() - wall_start) * 1000, 3),
+        "cpu_ms": round((time.process_time() - cpu_start) * 1000, 3)
+    }
+    stop_profile()
+    
+    if config.get("profile_log"):
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "version": __version__,
+            "pid": os.getpid(),
+            "fields": config["fields"],
+            "transcript_path": (input_data or {}).get("transcript_path"),
+            "cwd": (input_data or {}).get("cwd"),
+            "stages": stages,
+            "total_wall_ms": total["wall_ms"],
+            "total_cpu_ms": total["cpu_ms"]
+        }
+        try:
+            with open(os.path.expanduser(config["profile_log"]), 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            sys.stderr.write(f"Error: Could not write profile log: {e}\n")
+        return
+    
+    sys.stderr.write(f"PROFILE: {'stage':<22}{'wall ms':>10}{'cpu ms':>10}{'alloc KB':>11}{'peak KB':>10}\n")
+    for stage in stages:
+        sys.stderr.write(f"PROFILE: {stage['stage']:<22}{stage['wall_ms']:>10.3f}{stage['cpu_ms']:>10.3f}"
+                         f"{stage['alloc_bytes'] / 1024:>11.1f}{stage['peak_bytes'] / 1024:>10.1f}\n")
+    sys.stderr.write(f"PROFILE: {'total':<22}{total['wall_ms']:>10.3f}{total['cpu_ms']:>10.3f}\n")
+
+def compute_transcript_metrics(config, input_data, facets):
+    """Compute the transcript-derived metrics (tokens, cost, performance).
+    
+    Returns:
+        Metrics dict (empty if the transcript has no entries)
+    """
+    debug = config.get("debug", False)
     
-    # Load transcript if provided
+    # Load transcript aggregates, resuming from the last checkpoint if possible
     transcript_path = input_data.get("transcript_path", None)
-    transcript_entries = load_transcript(transcript_path, debug=debug)
+    transcript_state = profile_stage("transcript", load_transcript_state, transcript_path,
+                                     use_cache=config["cache"], facets=facets, debug=debug)
+    
+    # Token usage and cost of Task sub-agents belong to the session too
+    if transcript_state and config.get("subagents", True) and "usage" in facets:
+        subagent_usage = profile_stage("subagents", load_subagent_usage, transcript_path,
+                                       use_cache=config["cache"], debug=debug)
+        if subagent_usage:
+            transcript_state = merge_subagent_usage(transcript_state, subagent_usage)
     
     # Calculate metrics from transcript
     metrics = {}
     
     if debug:
-        sys.stderr.write(f"DEBUG: Transcript entries loaded: {len(transcript_entries)}\n")
+        entry_count = transcript_state["entry_count"] if transcript_state else 0
+        sys.stderr.write(f"DEBUG: Transcript entries loaded: {entry_count}\n")
     
-    if transcript_entries:
-        # Calculate token usage
-        token_totals = calculate_token_usage(transcript_entries)
+    if transcript_state and transcript_state["entry_count"]:
+        # Token usage totals
+        token_totals = dict(transcript_state["tokens"])
         metrics.update(token_totals)
         
         if debug:
@@ -1273,54 +3825,912 @@ def main():
         
         # Calculate tokens (all non-cached tokens: input + cache_creation + output)
         # This represents the actual token usage that counts toward context
-        context_size = (token_totals.get("input_tokens", 0) + 
-                       token_totals.get("cache_creation_tokens", 0) + 
+        context_size = (token_totals.get("input_tokens", 0) +
+                       token_totals.get("cache_creation_tokens", 0) +
                        token_totals.get("output_tokens", 0))
         metrics["context_size"] = context_size  # Keep internal name for compatibility
         
-        # Calculate cost using per-entry models
-        cost = calculate_total_cost(transcript_entries, debug=debug)
+        # Cost accumulated per entry using each entry's model
+        cost = transcript_state["total_cost"]
         metrics["cost"] = cost
         metrics["cost_formatted"] = format_cost(cost)
         
+        if debug:
+            write_cost_breakdown(transcript_state)
+        
         # Calculate performance metrics
-        perf_metrics = calculate_performance_metrics(transcript_entries, token_totals, debug=debug)
+        perf_metrics = profile_stage("performance_metrics", calculate_state_performance_metrics,
+                                     transcript_state, token_totals)
         metrics.update(perf_metrics)
         
-        # Calculate performance badge
-        if "cache_hit_rate" in metrics and "avg_response_time" in metrics:
-            # Badge should be colored unless theme is "none"
-            colored = config["theme"] != "none"
-            is_powerline = config["style"] == "powerline"
-            badge = calculate_performance_badge(
-                metrics["cache_hit_rate"],
-                metrics["avg_response_time"],
-                config["cache_thresholds"],
-                config["response_thresholds"],
-                colored=colored,
-                powerline=is_powerline,
-                no_emoji=config["no_emoji"]
-            )
-            metrics["badge"] = badge
+        # Windowed fields, keyed by the window as written ("5m")
+        windows = {field.partition("@")[2]: split_window_field(field)[1]
+                   for field in config["fields"] if split_window_field(field)[1]}
+        if windows:
+            import time
+            now = time.time()
+            metrics["windows"] = {name: calculate_window_metrics(transcript_state, window, now)
+                                  for name, window in windows.items()}
+    return metrics
+
+def compute_context_metrics(input_data, model_info, debug=False):
+    """Compute the current context window occupancy from the latest assistant message.
+    
+    Returns:
+        Dict with context_tokens and context_percent (empty if unknown)
+    """
+    context_usage = read_context_usage(input_data.get("transcript_path", None), debug=debug)
+    if not context_usage:
+        return {}
+    # Only the model ID on stdin carries the "[1m]" suffix of 1M-context sessions
+    context_window = get_context_window(model_info.get("id") or context_usage["model_id"])
+    return {
+        "context_tokens": context_usage["context_tokens"],
+        "context_percent": context_usage["context_tokens"] * 100 / context_window
+    }
+
+def get_render_stages(config, input_data, model_info):
+    """Get the data-gathering stages needed for the configured fields.
+    
+    Stages are independent of each other, so they may run concurrently.
+    Each one returns a JSON-serializable value, so its last good result can
+    be cached per session (see run_stages_with_deadline).
+    
+    Returns:
+        Dict of stage name -> zero-argument callable, in display order
+    """
+    debug = config.get("debug", False)
+    fields = config["fields"]
+    stages = {}
+    
+    # Git status (only when displayed - it spawns git)
+    if "git" in fields:
+        stages["git"] = lambda: profile_stage("git", extract_git_status, input_data,
+                                              ttl=config["git_ttl"], use_cache=config["cache"])
+    
+    facets = get_transcript_facets(fields)
+    if facets:
+        stages["transcript"] = lambda: compute_transcript_metrics(config, input_data, facets)
+    
+    if "context" in fields:
+        stages["context"] = lambda: profile_stage("context", compute_context_metrics,
+                                                  input_data, model_info, debug=debug)
+    
+    # Daily budget and billing block across all sessions
+    if "daily-budget" in fields or "block-remaining" in fields:
+        stages["usage_scan"] = lambda: profile_stage("usage_scan", calculate_usage_metrics, config)
+    return stages
+
+def get_field_stage(field):
+    """Get the name of the stage a field's data comes from, or None."""
+    field = split_window_field(field)[0]
+    if field in TRANSCRIPT_FIELDS:
+        return "transcript"
+    if field in ("daily-budget", "block-remaining"):
+        return "usage_scan"
+    if field in ("git", "context"):
+        return field
+    return None
+
+def run_stage_worker(box, stage, cache_path, name, debug=False, stderr=None):
+    """Run one stage in a worker thread and record its result.
+    
+    The result is stored in box["result"] and merged into the session's
+    stage cache, so later refreshes can fall back to it. In the daemon,
+    stderr is the buffer of the request that started the stage, and the
+    stage's diagnostics go there.
+    """
+    if stderr is not None:
+        DAEMON_STDERR.bind(stderr)
+    try:
+        result = stage()
+    except Exception as e:
+        if debug:
+            sys.stderr.write(f"DEBUG: Stage {name} failed: {e}\n")
+        return
+    box["result"] = result
+    if cache_path is None:
+        return
+    with STAGE_CACHE_LOCK:
+        cached = read_cache_file(cache_path) or {}
+        if cached.get(name) != result:
+            cached[name] = result
+            write_cache_file(cache_path, cached)
+
+def run_stages_with_deadline(stages, deadline_ms, session_key, use_cache=True, debug=False):
+    """Run stages concurrently, giving up on those that miss the deadline.
+    
+    Every stage gets its own thread. Stages still running when the deadline
+    passes are rendered from the last good result cached for this session
+    (stale-while-revalidate) and keep running in the background to refresh
+    that cache. A stage still refreshing from an earlier call is waited on
+    rather than started again.
+    
+    Args:
+        stages: Dict of stage name -> callable from get_render_stages()
+        deadline_ms: Milliseconds to wait for all stages together
+        session_key: Key of the per-session stage cache (transcript path and cwd)
+        use_cache: Whether to read and write the stage cache
+    
+    Returns:
+        (results, stale) - dict of stage name -> result, and the set of
+        stage names whose result came from the cache
+    """
+    global STAGE_CACHE_LOCK
+    import threading
+    import time
+    
+    if STAGE_CACHE_LOCK is None:
+        STAGE_CACHE_LOCK = threading.Lock()
+    
+    deadline = time.perf_counter() + deadline_ms / 1000
+    cache_path = get_cache_path("stages", session_key) if use_cache else None
+    stderr = DAEMON_STDERR.target() if DAEMON_STDERR is not None else None
+    
+    running = {}
+    for name, stage in stages.items():
+        key = (session_key, name)
+        if key in STAGE_THREADS and STAGE_THREADS[key][0].is_alive():
+            running[name] = STAGE_THREADS[key]
+            continue
+        box = {}
+        thread = threading.Thread(target=run_stage_worker, args=(box, stage, cache_path, name, debug, stderr),
+                                  name=f"pyccsl-{name}")
+        thread.start()
+        running[name] = STAGE_THREADS[key] = (thread, box)
+    
+    results = {}
+    missed = []
+    for name, (thread, box) in running.items():
+        thread.join(max(deadline - time.perf_counter(), 0))
+        if "result" in box:
+            results[name] = box["result"]
+        else:
+            missed.append(name)
+    
+    # Forget finished threads so long-lived processes don't accumulate them
+    for key in [key for key, (thread, _) in STAGE_THREADS.items() if not thread.is_alive()]:
+        del STAGE_THREADS[key]
+    
+    stale = set()
+    if missed:
+        cached = (read_cache_file(cache_path) or {}) if cache_path else {}
+        for name in missed:
             if debug:
-                sys.stderr.write(f"DEBUG: Badge created: {badge[:20]}...\n")
-        elif debug:
-            has_cache = "cache_hit_rate" in metrics
-            has_response = "avg_response_time" in metrics
-            sys.stderr.write(f"DEBUG: Badge not created - cache_hit_rate:{has_cache}, avg_response_time:{has_response}\n")
+                sys.stderr.write(f"DEBUG: Stage {name} missed the {deadline_ms:g}ms deadline\n")
+            if name in cached:
+                results[name] = cached[name]
+                stale.add(name)
+    return results, stale
+
+def has_pending_stages():
+    """Check whether any stage is still refreshing in the background."""
+    return any(thread.is_alive() for thread, _ in STAGE_THREADS.values())
+
+def release_output(debug=False):
+    """Point stdout (and stderr unless debugging) at /dev/null.
+    
+    Called once the status line has been printed while stages are still
+    refreshing, so the caller sees end-of-output without waiting for them;
+    the process exits when the background refresh completes. Does nothing
+    in the daemon, whose descriptors outlive every request.
+    """
+    if DAEMON_STDERR is not None:
+        return
+    sys.stdout.flush()
+    sys.stderr.flush()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, 1)
+        if not debug:
+            os.dup2(devnull, 2)
+    finally:
+        os.close(devnull)
+
+def render_status_line(config, input_data):
+    """Compute metrics and render the status line for one input document.
+    
+    Args:
+        config: Configuration dict from parse_arguments()
+        input_data: Parsed JSON input from Claude Code
+    
+    Returns:
+        Rendered status line (without trailing newline)
+    """
+    debug = config.get("debug", False)
+    
+    if debug:
+        sys.stderr.write(f"DEBUG: Input data keys: {list(input_data.keys())}\n")
+        sys.stderr.write(f"DEBUG: Model: {input_data.get('model', 'None')}\n")
+        sys.stderr.write(f"DEBUG: Transcript path: {input_data.get('transcript_path', 'None')}\n")
+        sys.stderr.write(f"DEBUG: CWD: {input_data.get('cwd', 'None')}\n")
+    
+    # Extract model info
+    model_info = extract_model_info(input_data)
+    
+    if debug:
+        sys.stderr.write(f"DEBUG: Model info: {model_info}\n")
+    
+    # Gather git status, transcript metrics and usage - concurrently under
+    # the deadline if one is set, otherwise one after the other
+    stages = get_render_stages(config, input_data, model_info)
+    stale = set()
+    if config.get("deadline_ms") and stages:
+        session_key = json.dumps([input_data.get("transcript_path"), input_data.get("cwd", os.getcwd())])
+        results, stale = run_stages_with_deadline(stages, config["deadline_ms"], session_key,
+                                                  use_cache=config["cache"], debug=debug)
+    else:
+        results = {name: stage() for name, stage in stages.items()}
+    
+    git_info = results.get("git") or {"branch": None, "modified_count": 0}
+    if debug:
+        sys.stderr.write(f"DEBUG: Git info: {git_info}\n")
+    
+    metrics = dict(results.get("transcript") or {})
+    
+    # Calculate performance badge
+    if "cache_hit_rate" in metrics and "avg_response_time" in metrics:
+        # Badge should be colored unless theme is "none"
+        colored = config["theme"] != "none"
+        is_powerline = config["style"] == "powerline"
+        # The chosen percentile if the session has one, otherwise the mean
+        response_time = metrics.get(f"response_{config.get('response_stat', 'mean')}", metrics["avg_response_time"])
+        badge = profile_stage(
+            "badge",
+            calculate_performance_badge,
+            metrics["cache_hit_rate"],
+            response_time,
+            config["cache_thresholds"],
+            config["response_thresholds"],
+            colored=colored,
+            powerline=is_powerline,
+            no_emoji=config["no_emoji"]
+        )
+        metrics["badge"] = badge
+        if debug:
+            sys.stderr.write(f"DEBUG: Badge created: {badge[:20]}...\n")
+    elif debug and metrics:
+        has_cache = "cache_hit_rate" in metrics
+        has_response = "avg_response_time" in metrics
+        sys.stderr.write(f"DEBUG: Badge not created - cache_hit_rate:{has_cache}, avg_response_time:{has_response}\n")
+    
+    # Current context window occupancy, daily budget and billing block
+    metrics.update(results.get("context") or {})
+    metrics.update(results.get("usage_scan") or {})
     
     # Add git info to metrics
     if git_info["branch"]:
         metrics["git_info"] = git_info
     
+    # Fields rendered from cached results are marked as stale
+    if stale:
+        metrics["stale_stages"] = stale
+    
     # Format and output (pass metrics for field display)
-    output = format_output(config, model_info, input_data, metrics)
+    output = profile_stage("format_output", format_output, config, model_info, input_data, metrics)
     # Only add reset if colors were used (to prevent terminal color bleed)
     if config["theme"] != "none":
-        print(output + RESET)
+        output += RESET
+    
+    # Structured output and the shared snapshot for other consumers
+    if config.get("format") == "json" or config.get("snapshot"):
+        document = build_status_document(input_data, model_info, metrics, output)
+        snapshot_path = get_snapshot_path(input_data.get("session_id") or input_data.get("transcript_path"))
+        if config.get("snapshot") and snapshot_path:
+            profile_stage("snapshot", publish_snapshot, snapshot_path, output, document, debug=debug)
+        if config.get("format") == "json":
+            return document
+    return output
+
+class ThreadStderr:
+    """sys.stderr for the daemon, writing to a stream chosen per thread.
+    
+    contextlib.redirect_stderr swaps sys.stderr for the whole process, so
+    stage threads still refreshing for one request would write into the
+    next request's output. Threads write to the stream bound to them, or to
+    the daemon's own stderr if none is.
+    """
+    
+    def __init__(self, default):
+        import threading
+        self.default = default
+        self.local = threading.local()
+    
+    def target(self):
+        """Get the stream the current thread writes to."""
+        return getattr(self.local, "stream", None) or self.default
+    
+    def bind(self, stream):
+        """Send the current thread's writes to a stream (None for the default)."""
+        self.local.stream = stream
+    
+    def write(self, text):
+        return self.target().write(text)
+    
+    def flush(self):
+        self.target().flush()
+
+def handle_daemon_request(request):
+    """Render a status line for a request forwarded by pyccsl_client.py.
+    
+    Diagnostics are collected per request: under serve_daemon the calling
+    thread and the stage threads it starts write to the request's buffer
+    (see ThreadStderr), so stages still refreshing in the background can't
+    write into a later request's output.
+    
+    Requests are served one at a time, so data stages run under
+    DAEMON_DEADLINE_MS unless the request sets its own deadline; a stage
+    that misses it keeps refreshing in the background (see
+    run_stages_with_deadline).
+    
+    The daemon's paths were fixed from its own environment when it started,
+    so a request whose "paths" differ (the client set PYCCSL_CACHE_DIR, say)
+    is not rendered here but handed back with "fallback" set, and the client
+    renders it in-process.
+    
+    Args:
+        request: Dict with "argv", "stdin", "env" (PYCCSL_* variables), "paths"
+            (DAEMON_PATH_VARIABLES) and "cwd"
+    
+    Returns:
+        Dict with "stdout", "stderr" and "code" for the client to replay
+    """
+    import io
+    import contextlib
+    
+    paths = request.get("paths")
+    if paths is not None and paths != {name: os.environ.get(name) for name in DAEMON_PATH_VARIABLES}:
+        return {"stdout": "", "stderr": "", "code": 0, "fallback": True}
+    
+    stdout = ""
+    stderr = io.StringIO()
+    code = 0
+    previous_cwd = os.getcwd()
+    if DAEMON_STDERR is not None:
+        DAEMON_STDERR.bind(stderr)
+        redirect = contextlib.nullcontext()
     else:
-        print(output)
+        redirect = contextlib.redirect_stderr(stderr)
+    try:
+        with redirect:
+            try:
+                if request.get("cwd"):
+                    os.chdir(request["cwd"])
+                argv = request.get("argv", [])
+                if argv[:1] == ["report"]:
+                    sys.stderr.write("Error: report is not handled by the daemon; run pyccsl.py report\n")
+                    sys.exit(1)
+                config = parse_arguments(argv, request.get("env", {}))
+                if config["daemon"] or config["watch"] or config["read_snapshot"] or config["batch"]:
+                    sys.stderr.write("Error: --daemon, --watch, --read-snapshot and --batch are not handled "
+                                     "by the daemon\n")
+                    sys.exit(1)
+                if not config["deadline_ms"]:
+                    config["deadline_ms"] = DAEMON_DEADLINE_MS
+                if config["debug"]:
+                    sys.stderr.write(f"DEBUG: Config: {config}\n")
+                if config["profile"]:
+                    start_profile()
+                input_data = profile_stage("read_input", parse_input, request.get("stdin", ""))
+                stdout = render_status_line(config, input_data) + "\n"
+                finish_profile(config, input_data)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except Exception as e:
+                sys.stderr.write(f"Error: {e}\n")
+                code = 4
+            finally:
+                # Never leave tracing on for the next request after a failure
+                if PROFILE_STAGES is not None:
+                    stop_profile()
+    finally:
+        if DAEMON_STDERR is not None:
+            DAEMON_STDERR.bind(None)
+        try:
+            os.chdir(previous_cwd)
+        except OSError:
+            pass
+    return {"stdout": stdout, "stderr": stderr.getvalue(), "code": code}
+
+def serve_daemon(socket_path=DAEMON_SOCKET, debug=False):
+    """Serve status line requests on a Unix socket until terminated.
+    
+    Pricing, themes and transcript checkpoints stay warm in this process, so
+    each refresh only pays for reading newly appended transcript lines. Each
+    connection carries one JSON request, terminated by the client shutting
+    down its write side, and receives one JSON response.
+    
+    Returns:
+        Exit code (1 if another daemon already owns the socket)
+    """
+    global DAEMON_STDERR
+    import socket
+    import signal
+    
+    if os.path.exists(socket_path):
+        # Refuse to steal the socket from a live daemon, otherwise clean up
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            print(f"Error: A pyccsl daemon is already listening on {socket_path}", file=sys.stderr)
+            return 1
+        except OSError:
+            os.unlink(socket_path)
+        finally:
+            probe.close()
+    
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Create the socket owner-only, rather than chmod it after other users
+    # could already have connected
+    previous_umask = os.umask(0o077)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(previous_umask)
+    server.listen(16)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    DAEMON_STDERR = sys.stderr = ThreadStderr(sys.stderr)
+    
+    if debug:
+        sys.stderr.write(f"DEBUG: Daemon listening on {socket_path}\n")
+    
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    conn.settimeout(5)
+                    chunks = []
+                    while True:
+                        chunk = conn.recv(65536)
+                        if not chunk:
+                            break
+                        chunks.append(chunk)
+                    request = json.loads(b"".join(chunks))
+                    response = handle_daemon_request(request)
+                    conn.sendall(json.dumps(response).encode("utf-8"))
+                except Exception as e:
+                    # A broken client must never take the daemon down
+                    if debug:
+                        sys.stderr.write(f"DEBUG: Daemon request failed: {e}\n")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stderr = DAEMON_STDERR.default
+        DAEMON_STDERR = None
+        server.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+    return 0
+
+def build_status_document(input_data, model_info, metrics, line):
+    """Build the --format json document for a rendered status line.
+    
+    Carries the raw metric values; the pre-rendered badge and cost text are
+    left out, and stale stages are listed under "stale_stages".
+    
+    Returns:
+        Compact JSON string
+    """
+    values = {key: value for key, value in metrics.items() if key not in SNAPSHOT_EXCLUDED_METRICS}
+    if "stale_stages" in values:
+        values["stale_stages"] = sorted(values["stale_stages"])
+    document = {
+        "session_id": input_data.get("session_id"),
+        "transcript_path": input_data.get("transcript_path"),
+        "model": model_info,
+        "metrics": values,
+        "line": line
+    }
+    return json.dumps(document, separators=(",", ":"))
+
+def get_snapshot_path(session):
+    """Get the snapshot file of a session.
+    
+    Args:
+        session: Session ID, or the session's transcript path
+    
+    Returns:
+        Path inside SNAPSHOT_DIR, or None without a session
+    """
+    name = os.path.splitext(os.path.basename(session or ""))[0]
+    if not name:
+        return None
+    return os.path.join(SNAPSHOT_DIR, name + ".snap")
+
+def publish_snapshot(path, line, document, debug=False):
+    """Publish a rendered line and its JSON document to a session snapshot.
+    
+    The snapshot is a fixed-size file updated in place through mmap, so a
+    consumer can keep it open (or mapped) and poll the generation counter.
+    The generation counter is odd while an update is in progress and even
+    once it is complete; a reader retries until it sees the same even
+    generation before and after copying the payload (see read_snapshot).
+    Writers serialize on flock. Snapshots carry the session's transcript
+    path, git branch and spend, so they are owner-only like the daemon
+    socket.
+    
+    Returns:
+        True if the snapshot was written
+    """
+    import fcntl
+    import mmap
+    import struct
+    import time
+    
+    line_bytes = line.encode("utf-8")
+    document_bytes = document.encode("utf-8")
+    header_size = struct.calcsize(SNAPSHOT_HEADER)
+    if header_size + len(line_bytes) + len(document_bytes) > SNAPSHOT_SIZE:
+        if debug:
+            sys.stderr.write(f"DEBUG: Snapshot for {path} exceeds {SNAPSHOT_SIZE} bytes, not written\n")
+        return False
+    
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError as e:
+        if debug:
+            sys.stderr.write(f"DEBUG: Failed to open snapshot {path}: {e}\n")
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        stat = os.fstat(fd)
+        if stat.st_mode & 0o077:
+            os.fchmod(fd, 0o600)  # Written by a version that created it readable by others
+        if stat.st_size < SNAPSHOT_SIZE:
+            os.ftruncate(fd, SNAPSHOT_SIZE)
+        with mmap.mmap(fd, SNAPSHOT_SIZE) as view:
+            magic, generation = struct.unpack_from("<8sQ", view)
+            if magic != SNAPSHOT_MAGIC:
+                generation = 0
+            # An odd generation is an update whose writer died; supersede it
+            generation += 2 - generation % 2
+            struct.pack_into("<8sQ", view, 0, SNAPSHOT_MAGIC, generation - 1)
+            payload_end = header_size + len(line_bytes)
+            view[header_size:payload_end] = line_bytes
+            view[payload_end:payload_end + len(document_bytes)] = document_bytes
+            struct.pack_into("<dII", view, 16, time.time(), len(line_bytes), len(document_bytes))
+            struct.pack_into("<Q", view, 8, generation)
+    finally:
+        os.close(fd)
+    return True
+
+def read_snapshot(path):
+    """Read a consistent copy of a session snapshot.
+    
+    The header, payload and generation are read with pread, which is cheaper
+    than mapping the file for a single read. Reads are lock-free unless a
+    writer is mid-update for longer than SNAPSHOT_READ_RETRIES attempts (a
+    preempted writer), in which case the reader waits for the writer's
+    flock and reads once more.
+    
+    Returns:
+        Dict with generation, updated (Unix time), line and document (the
+        JSON text, unparsed), or None if there is no complete snapshot
+    """
+    import fcntl
+    import struct
+    import time
+    
+    header_size = struct.calcsize(SNAPSHOT_HEADER)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        for attempt in range(SNAPSHOT_READ_RETRIES + 1):
+            if attempt == SNAPSHOT_READ_RETRIES:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            header = os.pread(fd, header_size, 0)
+            if len(header) < header_size:
+                return None
+            magic, generation, updated, line_size, document_size = struct.unpack(SNAPSHOT_HEADER, header)
+            if magic != SNAPSHOT_MAGIC or generation == 0:
+                return None
+            if generation % 2 == 0:
+                payload = os.pread(fd, line_size + document_size, header_size)
+                if struct.unpack("<Q", os.pread(fd, 8, 8))[0] == generation:
+                    return {
+                        "generation": generation,
+                        "updated": updated,
+                        "line": payload[:line_size].decode("utf-8"),
+                        "document": payload[line_size:].decode("utf-8")
+                    }
+            # A writer is mid-update; let it finish
+            time.sleep(SNAPSHOT_RETRY_SECONDS)
+    finally:
+        os.close(fd)
+    return None
+
+def open_inotify():
+    """Open a non-blocking inotify instance through libc, if the platform has one.
+    
+    Returns:
+        (fd, add_watch) where add_watch(path) starts watching a directory,
+        or None when inotify is unavailable (not Linux, no libc symbols,
+        out of instances)
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    
+    def add_watch(path):
+        # Any change to an entry of the directory, including atomic renames
+        mask = INOTIFY_MODIFY | INOTIFY_CLOSE_WRITE | INOTIFY_MOVED_TO | INOTIFY_CREATE | INOTIFY_DELETE
+        return libc.inotify_add_watch(fd, os.fsencode(path), mask) >= 0
+    
+    return fd, add_watch
+
+def get_watch_signature(input_data, config):
+    """Get the stat signature of every file a watched status line depends on.
+    
+    Covers the transcript, its sub-agent transcripts and the git index and
+    HEAD. Two equal signatures mean nothing was re-rendered for.
+    """
+    transcript_path = input_data.get("transcript_path")
+    paths = [transcript_path] if transcript_path else []
+    if transcript_path and config.get("subagents", True):
+        paths.extend(sorted(find_subagent_transcripts(transcript_path)))
+    try:
+        repo = find_git_repository(input_data.get("cwd", os.getcwd()))
+    except (ValueError, OSError, UnicodeDecodeError):
+        repo = None
+    if repo:
+        paths.append(os.path.join(repo["git_dir"], "index"))
+        paths.append(os.path.join(repo["git_dir"], "HEAD"))
+    
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append((path, None))
+    return signature
+
+def get_watch_directories(input_data):
+    """Get the directories to subscribe to for a watched status line."""
+    directories = []
+    transcript_path = input_data.get("transcript_path")
+    if transcript_path:
+        directory = os.path.dirname(os.path.abspath(transcript_path))
+        session_id = os.path.splitext(os.path.basename(transcript_path))[0]
+        directories.extend([directory, os.path.join(directory, session_id, "subagents")])
+    try:
+        repo = find_git_repository(input_data.get("cwd", os.getcwd()))
+    except (ValueError, OSError, UnicodeDecodeError):
+        repo = None
+    if repo:
+        directories.append(repo["git_dir"])
+    return [directory for directory in directories if os.path.isdir(directory)]
+
+def write_watch_output(line, output_path=None):
+    """Publish a rendered status line to stdout, or atomically to a file."""
+    if not output_path:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+        return
+    import tempfile
+    
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(line + "\n")
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def watch_status_line(config):
+    """Re-render the status line whenever the files it depends on change.
+    
+    The transcript's directory, its sub-agent directory and the git
+    directory are watched with inotify; without inotify their files are
+    stat-polled, every WATCH_POLL_SECONDS after a change and backing off
+    to WATCH_POLL_MAX_SECONDS while nothing changes. A wake-up only
+    re-renders if the stat signature of the transcript, sub-agent
+    transcripts, .git/index or HEAD changed, and a line is only written if
+    it differs from the last. Time-dependent fields (block-remaining,
+    windows) are refreshed every WATCH_REFRESH_SECONDS. Checkpoints and
+    git status stay warm in this process, so a re-render only parses the
+    appended transcript lines.
+    
+    Returns:
+        Exit code
+    """
+    import select
+    import signal
+    import time
+    
+    debug = config.get("debug", False)
+    input_data = {"transcript_path": os.path.abspath(config["watch"]), "cwd": config["cwd"] or os.getcwd()}
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    inotify = open_inotify()
+    watched = set()
+    if debug:
+        sys.stderr.write(f"DEBUG: Watching {input_data['transcript_path']} with "
+                         f"{'inotify' if inotify else 'stat polling'}\n")
+    
+    last_signature = None
+    last_line = None
+    last_render = 0.0
+    poll_interval = WATCH_POLL_SECONDS
+    try:
+        while True:
+            if inotify:
+                # Subscribe to directories that appeared since (git init, sub-agents)
+                for directory in get_watch_directories(input_data):
+                    if directory not in watched and inotify[1](directory):
+                        watched.add(directory)
+            
+            signature = get_watch_signature(input_data, config)
+            now = time.monotonic()
+            if signature != last_signature:
+                poll_interval = WATCH_POLL_SECONDS
+            else:
+                poll_interval = min(poll_interval * 2, WATCH_POLL_MAX_SECONDS)
+            if signature != last_signature or now - last_render >= WATCH_REFRESH_SECONDS:
+                last_signature = signature
+                last_render = now
+                document = dict(input_data, model=get_watch_model(input_data, config))
+                line = render_status_line(config, document)
+                if line != last_line:
+                    write_watch_output(line, config["output"])
+                    last_line = line
+            
+            if inotify:
+                timeout = max(WATCH_REFRESH_SECONDS - (time.monotonic() - last_render), 0)
+                readable, _, _ = select.select([inotify[0]], [], [], timeout)
+                if readable:
+                    # Let a burst of writes settle, then drain the queued events
+                    time.sleep(WATCH_DEBOUNCE_SECONDS)
+                    try:
+                        while os.read(inotify[0], 65536):
+                            pass
+                    except BlockingIOError:
+                        pass
+            else:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if inotify:
+            os.close(inotify[0])
+    return 0
+
+def get_watch_model(input_data, config):
+    """Get the model of a watched session from its transcript.
+    
+    There is no stdin document in watch mode, so the model is the last one
+    in the transcript, named like Claude Code does ("Sonnet 4") when known.
+    """
+    state = load_transcript_state(input_data.get("transcript_path"), use_cache=config["cache"])
+    model_id = state["last_model_id"] if state else None
+    if not model_id:
+        return {}
+    name = PRICING_DATA[model_id]["name"] if model_id in PRICING_DATA else model_id
+    if name.startswith("Claude "):
+        name = name[len("Claude "):]
+    return {"id": model_id, "display_name": name}
+
+def run_batch(config):
+    """Render one status line per newline-delimited input document on stdin.
+    
+    Every document is rendered in this process, so the warm transcript
+    checkpoints, git status, model pricing and render plans are shared
+    across the batch. Blank lines are skipped; a document that fails gets
+    an empty output line and an error on stderr, so output lines still
+    correspond to input documents.
+    
+    Returns:
+        Exit code (2 if any document was invalid, 4 if any failed to render)
+    """
+    debug = config.get("debug", False)
+    code = 0
+    for number, text in enumerate(sys.stdin, 1):
+        if not text.strip():
+            continue
+        try:
+            input_data = json.loads(text)
+            if not isinstance(input_data, dict):
+                raise ValueError("expected an object")
+        except ValueError as e:
+            sys.stderr.write(f"Error: Invalid JSON input on line {number}: {e}\n")
+            sys.stdout.write("\n")
+            code = max(code, 2)
+            continue
+        
+        try:
+            line = render_status_line(config, input_data)
+        except Exception as e:
+            if debug:
+                import traceback
+                traceback.print_exc()
+            sys.stderr.write(f"Error: Failed to render line {number}: {e}\n")
+            line = ""
+            code = 4
+        sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+    return code
+
+def print_snapshot(config):
+    """Print the snapshot of the session named by --read-snapshot.
+    
+    Returns:
+        Exit code (3 if the session has no snapshot)
+    """
+    path = get_snapshot_path(config["read_snapshot"])
+    snapshot = read_snapshot(path) if path else None
+    if snapshot is None:
+        print(f"Error: No snapshot for session {config['read_snapshot']}", file=sys.stderr)
+        return 3
+    if config["debug"]:
+        sys.stderr.write(f"DEBUG: Snapshot {path} generation {snapshot['generation']} "
+                         f"updated at {snapshot['updated']:.3f}\n")
+    print(snapshot["document"] if config["format"] == "json" else snapshot["line"])
+    return 0
+
+def main():
+    """Main entry point."""
+    if sys.argv[1:2] == ["report"]:
+        return run_report(sys.argv[2:])
+    
+    # Start profiling before parsing so that argument parsing is covered too
+    if "--profile" in sys.argv or any(arg.startswith("--profile-log") for arg in sys.argv):
+        start_profile()
+    
+    # Parse arguments
+    config = profile_stage("parse_arguments", parse_arguments)
+    debug = config.get("debug", False)
+    
+    if debug:
+        sys.stderr.write(f"DEBUG: Config: {config}\n")
+    
+    if config["daemon"]:
+        finish_profile(config)
+        return serve_daemon(debug=debug)
+    
+    if config["read_snapshot"]:
+        return print_snapshot(config)
+    
+    if config["watch"]:
+        finish_profile(config)
+        return watch_status_line(config)
+    
+    if config["batch"]:
+        code = run_batch(config)
+        finish_profile(config)
+        if has_pending_stages():
+            release_output(debug=debug)
+        return code
+    
+    # PYCCSL_PROFILE_LOG from the environment or an env file
+    if config["profile"] and PROFILE_STAGES is None:
+        start_profile()
+    
+    # Read input
+    input_data = profile_stage("read_input", read_input)
+    
+    print(render_status_line(config, input_data))
+    finish_profile(config, input_data)
     
+    # Stages that missed the deadline finish refreshing their cache after
+    # the caller has its output
+    if has_pending_stages():
+        release_output(debug=debug)
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+pyccsl_bench - Performance checks for pyccsl
+
+Commands:
+    startup   Check the import-time budget of a status line refresh using
+              `python -X importtime`. Fails if the modules pyccsl imports
+              beyond bare interpreter startup take longer than the budget, or
+              if a field set pulls in modules it should not need.
+    generate  Write a synthetic Claude Code transcript (JSONL) with user
+              prompts, assistant replies, tool results, Task sub-agent
+              results with usage, sidechains and mixed models.
+    run       Time each stage of a refresh (read_input, git, transcript
+              loading, metric calculators, format_output) plus end-to-end
+              wall time, peak RSS and the peak memory of the dict-based and
+              columnar transcript loaders over generated transcripts, and
+              emit one JSON record per transcript size.
+
+Examples:
+    pyccsl_bench.py generate --lines 100000 -o /tmp/transcript.jsonl
+    pyccsl_bench.py run --lines 1000,10000,100000 --output bench.jsonl
+
+Exit Codes:
+    0 - Success / within budget
+    1 - Budget exceeded or unexpected imports
+"""
+
+import sys
+import os
+import json
+import time
+import subprocess
+import argparse
+import random
+import tempfile
+
+PYCCSL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pyccsl.py")
+
+# Import-time budgets (milliseconds, as reported by -X importtime) for the
+# modules pyccsl imports on top of bare interpreter startup, per field set
+STARTUP_BUDGETS_MS = {
+    "model,folder": 15.0,
+    "badge,folder,git,model,tokens,cost": 22.0,
+}
+
+# Modules that must not be imported when rendering only these fields
+STARTUP_FORBIDDEN = {
+    "model,folder": ["argparse", "subprocess", "datetime", "hashlib", "tempfile", "socket"],
+}
+
+# Models mixed into generated transcripts, with relative weights
+GENERATOR_MODELS = [
+    ("claude-sonnet-4-20250514", 6),
+    ("claude-opus-4-1-20250805", 3),
+    ("claude-3-5-haiku-20241022", 1)
+]
+
+# Default transcript sizes (lines) for the run command
+DEFAULT_RUN_LINES = [1000, 10000, 100000]
+
+SAMPLE_INPUT = {
+    "model": {"id": "claude-sonnet-4-20250514", "display_name": "Sonnet 4"},
+    "cwd": os.getcwd(),
+    "transcript_path": None
+}
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into {module: self_microseconds}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Header line
+        modules[parts[2].strip()] = int(parts[0])
+    return modules
+
+def run_importtime(args, stdin_text=""):
+    """Run the interpreter with -X importtime and return the parsed timings."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + args,
+        input=stdin_text,
+        capture_output=True,
+        text=True
+    )
+    return parse_importtime(result.stderr)
+
+def check_startup(fields, runs, budget_ms=None):
+    """Measure pyccsl's own import time for a field set and compare to the budget.
+
+    Returns:
+        Tuple of (report dict, ok)
+    """
+    if budget_ms is None:
+        budget_ms = STARTUP_BUDGETS_MS.get(fields, max(STARTUP_BUDGETS_MS.values()))
+    baseline = set(run_importtime(["-c", "pass"]))
+    stdin_text = json.dumps(SAMPLE_INPUT)
+
+    samples = []
+    imported = set()
+    for _ in range(runs):
+        modules = run_importtime([PYCCSL, "--theme", "none", fields], stdin_text)
+        own = {name: us for name, us in modules.items() if name not in baseline}
+        samples.append(sum(own.values()) / 1000)
+        imported.update(own)
+
+    forbidden = sorted(set(STARTUP_FORBIDDEN.get(fields, [])) & imported)
+    best_ms = min(samples)
+    report = {
+        "fields": fields,
+        "import_ms": round(best_ms, 3),
+        "budget_ms": budget_ms,
+        "modules": len(imported),
+        "forbidden_imports": forbidden
+    }
+    return report, best_ms <= budget_ms and not forbidden
+
+def generate_transcript(out, lines, seed=1, max_payload=4000):
+    """Write a synthetic Claude Code transcript.
+
+    Turns follow the real layout: a user prompt, one or more assistant
+    entries chained by parentUuid, tool results (some from Task sub-agents
+    carrying their own usage) and occasional sidechain exchanges, with a
+    summary line at the top and timestamps in file order.
+
+    Args:
+        out: Binary file object to write JSONL to
+        lines: Number of entries to write (at least)
+        seed: Random seed, so runs are reproducible
+        max_payload: Upper bound for the size of tool output/file contents
+
+    Returns:
+        Number of lines written
+    """
+    rng = random.Random(seed)
+    models = [model for model, weight in GENERATOR_MODELS for _ in range(weight)]
+    session_id = make_uuid(rng)
+    clock = [1755079200.0]  # 2025-08-13T10:00:00Z
+    base = {
+        "isSidechain": False,
+        "userType": "external",
+        "cwd": "/home/user/project",
+        "sessionId": session_id,
+        "version": "1.0.77",
+        "gitBranch": "main"
+    }
+
+    def timestamp(min_step, max_step):
+        clock[0] += rng.uniform(min_step, max_step)
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(clock[0])) + \
+            f".{int(clock[0] * 1000) % 1000:03d}Z"
+
+    def usage():
+        return {
+            "input_tokens": rng.randint(1, 50),
+            "cache_creation_input_tokens": rng.randint(0, 5000),
+            "cache_read_input_tokens": rng.randint(0, 80000),
+            "output_tokens": rng.randint(1, 2000),
+            "service_tier": "standard"
+        }
+
+    def write(entry):
+        out.write(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    write({"type": "summary", "summary": "Synthetic benchmark session", "leafUuid": make_uuid(rng)})
+    written = 1
+    parent = None
+    while written < lines:
+        # User prompt
+        user_uuid = make_uuid(rng)
+        write(dict(base, parentUuid=parent, type="user", uuid=user_uuid, timestamp=timestamp(5, 120),
+                   message={"role": "user", "content": "Please " + "change the code " * rng.randint(1, 30)}))
+        written += 1
+        parent = user_uuid
+        model = rng.choice(models)
+        sidechain = rng.random() < 0.05
+
+        for _ in range(rng.randint(1, 4)):
+            # Assistant reply (thinking/text/tool_use blocks are separate entries)
+            assistant_uuid = make_uuid(rng)
+            write(dict(base, parentUuid=parent, type="assistant", uuid=assistant_uuid,
+                       timestamp=timestamp(0.5, 40), requestId="req_" + assistant_uuid[:24],
+                       message={"id": "msg_" + assistant_uuid[:24], "type": "message", "role": "assistant",
+                                "model": model, "content": [{"type": "text", "text": "Done."}],
+                                "stop_reason": None, "usage": usage()}))
+            written += 1
+            parent = assistant_uuid
+
+            if sidechain:
+                # Sub-agent exchange recorded inline as sidechain entries
+                side_user = make_uuid(rng)
+                write(dict(base, isSidechain=True, parentUuid=None, type="user", uuid=side_user,
+                           timestamp=timestamp(0.1, 2), message={"role": "user", "content": "Investigate"}))
+                write(dict(base, isSidechain=True, parentUuid=side_user, type="assistant", uuid=make_uuid(rng),
+                           timestamp=timestamp(1, 20),
+                           message={"role": "assistant", "model": "claude-3-5-haiku-20241022",
+                                    "content": [{"type": "text", "text": "Found it."}], "usage": usage()}))
+                written += 2
+
+            if rng.random() < 0.6:
+                # Tool result - usually plain output, sometimes a Task result with usage
+                payload = "x" * rng.randint(10, max_payload)
+                if rng.random() < 0.1:
+                    tool_result = {"content": [{"type": "text", "text": payload[:200]}],
+                                   "totalDurationMs": rng.randint(1000, 60000), "usage": usage()}
+                else:
+                    tool_result = {"stdout": payload, "stderr": "", "interrupted": False}
+                result_uuid = make_uuid(rng)
+                write(dict(base, parentUuid=assistant_uuid, type="user", uuid=result_uuid,
+                           timestamp=timestamp(0.1, 5), toolUseResult=tool_result,
+                           message={"role": "user", "content": [{"type": "tool_result", "tool_use_id": "toolu_1",
+                                                                 "content": payload}]}))
+                written += 1
+                parent = result_uuid
+    return written
+
+def make_uuid(rng):
+    """Make a reproducible UUID4-formatted string from a random generator."""
+    value = f"{rng.getrandbits(128):032x}"
+    return f"{value[:8]}-{value[8:12]}-4{value[13:16]}-a{value[17:20]}-{value[20:]}"
+
+def load_pyccsl():
+    """Import pyccsl.py from this directory as a module."""
+    sys.path.insert(0, os.path.dirname(PYCCSL))
+    import pyccsl
+    return pyccsl
+
+def time_stage(timings, name, func, repeat):
+    """Run func `repeat` times and record the fastest wall time in seconds."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    timings[name] = round(best, 6)
+    return result
+
+def measure_memory(memory, name, func):
+    """Run func once and record the peak bytes it allocated (tracemalloc)."""
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        func()
+    finally:
+        memory[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+def run_process(args, stdin_text):
+    """Run a child process and return (wall seconds, peak RSS in KB)."""
+    start = time.perf_counter()
+    process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    process.stdin.write(stdin_text.encode("utf-8"))
+    process.stdin.close()
+    # wait4 reports the resource usage of this child alone
+    _, _, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = 0
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return elapsed, peak_rss_kb
+
+def benchmark_transcript(pyccsl, transcript_path, cwd, repeat, fields):
+    """Time every stage of a refresh against one transcript.
+
+    Returns:
+        Dict of stage name -> fastest wall time in seconds, plus end-to-end
+        process measurements
+    """
+    import io
+
+    input_data = dict(SAMPLE_INPUT, cwd=cwd, transcript_path=transcript_path)
+    input_text = json.dumps(input_data)
+    config = pyccsl.parse_arguments(["--theme", "tokyo", "--style", "powerline", fields], {})
+    timings = {}
+
+    def read_input():
+        sys.stdin = io.StringIO(input_text)
+        try:
+            return pyccsl.read_input()
+        finally:
+            sys.stdin = sys.__stdin__
+
+    time_stage(timings, "read_input", read_input, repeat)
+    time_stage(timings, "extract_git_status", lambda: pyccsl.extract_git_status(input_data, use_cache=False), repeat)
+    pyccsl.extract_git_status(input_data)  # Prime the cache
+    time_stage(timings, "extract_git_status_cached", lambda: pyccsl.extract_git_status(input_data), repeat)
+
+    # Memory is traced in separate runs so tracing does not skew the timings
+    memory = {}
+    measure_memory(memory, "load_transcript_columns", lambda: pyccsl.load_transcript_columns(transcript_path))
+    columns = time_stage(timings, "load_transcript_columns", lambda: pyccsl.load_transcript_columns(transcript_path), 1)
+    time_stage(timings, "calculate_token_usage", lambda: pyccsl.calculate_token_usage(columns), repeat)
+    time_stage(timings, "get_model_from_transcript", lambda: pyccsl.get_model_from_transcript(columns), repeat)
+    time_stage(timings, "calculate_total_cost", lambda: pyccsl.calculate_total_cost(columns), repeat)
+    token_totals = pyccsl.calculate_token_usage(columns)
+    time_stage(timings, "calculate_performance_metrics",
+               lambda: pyccsl.calculate_performance_metrics(columns, token_totals), repeat)
+    del columns
+
+    time_stage(timings, "load_transcript_state", lambda: pyccsl.load_transcript_state(transcript_path, use_cache=False), 1)
+    pyccsl.TRANSCRIPT_STATES.clear()
+    pyccsl.load_transcript_state(transcript_path)
+    time_stage(timings, "load_transcript_state_resumed", lambda: pyccsl.load_transcript_state(transcript_path), repeat)
+    time_stage(timings, "read_context_usage", lambda: pyccsl.read_context_usage(transcript_path), repeat)
+
+    time_stage(timings, "render_status_line", lambda: pyccsl.render_status_line(config, dict(input_data)), repeat)
+    state = pyccsl.load_transcript_state(transcript_path)
+    metrics = dict(state["tokens"])
+    metrics["cost_formatted"] = pyccsl.format_cost(state["total_cost"])
+    metrics.update(pyccsl.calculate_state_performance_metrics(state, state["tokens"]))
+    model_info = pyccsl.extract_model_info(input_data)
+    time_stage(timings, "format_output", lambda: pyccsl.format_output(config, model_info, input_data, metrics), repeat)
+
+    # End to end, as Claude Code runs it: a fresh process per refresh
+    args = [sys.executable, PYCCSL, "--theme", "tokyo", "--style", "powerline", fields]
+    cold_s, cold_rss = run_process(args + ["--no-cache"], input_text)
+    warm = [run_process(args, input_text) for _ in range(repeat)]
+    return {
+        "stages": timings,
+        "peak_alloc_bytes": memory,
+        "e2e_cold_s": round(cold_s, 6),
+        "e2e_cold_peak_rss_kb": cold_rss,
+        "e2e_warm_s": round(min(w[0] for w in warm), 6),
+        "e2e_warm_peak_rss_kb": max(w[1] for w in warm)
+    }
+
+def run_benchmarks(line_counts, repeat, fields, cwd, max_payload, work_dir):
+    """Generate transcripts of each size and benchmark them.
+
+    Yields:
+        One machine-readable result record per transcript size
+    """
+    pyccsl = load_pyccsl()
+    pyccsl.CACHE_DIR = os.path.join(work_dir, "cache")
+    for lines in line_counts:
+        transcript_path = os.path.join(work_dir, f"transcript-{lines}.jsonl")
+        if not os.path.exists(transcript_path):
+            with open(transcript_path, 'wb') as f:
+                generate_transcript(f, lines, max_payload=max_payload)
+        pyccsl.TRANSCRIPT_STATES.clear()
+        pyccsl.GIT_STATUS_CACHE.clear()
+        result = benchmark_transcript(pyccsl, transcript_path, cwd, repeat, fields)
+        yield dict({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "pyccsl_version": pyccsl.__version__,
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "lines": lines,
+            "bytes": os.path.getsize(transcript_path),
+            "fields": fields,
+            "repeat": repeat
+        }, **result)
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="pyccsl performance checks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    startup = subparsers.add_parser("startup", help="Check the import-time budget")
+    startup.add_argument("--fields", action="append",
+                         help="Fields to render; repeatable (default: every field set in STARTUP_BUDGETS_MS)")
+    startup.add_argument("--runs", type=int, default=5,
+                         help="Number of runs; the fastest is compared (default: 5)")
+    startup.add_argument("--budget-ms", type=float,
+                         help="Import-time budget in ms (default: from STARTUP_BUDGETS_MS)")
+
+    generate = subparsers.add_parser("generate", help="Write a synthetic transcript")
+    generate.add_argument("--lines", type=int, default=10000,
+                          help="Number of transcript lines (default: 10000)")
+    generate.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    generate.add_argument("--max-payload", type=int, default=4000,
+                          help="Maximum tool output size in bytes (default: 4000)")
+    generate.add_argument("-o", "--output", required=True, help="Transcript path to write")
+
+    run = subparsers.add_parser("run", help="Benchmark each stage over generated transcripts")
+    run.add_argument("--lines", default=",".join(str(n) for n in DEFAULT_RUN_LINES),
+                     help="Comma-separated transcript sizes in lines (default: 1000,10000,100000)")
+    run.add_argument("--repeat", type=int, default=3,
+                     help="Repetitions per stage; the fastest is reported (default: 3)")
+    run.add_argument("--fields", default="badge,folder,git,model,perf-all-metrics,input,output,tokens,cost",
+                     help="Fields rendered by the end-to-end and render stages")
+    run.add_argument("--cwd", default=os.getcwd(), help="Directory used for git stages (default: current)")
+    run.add_argument("--max-payload", type=int, default=4000,
+                     help="Maximum tool output size in bytes (default: 4000)")
+    run.add_argument("--work-dir", help="Directory for generated transcripts (default: temporary)")
+    run.add_argument("--output", help="Append JSON records to this file instead of stdout")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        with open(args.output, 'wb') as f:
+            written = generate_transcript(f, args.lines, seed=args.seed, max_payload=args.max_payload)
+        print(json.dumps({"path": args.output, "lines": written, "bytes": os.path.getsize(args.output)}))
+        return 0
+
+    if args.command == "run":
+        line_counts = [int(n) for n in args.lines.split(",") if n.strip()]
+        with tempfile.TemporaryDirectory(prefix="pyccsl-bench-") as tmp_dir:
+            work_dir = args.work_dir or tmp_dir
+            os.makedirs(work_dir, exist_ok=True)
+            out = open(args.output, 'a') if args.output else sys.stdout
+            try:
+                for record in run_benchmarks(line_counts, args.repeat, args.fields, args.cwd,
+                                             args.max_payload, work_dir):
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+            finally:
+                if args.output:
+                    out.close()
+        return 0
+
+    if args.command == "startup":
+        all_ok = True
+        for fields in args.fields or list(STARTUP_BUDGETS_MS):
+            report, ok = check_startup(fields, args.runs, args.budget_ms)
+            print(json.dumps(report))
+            all_ok = all_ok and ok
+        return 0 if all_ok else 1
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
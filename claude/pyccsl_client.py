@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+pyccsl_client - Thin client for a resident pyccsl daemon
+
+Forwards stdin and command-line arguments to `pyccsl.py --daemon` over a Unix
+socket and prints the rendered status line. Only the standard library modules
+needed to talk to the socket are imported, so a refresh costs little more
+than interpreter startup. When no daemon is listening, the request is handled
+in-process by pyccsl.py from the same directory, with identical output. So is
+a request made with a different HOME, PYCCSL_CACHE_DIR, PYCCSL_PROJECTS_DIR,
+PYCCSL_SNAPSHOT_DIR or PYCCSL_USAGE_DB than the daemon was started with.
+
+Usage:
+    python3 ~/.claude/pyccsl.py --daemon &          # start the daemon once
+    python3 ~/.claude/pyccsl_client.py --env ~/.claude/pyccsl.env
+"""
+
+import sys
+import os
+import socket
+
+CACHE_DIR = os.path.expanduser(os.environ.get("PYCCSL_CACHE_DIR", "~/.cache/pyccsl"))
+DAEMON_SOCKET = os.path.expanduser(os.environ.get("PYCCSL_SOCKET", os.path.join(CACHE_DIR, "pyccsl.sock")))
+
+# Seconds to wait for the daemon before falling back to in-process rendering
+CLIENT_TIMEOUT = 5
+
+# The daemon renders exactly one status line per request; subcommands and
+# options that do anything else run in this process instead
+LOCAL_COMMANDS = ["report"]
+LOCAL_OPTIONS = ["--daemon", "--watch", "--read-snapshot", "--batch", "-h", "--help"]
+
+# Variables pyccsl.py derives its cache, projects, snapshot and usage paths
+# from; the daemon only renders for clients that agree with it on all of them
+# (keep in sync with DAEMON_PATH_VARIABLES in pyccsl.py)
+PATH_VARIABLES = ["HOME", "CLAUDE_CONFIG_DIR", "XDG_RUNTIME_DIR", "PYCCSL_CACHE_DIR",
+                  "PYCCSL_PROJECTS_DIR", "PYCCSL_SNAPSHOT_DIR", "PYCCSL_USAGE_DB"]
+
+def is_render_request(argv):
+    """Check whether argv asks for a single rendered status line."""
+    if argv[:1] and argv[0] in LOCAL_COMMANDS:
+        return False
+    return not any(arg.partition("=")[0] in LOCAL_OPTIONS for arg in argv)
+
+def request_daemon(argv, stdin_text):
+    """Send a request to the daemon.
+
+    Returns:
+        Response dict with stdout, stderr and code, or None if the daemon is
+        not reachable or handed the request back (its paths differ)
+    """
+    import json
+
+    request = {
+        "argv": argv,
+        "stdin": stdin_text,
+        "env": {k: v for k, v in os.environ.items() if k.startswith("PYCCSL_")},
+        "paths": {name: os.environ.get(name) for name in PATH_VARIABLES},
+        "cwd": os.getcwd()
+    }
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CLIENT_TIMEOUT)
+        sock.connect(DAEMON_SOCKET)
+        sock.sendall(json.dumps(request).encode("utf-8"))
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        response = json.loads(b"".join(chunks))
+        return None if response.get("fallback") else response
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+
+def run_in_process(argv, stdin_text=None):
+    """Run pyccsl.py in this process.
+
+    Args:
+        argv: Command-line arguments for pyccsl.py
+        stdin_text: Input already read from stdin, or None to leave stdin alone
+    """
+    import io
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import pyccsl
+
+    sys.argv = [pyccsl.__file__] + argv
+    if stdin_text is not None:
+        sys.stdin = io.StringIO(stdin_text)
+    return pyccsl.main()
+
+def main():
+    """Main entry point."""
+    argv = sys.argv[1:]
+
+    # Only render requests go to the daemon; everything else keeps its own stdin
+    # (as does a render without piped input, which gets pyccsl.py's usage error)
+    if not is_render_request(argv) or sys.stdin.isatty():
+        return run_in_process(argv)
+
+    stdin_text = sys.stdin.read()
+    response = request_daemon(argv, stdin_text)
+    if response is not None:
+        sys.stderr.write(response.get("stderr", ""))
+        sys.stdout.write(response.get("stdout", ""))
+        return response.get("code", 0)
+
+    return run_in_process(argv, stdin_text)
+
+if __name__ == "__main__":
+    sys.exit(main())
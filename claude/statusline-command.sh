@@ -1,13 +1,17 @@
 #!/bin/bash
 
 # Claude Code Status Line Script
-# Displays: Live Date | Git Branch | Current Model | Session Cost | Daily Usage % | Session Remaining Time
+# Displays: Live Date | Git Branch | Current Model | Block Cost | Daily Usage % | Block Remaining Time
 
 # Configuration
 # Set your monthly budget in USD (adjust based on your Claude Code subscription plan)
 # Common plans: $100, $200, $500, etc.
 MONTHLY_BUDGET_USD=100
 
+# pyccsl.py next to this script (resolved before changing to the session's directory)
+SCRIPT_DIR=$(cd "$(dirname "$0")" 2>/dev/null && pwd)
+PYCCSL="${SCRIPT_DIR:-.}/pyccsl.py"
+
 # Color definitions (256-color palette for smooth appearance)
 COLOR_RESET="\033[0m"
 COLOR_DATETIME="\033[38;5;250m"  # Light gray
@@ -60,119 +64,86 @@ fi
 datetime_raw=$(date '+%Y-%m-%d %H:%M:%S')
 datetime="${COLOR_DATETIME}${datetime_raw}${COLOR_RESET}"
 
-# Get Claude Code session information
+# Get the active 5-hour billing block and today's cost vs. daily budget
 session_cost_raw="no session"
 remaining_time_raw="no block"
 time_color="$COLOR_MUTED"
 daily_usage_raw="N/A"
 usage_color="$COLOR_MUTED"
 
-if command -v ccstat >/dev/null 2>&1; then
-    # Try to get active block from ccstat
-    block_data=$(ccstat blocks --active --json --quiet 2>/dev/null)
-    
-    if [ -n "$block_data" ]; then
-        # Extract session cost
-        cost_value=$(echo "$block_data" | jq -r '.blocks[0].total_cost // null' 2>/dev/null)
-        if [ "$cost_value" != "null" ] && [ -n "$cost_value" ]; then
-            session_cost_raw=$(printf "$%.2f" "$cost_value")
-        fi
-        
-        # Extract the actual end time from ccstat JSON output
-        # Claude Code provides the exact end time for each block
-        end_time_iso=$(echo "$block_data" | jq -r '.blocks[0].end_time // null' 2>/dev/null)
-        
-        if [ "$end_time_iso" != "null" ] && [ -n "$end_time_iso" ]; then
-            # Get current epoch time
-            current_epoch=$(date "+%s")
-            
-            # Convert ISO 8601 end time to epoch - try macOS date first, then GNU date
-            # The ISO format from ccstat includes timezone, e.g., "2025-08-11T18:00:00+00:00"
-            end_epoch=$(date -j -u -f "%Y-%m-%dT%H:%M:%S" "${end_time_iso%+*}" "+%s" 2>/dev/null || date -u -d "${end_time_iso}" "+%s" 2>/dev/null)
-            
-            if [ -n "$end_epoch" ] && [ -n "$current_epoch" ]; then
-                remaining_seconds=$((end_epoch - current_epoch))
-                if [ "$remaining_seconds" -gt 0 ]; then
-                    remaining_minutes=$((remaining_seconds / 60))
-                    
-                    if [ "$remaining_minutes" -lt 60 ]; then
-                        remaining_time_raw="${remaining_minutes}m left"
-                        time_color="$COLOR_TIME_WARNING"
-                    else
-                        hours=$((remaining_minutes / 60))
-                        minutes=$((remaining_minutes % 60))
-                        remaining_time_raw="${hours}h ${minutes}m left"
-                        time_color="$COLOR_TIME_NORMAL"
-                    fi
-                else
-                    remaining_time_raw="expired"
-                    time_color="$COLOR_TIME_ERROR"
-                fi
+# pyccsl scans all session transcripts itself (caching results for
+# unchanged files) and prints the raw values as JSON
+usage_data=$(echo "$input" | PYCCSL_MONTHLY_BUDGET="$MONTHLY_BUDGET_USD" \
+    python3 "$PYCCSL" --format json daily-budget,block-remaining 2>/dev/null)
+
+if [ -n "$usage_data" ]; then
+    # Extract the active block's cost
+    cost_value=$(echo "$usage_data" | jq -r '.metrics.block_cost // null' 2>/dev/null)
+    if [ "$cost_value" != "null" ] && [ -n "$cost_value" ]; then
+        session_cost_raw=$(printf "$%.2f" "$cost_value")
+    fi
+
+    # Block end time as epoch seconds
+    end_epoch=$(echo "$usage_data" | jq -r '.metrics.block_end // null | if . == null then . else floor end' 2>/dev/null)
+
+    if [ "$end_epoch" != "null" ] && [ -n "$end_epoch" ]; then
+        current_epoch=$(date "+%s")
+        remaining_seconds=$((end_epoch - current_epoch))
+        if [ "$remaining_seconds" -gt 0 ]; then
+            remaining_minutes=$((remaining_seconds / 60))
+
+            if [ "$remaining_minutes" -lt 60 ]; then
+                remaining_time_raw="${remaining_minutes}m left"
+                time_color="$COLOR_TIME_WARNING"
             else
-                remaining_time_raw="time error"
-                time_color="$COLOR_TIME_ERROR"
+                hours=$((remaining_minutes / 60))
+                minutes=$((remaining_minutes % 60))
+                remaining_time_raw="${hours}h ${minutes}m left"
+                time_color="$COLOR_TIME_NORMAL"
             fi
+        else
+            remaining_time_raw="expired"
+            time_color="$COLOR_TIME_ERROR"
         fi
-        
-        # Calculate daily usage percentage
-        # This shows how much of your daily budget you've used today
-        # Formula: (today's total cost / daily budget) * 100
-        # Where daily budget = $MONTHLY_BUDGET_USD / days_in_current_month
-        
-        # Get today's cost from ccstat daily
-        today_cost=$(ccstat daily --json --quiet 2>/dev/null | jq -r '.daily[-1].total_cost // 0' 2>/dev/null)
-        
-        if [ -n "$today_cost" ] && [ "$today_cost" != "0" ]; then
-            # Calculate days in current month using cal command
-            days_in_month=$(cal $(date '+%m %Y') 2>/dev/null | awk 'NF {DAYS=$NF} END {print DAYS}')
-            
-            if [ -n "$days_in_month" ] && [ "$days_in_month" -gt 0 ]; then
-                # Calculate daily budget
-                # Formula: $MONTHLY_BUDGET_USD / days_in_month
-                # Example: With $200 budget and 31 days in August, daily budget = $200/31 = $6.45
-                daily_budget=$(echo "scale=2; $MONTHLY_BUDGET_USD / $days_in_month" | bc 2>/dev/null)
-                
-                if [ -n "$daily_budget" ]; then
-                    # Calculate usage percentage
-                    # Formula: (today_cost / daily_budget) * 100
-                    # Example: If today_cost=$10 and daily_budget=$6.45, then usage=155%
-                    usage_percent=$(echo "scale=1; ($today_cost / $daily_budget) * 100" | bc 2>/dev/null)
-                    
-                    if [ -n "$usage_percent" ]; then
-                        daily_usage_raw="${usage_percent}%"
-                        
-                        # Apply color based on percentage thresholds
-                        # Remove decimal part for comparison
-                        percent_int=${usage_percent%.*}
-                        
-                        if [ "$percent_int" -lt 80 ]; then
-                            # Under 80%: Good - well within daily budget
-                            usage_color="$COLOR_PERCENT_GOOD"
-                        elif [ "$percent_int" -lt 120 ]; then
-                            # 80-120%: Warning - approaching or slightly over budget
-                            usage_color="$COLOR_PERCENT_WARN"
-                        elif [ "$percent_int" -lt 150 ]; then
-                            # 120-150%: Over - significantly exceeding budget
-                            usage_color="$COLOR_PERCENT_OVER"
-                        else
-                            # Over 150%: Critical - far exceeding budget
-                            usage_color="$COLOR_PERCENT_HIGH"
-                        fi
-                    fi
-                fi
-            fi
+    fi
+
+    # Daily usage percentage: today's cost across all sessions as a share of
+    # the daily budget ($MONTHLY_BUDGET_USD / days in the current month)
+    today_cost=$(echo "$usage_data" | jq -r '.metrics.today_cost // 0' 2>/dev/null)
+    usage_percent=$(echo "$usage_data" | jq -r '.metrics.daily_budget_percent // null' 2>/dev/null)
+
+    if [ -n "$today_cost" ] && [ "$today_cost" != "0" ] && [ "$usage_percent" != "null" ] && [ -n "$usage_percent" ]; then
+        usage_percent=$(printf "%.1f" "$usage_percent")
+        daily_usage_raw="${usage_percent}%"
+
+        # Apply color based on percentage thresholds
+        # Remove decimal part for comparison
+        percent_int=${usage_percent%.*}
+
+        if [ "$percent_int" -lt 80 ]; then
+            # Under 80%: Good - well within daily budget
+            usage_color="$COLOR_PERCENT_GOOD"
+        elif [ "$percent_int" -lt 120 ]; then
+            # 80-120%: Warning - approaching or slightly over budget
+            usage_color="$COLOR_PERCENT_WARN"
+        elif [ "$percent_int" -lt 150 ]; then
+            # 120-150%: Over - significantly exceeding budget
+            usage_color="$COLOR_PERCENT_OVER"
+        else
+            # Over 150%: Critical - far exceeding budget
+            usage_color="$COLOR_PERCENT_HIGH"
         fi
     fi
 else
-    session_cost_raw="ccstat N/A"
-    remaining_time_raw="ccstat N/A"
+    session_cost_raw="pyccsl N/A"
+    remaining_time_raw="pyccsl N/A"
     daily_usage_raw="N/A"
     time_color="$COLOR_MUTED"
     usage_color="$COLOR_MUTED"
 fi
 
 # Apply colors to cost and time
-if [ "$session_cost_raw" = "no session" ] || [ "$session_cost_raw" = "ccstat N/A" ]; then
+if [ "$session_cost_raw" = "no session" ] || [ "$session_cost_raw" = "pyccsl N/A" ]; then
     session_cost="${COLOR_MUTED}${session_cost_raw}${COLOR_RESET}"
 else
     session_cost="${COLOR_COST}${session_cost_raw}${COLOR_RESET}"
@@ -0,0 +1,90 @@
+"""Shared fixtures for the pyccsl tests."""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+CLAUDE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLAUDE_DIR)
+
+import pyccsl  # noqa: E402
+import pyccsl_bench  # noqa: E402
+
+PYCCSL = os.path.join(CLAUDE_DIR, "pyccsl.py")
+CLIENT = os.path.join(CLAUDE_DIR, "pyccsl_client.py")
+
+SONNET = "claude-sonnet-4-20250514"
+
+
+def iso_timestamp(epoch):
+    """Format epoch seconds the way Claude Code writes transcript timestamps."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(epoch)) + f".{int(epoch * 1000) % 1000:03d}Z"
+
+
+def assistant_entry(uuid, epoch, usage, model=SONNET, parent=None, **fields):
+    """A transcript entry for one assistant request with usage."""
+    return dict({"type": "assistant", "uuid": uuid, "parentUuid": parent, "timestamp": iso_timestamp(epoch),
+                 "message": {"model": model, "usage": usage, "content": [{"type": "text", "text": "Done."}]}},
+                **fields)
+
+
+def usage(input_tokens=0, output_tokens=0, cache_creation=0, cache_read=0):
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+            "cache_creation_input_tokens": cache_creation, "cache_read_input_tokens": cache_read}
+
+
+def usage_cost(entries):
+    """Price the assistant usage of entries one at a time."""
+    return sum(pyccsl.calculate_model_cost(entry["message"]["model"], [
+        entry["message"]["usage"].get(key, 0) for _, key in pyccsl.TOKEN_COLUMNS]) for entry in entries)
+
+
+def write_jsonl(path, entries):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+    return str(path)
+
+
+@pytest.fixture
+def transcript(tmp_path):
+    """A synthetic transcript with Task results and inline sidechain entries."""
+    path = tmp_path / "session.jsonl"
+    with open(path, "wb") as f:
+        pyccsl_bench.generate_transcript(f, 3000, seed=7, max_payload=500)
+    return str(path)
+
+
+@pytest.fixture
+def pyccsl_env(tmp_path):
+    """Environment for running pyccsl.py in a subprocess, isolated in tmp_path."""
+    env = {k: v for k, v in os.environ.items() if not k.startswith("PYCCSL_")}
+    env.pop("XDG_RUNTIME_DIR", None)
+    env.update({
+        "HOME": str(tmp_path / "home"),
+        "PYCCSL_CACHE_DIR": str(tmp_path / "cache"),
+        "PYCCSL_PROJECTS_DIR": str(tmp_path / "projects"),
+        "PYCCSL_SNAPSHOT_DIR": str(tmp_path / "snapshots"),
+        "PYCCSL_SOCKET": str(tmp_path / "d.sock")
+    })
+    return env
+
+
+@pytest.fixture
+def projects_dir(tmp_path, monkeypatch):
+    """Point the in-process projects directory at an empty tmp_path directory."""
+    path = tmp_path / "projects"
+    path.mkdir()
+    monkeypatch.setattr(pyccsl, "CLAUDE_PROJECTS_DIR", str(path))
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Point the in-process checkpoint cache at tmp_path, with nothing held in memory."""
+    monkeypatch.setattr(pyccsl, "CACHE_DIR", str(tmp_path / "cache"))
+    pyccsl.TRANSCRIPT_STATES.clear()
+    yield pyccsl.CACHE_DIR
+    pyccsl.TRANSCRIPT_STATES.clear()
@@ -0,0 +1,62 @@
+"""--batch renders one line per input document, in order."""
+
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import CLIENT, PYCCSL, pyccsl
+
+FIELDS = "model,input,output,tokens,cost,perf-message-count"
+
+
+def run(script, args, env, stdin_text=""):
+    return subprocess.run([sys.executable, script] + args, input=stdin_text, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def status_input(transcript, session_id):
+    return json.dumps({"session_id": session_id, "transcript_path": transcript, "cwd": os.path.dirname(transcript),
+                       "model": {"id": "claude-opus-4-1-20250805", "display_name": "Opus 4.1"}})
+
+
+@pytest.mark.parametrize("script", [PYCCSL, CLIENT])
+def test_batch_lines_follow_documents(pyccsl_env, transcript, script):
+    documents = [status_input(transcript, "a"), "not json", "", "[1]", status_input(transcript, "b")]
+    single = run(PYCCSL, [FIELDS], pyccsl_env, status_input(transcript, "a")).stdout.rstrip("\n")
+
+    batch = run(script, ["--batch", FIELDS], pyccsl_env, "\n".join(documents) + "\n")
+
+    assert batch.returncode == 2
+    # Blank lines are skipped; invalid documents keep an empty line
+    assert batch.stdout.split("\n") == [single, "", "", single, ""]
+    assert "line 2" in batch.stderr and "line 4" in batch.stderr
+
+
+def test_batch_shares_checkpoints_and_reports_failures(cache_dir, transcript, monkeypatch, capsys):
+    consume_transcript_lines = pyccsl.consume_transcript_lines
+    consumed = []
+    monkeypatch.setattr(pyccsl, "consume_transcript_lines",
+                        lambda *args, **kwargs: consumed.append(1) or consume_transcript_lines(*args, **kwargs))
+    render_status_line = pyccsl.render_status_line
+
+    def render(config, input_data):
+        if input_data["session_id"] == "broken":
+            raise RuntimeError("no luck")
+        return render_status_line(config, input_data)
+
+    monkeypatch.setattr(pyccsl, "render_status_line", render)
+    documents = [status_input(transcript, name) for name in ("a", "broken", "b", "c")]
+    monkeypatch.setattr(sys, "stdin", io.StringIO("\n".join(documents) + "\n"))
+    config = pyccsl.parse_arguments(["--batch", "--theme", "none", FIELDS], {})
+
+    assert pyccsl.run_batch(config) == 4
+
+    out, err = capsys.readouterr()
+    lines = out.split("\n")
+    assert lines[1] == "" and lines[0] == lines[2] == lines[3] != ""
+    assert "Failed to render line 2: no luck" in err
+    assert len(consumed) == 1  # Later documents reuse the warm checkpoint
@@ -0,0 +1,83 @@
+"""Resuming a transcript checkpoint must give the same state as a full parse."""
+
+import os
+
+import pytest
+
+from conftest import pyccsl
+
+
+def split_transcript(path, fraction, mid_line=False):
+    """Truncate a transcript and return the bytes that were cut off."""
+    with open(path, "rb") as f:
+        data = f.read()
+    cut = data.index(b"\n", int(len(data) * fraction)) + 1
+    if mid_line:
+        cut += 40  # Leave the next entry half written
+    with open(path, "wb") as f:
+        f.write(data[:cut])
+    return data[cut:]
+
+
+def full_state(path):
+    pyccsl.TRANSCRIPT_STATES.clear()
+    return pyccsl.load_transcript_state(path, use_cache=False)
+
+
+@pytest.mark.parametrize("mid_line", [False, True])
+@pytest.mark.parametrize("from_disk", [False, True])
+def test_resume_matches_full_parse(transcript, cache_dir, mid_line, from_disk):
+    rest = split_transcript(transcript, 0.4, mid_line)
+    first = pyccsl.load_transcript_state(transcript)
+    assert first["entry_count"] > 0
+
+    with open(transcript, "ab") as f:
+        f.write(rest)
+    if from_disk:
+        pyccsl.TRANSCRIPT_STATES.clear()  # Resume from the checkpoint file
+    resumed = pyccsl.load_transcript_state(transcript)
+
+    assert resumed == full_state(transcript)
+
+
+def test_resume_in_many_steps(transcript, cache_dir):
+    with open(transcript, "rb") as f:
+        data = f.read()
+    step = len(data) // 7
+    with open(transcript, "wb") as f:
+        f.write(b"")
+    for start in range(0, len(data), step):
+        with open(transcript, "ab") as f:
+            f.write(data[start:start + step])
+        pyccsl.TRANSCRIPT_STATES.clear()
+        resumed = pyccsl.load_transcript_state(transcript)
+
+    assert resumed == full_state(transcript)
+
+
+def test_rewritten_transcript_is_reparsed(transcript, cache_dir):
+    pyccsl.load_transcript_state(transcript)
+    split_transcript(transcript, 0.5)
+    with open(transcript, "ab") as f:
+        f.write(b'{"type": "summary", "summary": "rewritten"}\n')
+    pyccsl.TRANSCRIPT_STATES.clear()
+
+    assert pyccsl.load_transcript_state(transcript) == full_state(transcript)
+
+
+def test_checkpoint_is_only_written_for_new_lines(transcript, cache_dir):
+    pyccsl.load_transcript_state(transcript)
+    checkpoint = pyccsl.get_cache_path("transcript", transcript)
+    os.utime(checkpoint, (0, 0))
+
+    pyccsl.TRANSCRIPT_STATES.clear()
+    pyccsl.load_transcript_state(transcript)
+    with open(transcript, "ab") as f:
+        f.write(b'{"type": "user", "timestamp": "2025-08-')  # Still being written
+    pyccsl.load_transcript_state(transcript)
+    assert os.stat(checkpoint).st_mtime == 0
+
+    with open(transcript, "ab") as f:
+        f.write(b'13T10:00:00.000Z"}\n')
+    pyccsl.load_transcript_state(transcript)
+    assert os.stat(checkpoint).st_mtime > 0
@@ -0,0 +1,57 @@
+"""The NumPy and plain-loop columnar engines give identical summaries."""
+
+import io
+
+import pytest
+
+from conftest import pyccsl, pyccsl_bench
+
+SUMMARY_KEYS = ["tokens", "model_tokens", "first_timestamp", "last_timestamp", "timestamp_count", "user_count",
+                "assistant_count", "response_time_total", "response_count", "response_sketch"]
+
+
+@pytest.fixture(scope="module")
+def large_transcript(tmp_path_factory):
+    path = tmp_path_factory.mktemp("columns") / "session.jsonl"
+    out = io.BytesIO()
+    pyccsl_bench.generate_transcript(out, pyccsl.NUMPY_MIN_ROWS + 5000, seed=11, max_payload=200)
+    path.write_bytes(out.getvalue())
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def columns(large_transcript):
+    return pyccsl.load_transcript_columns(large_transcript)
+
+
+def summarize(columns, engine):
+    state = pyccsl.new_transcript_state(None, None)
+    engine(columns, state)
+    return state
+
+
+def test_python_engine_matches_streaming_state(large_transcript, columns):
+    python = summarize(columns, pyccsl.summarize_columns_python)
+    streamed = pyccsl.load_transcript_state(large_transcript, use_cache=False)
+
+    for key in SUMMARY_KEYS:
+        assert python[key] == streamed[key], key
+
+
+def test_numpy_engine_matches_python_engine(columns):
+    np = pytest.importorskip("numpy")
+    python = summarize(columns, pyccsl.summarize_columns_python)
+    vectorized = summarize(columns, lambda columns, state: pyccsl.summarize_columns_numpy(columns, state, np))
+
+    for key in SUMMARY_KEYS:
+        assert vectorized[key] == python[key], key
+        assert type(vectorized[key]) is type(python[key]), key
+
+
+def test_numpy_row_costs_match_python(columns, monkeypatch):
+    pytest.importorskip("numpy")
+    vectorized = pyccsl.calculate_column_costs(columns)
+    monkeypatch.setattr(pyccsl, "numpy_module", False)
+    python = pyccsl.calculate_column_costs(columns)
+
+    assert vectorized.tobytes() == python.tobytes()
@@ -0,0 +1,110 @@
+"""The daemon and its thin client render what a direct run does."""
+
+import json
+import os
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import CLIENT, PYCCSL, pyccsl
+
+FIELDS = "model,input,output,tokens,cost,perf-message-count"
+
+
+def run(script, args, env, stdin_text=""):
+    return subprocess.run([sys.executable, script] + args, input=stdin_text, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def status_input(transcript, session_id="session-1"):
+    return json.dumps({
+        "session_id": session_id,
+        "transcript_path": transcript,
+        "cwd": os.path.dirname(transcript),
+        "model": {"id": "claude-opus-4-1-20250805", "display_name": "Opus 4.1"}
+    })
+
+
+@pytest.fixture
+def daemon(pyccsl_env):
+    process = subprocess.Popen([sys.executable, PYCCSL, "--daemon"], env=pyccsl_env,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    socket_path = pyccsl_env["PYCCSL_SOCKET"]
+    deadline = time.monotonic() + 10
+    while not os.path.exists(socket_path):
+        assert process.poll() is None, process.stderr.read()
+        assert time.monotonic() < deadline, "daemon did not start"
+        time.sleep(0.02)
+    yield socket_path
+    process.terminate()
+    process.wait(timeout=10)
+    process.stderr.close()
+
+
+def test_socket_is_owner_only(daemon):
+    assert stat.S_IMODE(os.stat(daemon).st_mode) & 0o077 == 0
+
+
+def test_client_matches_direct_run(daemon, pyccsl_env, transcript):
+    direct = run(PYCCSL, [FIELDS], pyccsl_env, status_input(transcript))
+    for _ in range(2):  # Cold, then from the daemon's warm checkpoint
+        client = run(CLIENT, [FIELDS], pyccsl_env, status_input(transcript))
+        assert (client.returncode, client.stdout) == (0, direct.stdout)
+        assert direct.stdout.strip()
+
+
+def test_client_without_daemon(pyccsl_env, transcript):
+    direct = run(PYCCSL, [FIELDS], pyccsl_env, status_input(transcript))
+    client = run(CLIENT, [FIELDS], pyccsl_env, status_input(transcript))
+
+    assert (client.returncode, client.stdout) == (0, direct.stdout)
+
+
+def test_client_with_other_cache_dir_renders_in_process(daemon, pyccsl_env, transcript, tmp_path):
+    env = dict(pyccsl_env, PYCCSL_CACHE_DIR=str(tmp_path / "other-cache"))
+    client = run(CLIENT, [FIELDS], env, status_input(transcript))
+
+    assert client.returncode == 0
+    assert os.listdir(tmp_path / "other-cache")
+
+
+@pytest.mark.parametrize("script", [PYCCSL, CLIENT])
+def test_terminal_stdin_reports_missing_input(daemon, pyccsl_env, script):
+    controller, terminal = os.openpty()
+    try:
+        result = subprocess.run([sys.executable, script, FIELDS], stdin=terminal, env=pyccsl_env,
+                                capture_output=True, text=True, timeout=60)
+    finally:
+        os.close(terminal)
+        os.close(controller)
+
+    assert result.returncode == 2
+    assert "No input provided" in result.stderr
+
+
+def test_slow_request_is_bounded(cache_dir, transcript, monkeypatch):
+    compute_transcript_metrics = pyccsl.compute_transcript_metrics
+
+    def slow_transcript_metrics(*args):
+        time.sleep(0.5)
+        return compute_transcript_metrics(*args)
+
+    monkeypatch.setattr(pyccsl, "DAEMON_DEADLINE_MS", 50)
+    monkeypatch.setattr(pyccsl, "compute_transcript_metrics", slow_transcript_metrics)
+    request = {"argv": ["--theme", "none", "model,cost"], "stdin": status_input(transcript),
+               "env": {}, "cwd": os.path.dirname(transcript)}
+
+    started = time.monotonic()
+    response = pyccsl.handle_daemon_request(request)
+    assert time.monotonic() - started < 0.4
+    assert response["code"] == 0 and "$" not in response["stdout"]
+
+    # The stage finished refreshing in the background; later requests render
+    # its cached result while it refreshes again
+    for thread, _ in list(pyccsl.STAGE_THREADS.values()):
+        thread.join()
+    response = pyccsl.handle_daemon_request(request)
+    assert response["code"] == 0 and "~$" in response["stdout"]
@@ -0,0 +1,74 @@
+"""The branch read from .git matches `git rev-parse --abbrev-ref HEAD`."""
+
+import shutil
+import subprocess
+
+import pytest
+
+from conftest import pyccsl
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com",
+                           "-c", "init.defaultBranch=main"] + list(args),
+                          cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def assert_branch_matches_git(cwd):
+    expected = git(cwd, "rev-parse", "--abbrev-ref", "HEAD")
+    repo = pyccsl.find_git_repository(str(cwd))
+    assert pyccsl.read_git_branch(repo) == expected
+    assert pyccsl.extract_git_status({"cwd": str(cwd)}, use_cache=False)["branch"] == expected
+    return expected
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    git(path, "init")
+    (path / "file.txt").write_text("one\n")
+    git(path, "add", "file.txt")
+    git(path, "commit", "-m", "first")
+    git(path, "checkout", "-b", "feature/nested")
+    (path / "file.txt").write_text("two\n")
+    git(path, "commit", "-am", "second")
+    return path
+
+
+def test_normal_checkout(repo):
+    assert assert_branch_matches_git(repo) == "feature/nested"
+    (repo / "sub").mkdir()
+    assert_branch_matches_git(repo / "sub")
+
+
+def test_packed_refs(repo):
+    git(repo, "pack-refs", "--all")
+    assert assert_branch_matches_git(repo) == "feature/nested"
+
+
+def test_detached_checkout(repo):
+    git(repo, "checkout", "--detach", "main")
+    assert assert_branch_matches_git(repo) == "HEAD"
+
+
+def test_worktree(repo, tmp_path):
+    worktree = tmp_path / "worktree"
+    git(repo, "worktree", "add", "-b", "other", str(worktree), "main")
+
+    assert assert_branch_matches_git(worktree) == "other"
+    assert assert_branch_matches_git(repo) == "feature/nested"
+
+
+def test_detached_worktree(repo, tmp_path):
+    worktree = tmp_path / "worktree"
+    git(repo, "worktree", "add", "--detach", str(worktree), "main")
+
+    assert assert_branch_matches_git(worktree) == "HEAD"
+
+
+def test_outside_repository(tmp_path):
+    assert pyccsl.find_git_repository(str(tmp_path)) is None
+    assert pyccsl.extract_git_status({"cwd": str(tmp_path)}, use_cache=False)["branch"] is None
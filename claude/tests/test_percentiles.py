@@ -0,0 +1,58 @@
+"""Response time percentiles from the streaming sketch stay within 1% of exact."""
+
+import random
+
+import pytest
+
+from conftest import pyccsl
+
+
+def sketch_of(values):
+    sketch = {}
+    for value in values:
+        pyccsl.add_to_sketch(sketch, value)
+    return sketch
+
+
+def exact_quantile(values, quantile):
+    """The value sketch_quantile estimates: the one at rank quantile * (n - 1)."""
+    return sorted(values)[int(quantile * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_quantiles_within_sketch_accuracy(seed):
+    rng = random.Random(seed)
+    values = [min(rng.lognormvariate(1.5, 1.0), 299.0) for _ in range(20000)]
+    sketch = sketch_of(values)
+
+    for quantile in pyccsl.RESPONSE_PERCENTILES.values():
+        exact = exact_quantile(values, quantile)
+        assert pyccsl.sketch_quantile(sketch, quantile) == pytest.approx(exact, rel=pyccsl.SKETCH_ACCURACY)
+
+
+def test_merged_sketches_match_one_sketch():
+    rng = random.Random(5)
+    values = [rng.uniform(0.05, 120.0) for _ in range(5000)]
+    merged = sketch_of(values[:1234])
+    pyccsl.merge_sketches(merged, sketch_of(values[1234:]))
+
+    assert merged == sketch_of(values)
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert pyccsl.sketch_quantile({}, 0.5) is None
+
+
+def test_session_percentiles(transcript):
+    state = pyccsl.load_transcript_state(transcript, use_cache=False)
+    metrics = pyccsl.calculate_state_performance_metrics(state, state["tokens"])
+
+    assert sum(state["response_sketch"].values()) == state["response_count"]
+    assert 0 < metrics["response_p50"] <= metrics["response_p90"] <= metrics["response_p99"] < 300
+
+
+def test_percentile_fields():
+    config = pyccsl.parse_arguments(["--theme", "none", "perf-response-p50,perf-response-p99"], {})
+    metrics = {"response_p50": 3.21, "response_p99": 45.6, "avg_response_time": 4.0, "cache_hit_rate": 0.5}
+
+    assert pyccsl.format_output(config, {"display_name": "Sonnet 4"}, {}, metrics) == "⏱ p50 3.2s > ⏱ p99 45.6s"
@@ -0,0 +1,34 @@
+"""The byte prefilter only skips lines that can't change the usage totals."""
+
+import json
+
+from conftest import pyccsl
+
+
+def usage_totals(path, facets):
+    state = pyccsl.load_transcript_state(path, use_cache=False, facets=facets)
+    return state["tokens"], state["model_tokens"], state["total_cost"], state["entry_count"]
+
+
+def test_usage_only_parse_matches_full_parse(transcript):
+    assert usage_totals(transcript, ["usage"]) == usage_totals(transcript, None)
+
+
+def test_usage_as_a_string_value_is_decoded_and_ignored(tmp_path):
+    path = tmp_path / "session.jsonl"
+    entries = [
+        {"type": "user", "timestamp": "2025-08-13T10:00:00.000Z", "uuid": "u1",
+         "message": {"role": "user", "content": [{"type": "text", "text": "usage"}]}},
+        {"type": "assistant", "timestamp": "2025-08-13T10:00:05.000Z", "uuid": "a1", "parentUuid": "u1",
+         "message": {"model": "claude-sonnet-4-20250514", "content": [{"type": "text", "text": "usage"}],
+                     "usage": {"input_tokens": 10, "output_tokens": 20}}},
+        {"type": "user", "timestamp": "2025-08-13T10:00:09.000Z", "uuid": "u2", "parentUuid": "a1",
+         "toolUseResult": {"stdout": "usage"}}
+    ]
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    tokens, model_tokens, _, entry_count = usage_totals(str(path), ["usage"])
+
+    assert tokens["input_tokens"] == 10 and tokens["output_tokens"] == 20
+    assert model_tokens == {"claude-sonnet-4-20250514": [10, 20, 0, 0]}
+    assert entry_count == 3
@@ -0,0 +1,43 @@
+"""Transcripts are priced per model, and re-priced when the pricing changes."""
+
+import pytest
+
+from conftest import SONNET, pyccsl
+
+
+@pytest.mark.parametrize("model_id, key", [
+    (SONNET, SONNET),
+    ("us.anthropic.claude-sonnet-4-20250514-v1:0", SONNET),
+    ("claude-sonnet-4@20250514", SONNET),
+    ("claude-opus-4-5-20251101", "claude-opus-4-1-20250805"),  # Newest known at or below 4.5
+    ("claude-haiku-9-20300101", "claude-3-5-haiku-20241022"),
+    ("claude-sonnet-3-20200101", "claude-3-5-sonnet-20240620"),  # Older than all, priced as the oldest
+    ("gpt-4", None)
+])
+def test_resolve_pricing_key(model_id, key):
+    assert pyccsl.resolve_pricing_key(model_id) == key
+
+
+def test_per_model_pricing_matches_per_entry_pricing(transcript):
+    state = pyccsl.load_transcript_state(transcript, use_cache=False)
+    columns = pyccsl.load_transcript_columns(transcript)
+
+    assert state["total_cost"] == pytest.approx(sum(pyccsl.calculate_column_costs(columns)), rel=1e-9)
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_pricing_change_reprices_unchanged_transcript(cache_dir, transcript, monkeypatch, in_memory):
+    before = pyccsl.load_transcript_state(transcript)["total_cost"]
+    if not in_memory:
+        pyccsl.TRANSCRIPT_STATES.clear()
+
+    for rates in pyccsl.PRICING_DATA.values():
+        monkeypatch.setitem(rates, "output", rates["output"] * 2)
+    after = pyccsl.load_transcript_state(transcript)["total_cost"]
+
+    assert after > before
+    assert after == pytest.approx(pyccsl.load_transcript_state(transcript, use_cache=False)["total_cost"])
+    # The re-priced checkpoint is written back
+    pyccsl.TRANSCRIPT_STATES.clear()
+    cached = pyccsl.read_cache_file(pyccsl.get_cache_path("transcript", transcript))
+    assert cached["total_cost"] == after
@@ -0,0 +1,59 @@
+"""Compiled render plans give the lines format_output always gave, and stay bounded."""
+
+import pytest
+
+from conftest import pyccsl
+
+FIELDS = "folder,model,input,output,tokens,cost,perf-all-metrics"
+MODEL = {"display_name": "Sonnet 4", "id": "claude-sonnet-4-20250514"}
+INPUT = {"cwd": "/home/user/project"}
+METRICS = {"input_tokens": 12345, "output_tokens": 6789, "cache_creation_tokens": 1000,
+           "cache_read_tokens": 250000, "cost": 12.3456, "cache_hit_rate": 0.93, "avg_response_time": 12.5,
+           "message_count": 42, "session_duration": 5400.0}
+
+
+def render(*argv):
+    config = pyccsl.parse_arguments(list(argv) + [FIELDS], {})
+    return pyccsl.format_output(config, MODEL, INPUT, dict(METRICS))
+
+
+# Rendered by format_output before render plans were introduced
+@pytest.mark.parametrize("argv, line", [
+    (["--theme", "none"],
+     "project > Sonnet 4 > ⚡ 93% ⏱ 12.5s 🕐 1.5h 💬 42 > ↑ (12.3K, 1.0K, 250.0K) > ↓ 6.8K"),
+    (["--theme", "tokyo", "--style", "powerline"],
+     "\x1b[38;5;0;48;5;203m project \x1b[0m\x1b[38;5;203;48;5;176m\x1b[0m"
+     "\x1b[38;5;0;48;5;176m Sonnet 4 ⚡ 93% ⏱ 12.5s 🕐 1.5h 💬 42 \x1b[0m\x1b[38;5;176;48;5;115m\x1b[0m"
+     "\x1b[38;5;0;48;5;115m ↑ (12.3K, 1.0K, 250.0K) \x1b[0m\x1b[38;5;115;48;5;221m\x1b[0m"
+     "\x1b[38;5;0;48;5;221m ↓ 6.8K \x1b[0m\x1b[38;5;221;48;5;0m\x1b[0m"),
+    (["--theme", "dracula", "--style", "arrows", "--numbers", "full", "--no-emoji"],
+     "\x1b[38;5;215mproject\x1b[0m → \x1b[38;5;141mSonnet 4\x1b[0m → "
+     "\x1b[38;5;141mCache: 93% Response: 12.5s Session: 1.5h Messages: 42\x1b[0m → "
+     "\x1b[38;5;84mIn: (12,345, 1,000, 250,000)\x1b[0m → \x1b[38;5;222mOut: 6,789\x1b[0m")
+])
+def test_lines_match_uncompiled_rendering(argv, line):
+    pyccsl.RENDER_PLANS.clear()
+    assert render(*argv) == line
+    assert render(*argv) == line  # From the cached plan
+
+
+def test_plan_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(pyccsl, "RENDER_PLANS", {})
+    first = render("--theme", "tokyo")
+    for theme in pyccsl.THEMES:
+        for style in ("simple", "powerline", "arrows", "pipes", "dots"):
+            render("--theme", theme, "--style", style)
+            assert len(pyccsl.RENDER_PLANS) <= pyccsl.RENDER_PLANS_MAX
+
+    assert render("--theme", "tokyo") == first  # Compiled again after eviction
+
+
+def test_recently_used_plans_are_kept(monkeypatch):
+    monkeypatch.setattr(pyccsl, "RENDER_PLANS", {})
+    monkeypatch.setattr(pyccsl, "RENDER_PLANS_MAX", 2)
+    render("--theme", "tokyo")
+    render("--theme", "nord")
+    render("--theme", "tokyo")
+    render("--theme", "dracula")
+
+    assert [key[1] for key in pyccsl.RENDER_PLANS] == ["tokyo", "dracula"]
@@ -0,0 +1,84 @@
+"""The usage store and `pyccsl.py report` roll up usage across sessions."""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import CLIENT, PYCCSL, assistant_entry, pyccsl, usage, usage_cost, write_jsonl
+
+OPUS = "claude-opus-4-1-20250805"
+DAY = 86400
+
+
+def report(capsys, projects_dir, db_path, *args):
+    assert pyccsl.run_report(["--json", "--projects-dir", str(projects_dir), "--db", str(db_path)] +
+                             list(args)) == 0
+    return {row["key"]: row for row in json.loads(capsys.readouterr().out)}
+
+
+@pytest.fixture
+def sessions(projects_dir):
+    start = time.mktime((2025, 8, 12, 12, 0, 0, 0, 0, -1))
+    first = [assistant_entry("a1", start, usage(100, 2000, 5000, 80000), cwd="/work/a", sessionId="a"),
+             assistant_entry("a2", start + 60, usage(50, 1000, 0, 90000), model=OPUS, parent="a1",
+                             cwd="/work/a", sessionId="a")]
+    second = [assistant_entry("b1", start + DAY, usage(10, 500, 20000, 0), cwd="/work/b", sessionId="b")]
+    write_jsonl(projects_dir / "-work-a" / "a.jsonl", first)
+    write_jsonl(projects_dir / "-work-b" / "b.jsonl", second)
+    return first, second
+
+
+def test_report_groups(capsys, tmp_path, projects_dir, sessions):
+    first, second = sessions
+    db_path = tmp_path / "usage.sqlite3"
+
+    by_model = report(capsys, projects_dir, db_path, "--by", "model")
+    assert by_model[OPUS]["cost"] == pytest.approx(usage_cost(first[1:]))
+    assert by_model[OPUS]["messages"] == 1
+    assert by_model[pyccsl.extract_model_id(first[0]["message"]["model"])]["cost"] == \
+        pytest.approx(usage_cost(first[:1] + second))
+
+    by_session = report(capsys, projects_dir, db_path, "--by", "session", "--no-sync")
+    assert by_session["a"]["cost"] == pytest.approx(usage_cost(first))
+    assert by_session["a"]["input_tokens"] == 150
+    assert by_session["b"]["cache_creation_tokens"] == 20000
+
+    by_project = report(capsys, projects_dir, db_path, "--by", "project", "--no-sync")
+    assert set(by_project) == {"/work/a", "/work/b"}
+
+    by_day = report(capsys, projects_dir, db_path, "--since", "2025-08-13", "--no-sync")
+    assert list(by_day) == ["2025-08-13"]
+    assert by_day["2025-08-13"]["cost"] == pytest.approx(usage_cost(second))
+
+
+def test_incremental_sync_matches_fresh_store(capsys, tmp_path, projects_dir, sessions):
+    first, _ = sessions
+    report(capsys, projects_dir, tmp_path / "incremental.sqlite3", "--by", "session")
+
+    later = assistant_entry("a3", time.mktime((2025, 8, 12, 13, 0, 0, 0, 0, -1)), usage(5, 5, 5, 5),
+                            parent="a2", cwd="/work/a", sessionId="a")
+    with open(projects_dir / "-work-a" / "a.jsonl", "a") as f:
+        f.write(json.dumps(later) + "\n")
+
+    incremental = report(capsys, projects_dir, tmp_path / "incremental.sqlite3", "--by", "session")
+    fresh = report(capsys, projects_dir, tmp_path / "fresh.sqlite3", "--by", "session")
+    assert incremental == fresh
+    assert incremental["a"]["messages"] == 3
+    assert incremental["a"]["cost"] == pytest.approx(usage_cost(first + [later]))
+
+
+@pytest.mark.parametrize("script", [PYCCSL, CLIENT])
+def test_report_command(pyccsl_env, projects_dir, sessions, script):
+    env = dict(pyccsl_env, PYCCSL_PROJECTS_DIR=str(projects_dir))
+    result = subprocess.run([sys.executable, script, "report", "--by", "model"], env=env,
+                            capture_output=True, text=True, timeout=60, stdin=subprocess.DEVNULL)
+
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.splitlines()
+    assert lines[0].split()[0] == "model"
+    assert lines[-1].split()[0] == "total" and lines[-1].split()[1] == "3"
+    assert os.path.exists(os.path.join(env["PYCCSL_CACHE_DIR"], "usage.sqlite3"))
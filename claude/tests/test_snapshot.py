@@ -0,0 +1,81 @@
+"""Session snapshots round-trip between --snapshot and --read-snapshot."""
+
+import json
+import os
+import stat
+import struct
+import subprocess
+import sys
+
+import pytest
+
+from conftest import CLIENT, PYCCSL, pyccsl
+
+FIELDS = "model,input,output,tokens,cost,perf-message-count"
+
+
+def run(script, args, env, stdin_text=""):
+    return subprocess.run([sys.executable, script] + args, input=stdin_text, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def status_input(transcript, session_id):
+    return json.dumps({"session_id": session_id, "transcript_path": transcript, "cwd": os.path.dirname(transcript),
+                       "model": {"id": "claude-opus-4-1-20250805", "display_name": "Opus 4.1"}})
+
+
+@pytest.mark.parametrize("script", [PYCCSL, CLIENT])
+def test_snapshot_round_trip(pyccsl_env, transcript, script):
+    rendered = run(script, ["--snapshot", FIELDS], pyccsl_env, status_input(transcript, "snap-1"))
+    assert rendered.returncode == 0
+
+    line = run(script, ["--read-snapshot", "snap-1"], pyccsl_env)
+    assert (line.returncode, line.stdout) == (0, rendered.stdout)
+
+    document = run(script, ["--read-snapshot", "snap-1", "--format", "json"], pyccsl_env)
+    snapshot = json.loads(document.stdout)
+    assert snapshot["session_id"] == "snap-1"
+    assert snapshot["line"] + "\n" == rendered.stdout
+
+
+@pytest.mark.parametrize("script", [PYCCSL, CLIENT])
+def test_missing_snapshot(pyccsl_env, script):
+    result = run(script, ["--read-snapshot", "no-such-session"], pyccsl_env)
+
+    assert result.returncode == 3
+    assert result.stdout == ""
+
+
+def test_snapshots_are_owner_only(tmp_path):
+    path = str(tmp_path / "snapshots" / "session.snap")
+    assert pyccsl.publish_snapshot(path, "line", "{}")
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) & 0o077 == 0
+
+    # Snapshots created readable by others are tightened on the next write
+    os.chmod(path, 0o644)
+    assert pyccsl.publish_snapshot(path, "line", "{}")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_generation_advances_past_interrupted_writes(tmp_path):
+    path = str(tmp_path / "session.snap")
+    pyccsl.publish_snapshot(path, "first", '{"n":1}')
+    assert pyccsl.read_snapshot(path)["generation"] == 2
+
+    # A writer that died mid-update leaves an odd generation behind
+    with open(path, "r+b") as f:
+        f.seek(8)
+        f.write(struct.pack("<Q", 3))
+    pyccsl.publish_snapshot(path, "second", '{"n":2}')
+
+    snapshot = pyccsl.read_snapshot(path)
+    assert (snapshot["generation"], snapshot["line"], snapshot["document"]) == (4, "second", '{"n":2}')
+
+
+def test_oversized_snapshot_is_not_written(tmp_path):
+    path = str(tmp_path / "session.snap")
+
+    assert not pyccsl.publish_snapshot(path, "x" * pyccsl.SNAPSHOT_SIZE, "{}")
+    assert pyccsl.read_snapshot(path) is None
@@ -0,0 +1,92 @@
+"""Stage threads share transcript checkpoints and, in the daemon, per-request output."""
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from conftest import pyccsl
+
+
+def test_concurrent_loads_parse_the_transcript_once(cache_dir, transcript, monkeypatch):
+    consume_transcript_lines = pyccsl.consume_transcript_lines
+    calls = []
+
+    def slow_consume(*args, **kwargs):
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        return consume_transcript_lines(*args, **kwargs)
+
+    monkeypatch.setattr(pyccsl, "consume_transcript_lines", slow_consume)
+    barrier = threading.Barrier(4)
+    states = []
+
+    def load():
+        barrier.wait()
+        states.append(pyccsl.load_transcript_state(transcript))
+
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    expected = pyccsl.load_transcript_state(transcript, use_cache=False)
+    for state in states:
+        assert (state["offset"], state["entry_count"], state["tokens"], state["total_cost"]) == \
+            (expected["offset"], expected["entry_count"], expected["tokens"], expected["total_cost"])
+
+
+def test_background_stage_writes_to_its_own_request(monkeypatch):
+    daemon_stderr = pyccsl.ThreadStderr(io.StringIO())
+    monkeypatch.setattr(sys, "stderr", daemon_stderr)
+    monkeypatch.setattr(pyccsl, "DAEMON_STDERR", daemon_stderr)
+    release = threading.Event()
+
+    def slow_stage():
+        release.wait()
+        sys.stderr.write("from the first request's stage\n")
+        return {}
+
+    first, second = io.StringIO(), io.StringIO()
+    daemon_stderr.bind(first)
+    _, stale = pyccsl.run_stages_with_deadline({"git": slow_stage}, 10, "session", use_cache=False)
+    daemon_stderr.bind(second)
+    release.set()
+    for thread, _ in list(pyccsl.STAGE_THREADS.values()):
+        thread.join()
+    sys.stderr.write("second request\n")
+    daemon_stderr.bind(None)
+
+    assert first.getvalue() == "from the first request's stage\n"
+    assert second.getvalue() == "second request\n"
+    assert daemon_stderr.default.getvalue() == ""
+
+
+def test_daemon_request_collects_its_diagnostics(transcript, cache_dir, monkeypatch):
+    daemon_stderr = pyccsl.ThreadStderr(io.StringIO())
+    monkeypatch.setattr(sys, "stderr", daemon_stderr)
+    monkeypatch.setattr(pyccsl, "DAEMON_STDERR", daemon_stderr)
+    document = json.dumps({"transcript_path": transcript, "cwd": os.path.dirname(transcript),
+                           "model": {"display_name": "Sonnet 4"}})
+
+    response = pyccsl.handle_daemon_request({"argv": ["--debug", "model,cost"], "stdin": document, "env": {}})
+    for thread, _ in list(pyccsl.STAGE_THREADS.values()):
+        thread.join()
+
+    assert response["code"] == 0
+    assert "DEBUG: Parsed" in response["stderr"]
+    assert daemon_stderr.default.getvalue() == ""
+
+
+def test_release_output_keeps_daemon_descriptors(monkeypatch):
+    monkeypatch.setattr(pyccsl, "DAEMON_STDERR", pyccsl.ThreadStderr(sys.stderr))
+    calls = []
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "dup2", lambda *args: calls.append(args))
+        pyccsl.release_output()
+
+    assert calls == []
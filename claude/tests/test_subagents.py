@@ -0,0 +1,103 @@
+"""Sub-agent usage is counted once: from the sub-agent's transcript, not its Task result."""
+
+import time
+
+import pytest
+
+from conftest import SONNET, assistant_entry, iso_timestamp, pyccsl, usage, usage_cost, write_jsonl
+
+OPUS = "claude-opus-4-1-20250805"
+HAIKU = "claude-3-5-haiku-20241022"
+
+
+def task_result(uuid, epoch, parent, agent_id, counts, session_id):
+    """The user entry carrying a Task tool result, repeating the sub-agent's last usage."""
+    return {"type": "user", "uuid": uuid, "parentUuid": parent, "timestamp": iso_timestamp(epoch),
+            "sessionId": session_id, "cwd": "/work", "toolUseResult": {"agentId": agent_id, "usage": counts},
+            "message": {"role": "user", "content": [{"type": "tool_result", "content": "Done."}]}}
+
+
+def sidechain(uuid, epoch, counts, agent_id, session_id, model=SONNET, parent=None):
+    return assistant_entry(uuid, epoch, counts, model=model, parent=parent, isSidechain=True,
+                           agentId=agent_id, sessionId=session_id, cwd="/work")
+
+
+def as_priced(entry, model):
+    """A Task result's usage as an assistant entry, priced with its parent's model."""
+    return {"message": {"model": model, "usage": entry["toolUseResult"]["usage"]}}
+
+
+@pytest.fixture
+def project(projects_dir, cache_dir):
+    """Session S with sub-agents a (project directory), c (subagents folder) and zz (no
+    transcript), and session O whose sub-agent b also sits in the project directory."""
+    start = time.mktime((2025, 8, 12, 12, 0, 0, 0, 0, -1))
+    directory = projects_dir / "-work"
+    session = [assistant_entry("s1", start, usage(100, 800, 4000, 20000), sessionId="S", cwd="/work"),
+               task_result("t1", start + 60, "s1", "a", usage(3, 300, 0, 9000), "S"),
+               task_result("t2", start + 120, "s1", "c", usage(5, 200, 100, 7000), "S"),
+               task_result("t3", start + 180, "s1", "zz", usage(7, 100, 0, 5000), "S")]
+    agent_a = [sidechain("a1", start + 10, usage(20, 500, 3000, 0), "a", "S", model=OPUS),
+               sidechain("a2", start + 50, usage(3, 300, 0, 9000), "a", "S", model=OPUS, parent="a1")]
+    agent_c = [sidechain("c1", start + 100, usage(5, 200, 100, 7000), "c", "S", model=HAIKU)]
+    other = [assistant_entry("o1", start + 300, usage(10, 400, 2000, 0), sessionId="O", cwd="/work"),
+             task_result("t4", start + 400, "o1", "b", usage(1, 50, 0, 3000), "O")]
+    agent_b = [sidechain("b1", start + 350, usage(1, 50, 0, 3000), "b", "O")]
+
+    paths = {
+        "S": write_jsonl(directory / "S.jsonl", session),
+        "a": write_jsonl(directory / "agent-a.jsonl", agent_a),
+        "c": write_jsonl(directory / "S" / "subagents" / "agent-c.jsonl", agent_c),
+        "O": write_jsonl(directory / "O.jsonl", other),
+        "b": write_jsonl(directory / "agent-b.jsonl", agent_b)
+    }
+    # What each session costs with every request counted exactly once
+    costs = {
+        "S": usage_cost(session[:1] + agent_a + agent_c) + usage_cost([as_priced(session[3], SONNET)]),
+        "O": usage_cost(other[:1] + agent_b)
+    }
+    return paths, costs
+
+
+def test_finds_subagent_transcripts_of_the_session(project):
+    paths, _ = project
+    subagents = pyccsl.load_subagent_usage(paths["S"], use_cache=False)
+
+    assert subagents["files"] == 2
+    assert sorted(subagents["agent_ids"]) == ["a", "c"]
+
+
+def test_merge_takes_out_only_matched_tasks(project):
+    paths, costs = project
+    state = pyccsl.load_transcript_state(paths["S"], use_cache=False)
+    merged = pyccsl.merge_subagent_usage(state, pyccsl.load_subagent_usage(paths["S"], use_cache=False))
+
+    assert merged["total_cost"] == pytest.approx(costs["S"])
+    # Task zz has no transcript, so its result's usage is all there is
+    assert merged["tokens"]["output_tokens"] == 800 + 500 + 300 + 200 + 100
+    # The checkpoint itself keeps the session's own usage
+    assert state["tokens"]["output_tokens"] == 800 + 300 + 200 + 100
+
+
+def test_merge_is_stable_across_cached_refreshes(project):
+    paths, costs = project
+    for _ in range(2):
+        state = pyccsl.load_transcript_state(paths["S"])
+        merged = pyccsl.merge_subagent_usage(state, pyccsl.load_subagent_usage(paths["S"]))
+        assert merged["total_cost"] == pytest.approx(costs["S"])
+
+
+def test_usage_scan_counts_each_request_once(project, projects_dir):
+    _, costs = project
+    hourly = pyccsl.scan_usage(str(projects_dir), use_cache=False)
+
+    assert sum(cost for cost, _, _ in hourly.values()) == pytest.approx(costs["S"] + costs["O"])
+
+
+def test_report_store_counts_each_request_once(project, projects_dir, tmp_path):
+    _, costs = project
+    db = pyccsl.open_usage_store(str(tmp_path / "usage.sqlite3"))
+    pyccsl.sync_usage_store(db, str(projects_dir))
+
+    by_session = {row["key"]: row["cost"] for row in pyccsl.query_usage_report(db, "session")}
+    assert by_session == pytest.approx(costs)
@@ -0,0 +1,104 @@
+"""Daily cost, daily budget and 5-hour billing blocks across all sessions."""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from conftest import CLAUDE_DIR, assistant_entry, pyccsl, usage, usage_cost, write_jsonl
+
+HOUR = 3600
+
+
+def local_epoch(*fields):
+    return time.mktime(fields + (0, 0, -1))
+
+
+def test_billing_blocks_start_on_the_hour_and_split_after_five_hours():
+    base = 480000  # An epoch hour
+    hourly = {
+        base: [1.0, base * HOUR + 1200, base * HOUR + 3000],
+        base + 2: [2.0, (base + 2) * HOUR + 60, (base + 2) * HOUR + 120],
+        base + 5: [4.0, (base + 5) * HOUR + 10, (base + 5) * HOUR + 20],      # Past the first block's end
+        base + 11: [8.0, (base + 11) * HOUR + 10, (base + 11) * HOUR + 20]    # After a 5-hour gap
+    }
+
+    blocks = pyccsl.calculate_billing_blocks(hourly)
+
+    assert [(block["start"], block["end"], block["cost"]) for block in blocks] == [
+        (base * HOUR, (base + 5) * HOUR, 3.0),
+        ((base + 5) * HOUR, (base + 10) * HOUR, 4.0),
+        ((base + 11) * HOUR, (base + 16) * HOUR, 8.0)
+    ]
+    assert blocks[0]["first"] == base * HOUR + 1200 and blocks[0]["last"] == (base + 2) * HOUR + 120
+
+
+@pytest.mark.parametrize("year, month, days", [(2025, 2, 28), (2024, 2, 29), (2000, 2, 29), (1900, 2, 28),
+                                               (2025, 4, 30), (2025, 8, 31), (2025, 12, 31)])
+def test_days_in_month(year, month, days):
+    assert pyccsl.get_days_in_month(year, month) == days
+
+
+def test_usage_metrics_across_sessions(projects_dir, cache_dir):
+    now = local_epoch(2025, 8, 13, 12, 0, 0)
+    morning = [assistant_entry("m1", now - 7 * HOUR, usage(100, 2000, 5000, 80000)),
+               assistant_entry("m2", now - 6.5 * HOUR, usage(50, 1000, 0, 90000), parent="m1")]
+    recent = [assistant_entry("r1", now - 40 * 60, usage(10, 500, 20000, 0)),
+              assistant_entry("r2", now - 10 * 60, usage(20, 700, 0, 40000), model="claude-opus-4-1-20250805",
+                              parent="r1")]
+    yesterday = [assistant_entry("y1", now - 20 * HOUR, usage(10, 10000, 0, 0))]
+    write_jsonl(projects_dir / "-work-a" / "a.jsonl", morning + yesterday)
+    write_jsonl(projects_dir / "-work-b" / "b.jsonl", recent)
+
+    metrics = pyccsl.calculate_usage_metrics({"cache": True, "monthly_budget": 100.0}, now=now)
+
+    assert metrics["today_cost"] == pytest.approx(usage_cost(morning + recent))
+    assert metrics["daily_budget"] == pytest.approx(100.0 / 31)
+    assert metrics["daily_budget_percent"] == pytest.approx(usage_cost(morning + recent) * 100 / (100.0 / 31))
+    assert metrics["block_cost"] == pytest.approx(usage_cost(recent))
+    assert metrics["block_end"] == local_epoch(2025, 8, 13, 11, 0, 0) + 5 * HOUR
+    assert metrics["block_remaining"] == pytest.approx(4 * HOUR)
+
+    # Five hours after the last request the block is over
+    later = pyccsl.calculate_usage_metrics({"cache": True, "monthly_budget": None}, now=now + 5 * HOUR)
+    assert "block_cost" not in later and "daily_budget" not in later
+
+
+def statusline(tmp_path, script_dir, projects_dir, entries):
+    write_jsonl(projects_dir / "-work" / "s.jsonl", entries)
+    env = dict(os.environ, HOME=str(tmp_path / "home"), PYCCSL_CACHE_DIR=str(tmp_path / "cache"),
+               PYCCSL_PROJECTS_DIR=str(projects_dir))
+    document = json.dumps({"model": {"display_name": "Sonnet 4"}, "workspace": {"current_dir": str(tmp_path)}})
+    result = subprocess.run(["bash", os.path.join(script_dir, "statusline-command.sh")], input=document,
+                            env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0
+    return re.sub(r"\x1b\[[0-9;]*m", "", result.stdout)
+
+
+@pytest.mark.skipif(shutil.which("jq") is None, reason="jq is not installed")
+def test_statusline_command_script(tmp_path, projects_dir):
+    now = time.time()
+    entries = [assistant_entry("s1", now - 1, usage(10, 500, 20000, 0))]
+
+    line = statusline(tmp_path, CLAUDE_DIR, projects_dir, entries)
+
+    fields = [field.strip() for field in line.split("|")]
+    assert fields[2] == "Sonnet 4"
+    assert fields[3] == f"${usage_cost(entries):.2f}"
+    assert fields[4].endswith("%")
+    assert re.fullmatch(r"[34]h \d+m left", fields[5])
+
+
+@pytest.mark.skipif(shutil.which("jq") is None, reason="jq is not installed")
+def test_statusline_command_script_without_pyccsl(tmp_path, projects_dir):
+    script_dir = tmp_path / "bin"
+    script_dir.mkdir()
+    shutil.copy(os.path.join(CLAUDE_DIR, "statusline-command.sh"), script_dir)
+
+    line = statusline(tmp_path, str(script_dir), projects_dir, [])
+
+    assert [field.strip() for field in line.split("|")][3:] == ["pyccsl N/A", "N/A", "pyccsl N/A"]
@@ -0,0 +1,81 @@
+"""--watch re-renders when the transcript grows, and polls less while it doesn't."""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import PYCCSL, assistant_entry, pyccsl, usage, write_jsonl
+
+
+def append_entry(path, entry):
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def read_line(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def test_watch_rewrites_output_file(pyccsl_env, tmp_path):
+    transcript = write_jsonl(tmp_path / "session.jsonl", [assistant_entry("a1", time.time(), usage(10, 1200, 0, 0))])
+    output = str(tmp_path / "status.txt")
+    process = subprocess.Popen([sys.executable, PYCCSL, "--watch", transcript, "--output", output, "--cwd",
+                                str(tmp_path), "--theme", "none", "model,output"], env=pyccsl_env,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        wait_for(lambda: read_line(output) is not None)
+        assert read_line(output) == "Sonnet 4 > ↓ 1.2K\n"
+
+        append_entry(transcript, assistant_entry("a2", time.time(), usage(5, 800, 0, 0), parent="a1"))
+        wait_for(lambda: read_line(output) == "Sonnet 4 > ↓ 2.0K\n")
+        # Written by replacing the file, so readers never see a partial line
+        assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        process.stderr.close()
+    assert process.returncode == 0
+
+
+def test_polling_backs_off_and_resets_on_change(cache_dir, tmp_path, monkeypatch, capsys):
+    transcript = write_jsonl(tmp_path / "session.jsonl", [assistant_entry("a1", time.time(), usage(10, 1200, 0, 0))])
+    config = pyccsl.parse_arguments(["--watch", transcript, "--cwd", str(tmp_path), "--theme", "none",
+                                     "model,output"], {})
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 7:
+            append_entry(transcript, assistant_entry("a2", time.time(), usage(5, 800, 0, 0), parent="a1"))
+        if len(sleeps) == 10:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(pyccsl, "open_inotify", lambda: None)
+    monkeypatch.setattr(time, "sleep", fake_sleep)
+
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    try:
+        assert pyccsl.watch_status_line(config) == 0
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+
+    poll, most = pyccsl.WATCH_POLL_SECONDS, pyccsl.WATCH_POLL_MAX_SECONDS
+    assert sleeps == pytest.approx([poll, poll * 2, poll * 4, poll * 8, poll * 16, most, most,
+                                    poll, poll * 2, poll * 4])
+    assert capsys.readouterr().out == "Sonnet 4 > ↓ 1.2K\nSonnet 4 > ↓ 2.0K\n"
@@ -0,0 +1,91 @@
+"""Windowed performance fields cover only the most recent minutes of a session."""
+
+import random
+
+import pytest
+
+from conftest import assistant_entry, iso_timestamp, pyccsl, usage, write_jsonl
+
+START = 1755000000.0  # On a minute boundary
+
+
+def user_entry(uuid, epoch, parent=None):
+    return {"type": "user", "uuid": uuid, "parentUuid": parent, "timestamp": iso_timestamp(epoch),
+            "message": {"role": "user", "content": "Next step"}}
+
+
+@pytest.fixture
+def session(tmp_path):
+    """A 90-minute linear session: one prompt and one reply every 30-150 seconds."""
+    rng = random.Random(21)
+    entries = []
+    turns = []  # (prompt time, reply time, usage) for the direct computation
+    epoch = START
+    parent = None
+    while epoch < START + 90 * 60:
+        reply = epoch + rng.randint(1, 20)
+        counts = usage(rng.randint(1, 50), rng.randint(10, 900), rng.randint(0, 5000), rng.randint(0, 90000))
+        entries.append(user_entry(f"u{len(turns)}", epoch, parent))
+        entries.append(assistant_entry(f"a{len(turns)}", reply, counts, parent=f"u{len(turns)}"))
+        turns.append((epoch, reply, counts))
+        parent = f"a{len(turns) - 1}"
+        epoch += rng.randint(30, 150)
+    return write_jsonl(tmp_path / "session.jsonl", entries), turns
+
+
+def direct_window_metrics(turns, window, now):
+    """Aggregate the turns whose timestamps fall in the window's minutes."""
+    minutes = -(-window // 60)
+    current = int(now // 60)
+
+    def in_window(timestamp):
+        return current - minutes < int(timestamp // 60) <= current
+
+    prompts = [prompt for prompt, _, _ in turns if in_window(prompt)]
+    replies = [(reply - prompt, counts) for prompt, reply, counts in turns if in_window(reply)]
+    metrics = {"message_count": len(prompts)}
+    cache_read = sum(counts["cache_read_input_tokens"] for _, counts in replies)
+    total_input = sum(counts["input_tokens"] + counts["cache_creation_input_tokens"] +
+                      counts["cache_read_input_tokens"] for _, counts in replies)
+    if total_input:
+        metrics["cache_hit_rate"] = cache_read / total_input
+    if replies:
+        metrics["avg_response_time"] = sum(response_time for response_time, _ in replies) / len(replies)
+    return metrics
+
+
+@pytest.mark.parametrize("field, window", [("perf-cache-rate@5m", 300), ("perf-response-time@90s", 90),
+                                           ("perf-message-count@1h", 3600)])
+def test_window_matches_direct_computation(session, field, window):
+    path, turns = session
+    state = pyccsl.load_transcript_state(path, use_cache=False)
+    now = turns[-1][1] + 10
+
+    assert pyccsl.split_window_field(field)[1] == window
+    expected = direct_window_metrics(turns, window, now)
+    actual = pyccsl.calculate_window_metrics(state, window, now)
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        assert actual[key] == pytest.approx(value), key
+
+
+def test_window_is_empty_once_the_session_is_idle(session):
+    path, turns = session
+    state = pyccsl.load_transcript_state(path, use_cache=False)
+
+    assert pyccsl.calculate_window_metrics(state, 300, turns[-1][1] + 600) == {"message_count": 0}
+
+
+@pytest.mark.parametrize("field", ["perf-cache-rate@30s", "perf-cache-rate@2h", "perf-cache-rate@5", "git@5m"])
+def test_invalid_windows(field):
+    assert pyccsl.split_window_field(field) == (None, None)
+
+
+def test_windowed_fields_render_after_their_base_field():
+    config = pyccsl.parse_arguments(["--theme", "none", "perf-response-time@90s,perf-cache-rate@5m,perf-cache-rate"],
+                                    {})
+    metrics = {"cache_hit_rate": 0.5, "avg_response_time": 4.0,
+               "windows": {"5m": {"message_count": 2, "cache_hit_rate": 0.8}, "90s": {"message_count": 0}}}
+
+    # No replies in the last 90 seconds, so that field is left out
+    assert pyccsl.format_output(config, {"display_name": "Sonnet 4"}, {}, metrics) == "⚡ 50% > ⚡ 80% (5m)"